@@ -6,11 +6,15 @@
 """
 
 import os
-import glob
 import openpyxl
-import re
 from pathlib import Path
 
+from media_index import MediaIndex
+from fuzzy_match import FuzzyResolver, describe_proposals
+from student_index import load_student_index, describe_candidates
+
+MISSING_LIST_FILENAME = "未拍照学生名单.txt"
+
 def load_all_students_from_excel(excel_path):
     """从Excel文件的所有sheet中加载学生信息"""
     print(f"正在读取Excel文件: {excel_path}")
@@ -32,54 +36,158 @@ def load_all_students_from_excel(excel_path):
     print(f"总共加载了 {len(all_students)} 个学生信息")
     return all_students
 
-def get_existing_photos(directory):
-    """获取现有的照片文件"""
-    pattern = os.path.join(directory, "*.png")
-    photo_files = glob.glob(pattern)
-    
-    existing_photos = set()  # 存储已拍照的学生姓名
-    
-    for photo_path in photo_files:
-        filename = os.path.basename(photo_path)
-        # 提取文件名中的学生信息
-        name_part = os.path.splitext(filename)[0]
+def merge_media_kind(current, kind):
+    """合并同一学生的照片/视频情况"""
+    if current is None or current == kind:
+        return kind
+    return "both"
+
+def resolve_media_files(files, student_index):
+    """
+    把拍摄文件解析到名单中的学生（考号优先，文件名中的姓名有错字也能匹配）
+
+    Args:
+        files: MediaIndex.files() 的结果
+        student_index: StudentIndex
+
+    Returns:
+        (media_status, file_students, mismatched, unresolved)
+        media_status: {(考号, 姓名): "photo" | "video" | "both"}，键为名单中的学生
+        file_students: {文件名: 学生}
+        mismatched: [(文件名, 学生)] 文件名中的姓名或考号与名单不一致
+        unresolved: [(文件名, 原因)] 无法确定或找不到对应学生的文件
+    """
+    media_status = {}
+    file_students = {}
+    mismatched = []
+    unresolved = []
+    for filename, size, mtime_ns, exam_id, name, kind in files:
+        if exam_id is None:
+            # 文件名不是 考号_姓名 格式时按整个文件名当作姓名
+            name = os.path.splitext(filename)[0]
+        match = student_index.resolve(exam_id, name)
+        if match.status == "none":
+            unresolved.append((filename, "名单中没有对应学生"))
+            continue
+        if match.status == "ambiguous":
+            unresolved.append((filename, f"无法确定是哪位学生：{describe_candidates(match.candidates)}"))
+            continue
+        student = match.student
+        if match.status != "exact":
+            mismatched.append((filename, student))
+        key = (student.exam_id, student.name)
+        media_status[key] = merge_media_kind(media_status.get(key), kind)
+        file_students[filename] = student
+    return media_status, file_students, mismatched, unresolved
+
+def write_missing_list(output_file, missing_by_class, total_students, has_photo_count,
+                       media_status, media_counts, bad_files=None):
+    """
+    保存未拍照学生名单
+
+    Args:
+        missing_by_class: {班级名: [(考号, 姓名), ...]}
+        media_status: {(考号, 姓名): "photo" | "video" | "both"}
+        media_counts: {"photo": 仅有照片人数, "video": 仅有视频人数, "both": 都有人数}
+        bad_files: 可选，完整性检查发现问题的文件 {文件名: 问题描述}
+    """
+    missing_count = total_students - has_photo_count
+    completion_rate = (has_photo_count / total_students) * 100 if total_students > 0 else 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("未拍照学生名单\n")
+        f.write("="*40 + "\n\n")
+        
+        for class_name in sorted(missing_by_class.keys()):
+            if not missing_by_class[class_name]:
+                continue
+            f.write(f"【{class_name}】\n")
+            for exam_id, name in sorted(missing_by_class[class_name]):
+                note = "（仅有视频）" if media_status.get((exam_id, name)) == "video" else ""
+                f.write(f"  {exam_id} {name}{note}\n")
+            f.write("\n")
         
-        # 匹配模式：考号_姓名
-        match = re.match(r'^(\d+)_(.+)$', name_part)
-        if match:
-            exam_id, name = match.groups()
-            existing_photos.add((exam_id, name))
-            print(f"找到照片: {name} ({exam_id})")
-    
-    print(f"总共找到 {len(existing_photos)} 张照片")
-    return existing_photos
-
-def check_missing_photos(directory, excel_path):
-    """检查缺失照片的主函数"""
+        if bad_files:
+            f.write("【需要重拍的文件】\n")
+            for filename in sorted(bad_files):
+                f.write(f"  {filename}: {bad_files[filename]}\n")
+            f.write("\n")
+        
+        f.write(f"\n统计信息:\n")
+        f.write(f"总学生数: {total_students}\n")
+        f.write(f"已拍照数: {has_photo_count}\n")
+        f.write(f"未拍照数: {missing_count}\n")
+        f.write(f"完成率: {completion_rate:.1f}%\n")
+        f.write(f"仅有照片: {media_counts['photo']}\n")
+        f.write(f"仅有视频: {media_counts['video']}\n")
+        f.write(f"照片视频都有: {media_counts['both']}\n")
+
+def check_missing_photos(directory, excel_path, verify=False, workers=None):
+    """
+    检查缺失照片的主函数
+
+    Args:
+        verify: 是否同时检查照片/视频的完整性（不完整、空文件、全黑画面等）
+        workers: 完整性检查的并行进程数
+    """
     print("="*60)
     print("学生拍照排查工具")
     print("="*60)
     
-    # 加载学生名单
-    all_students = load_all_students_from_excel(excel_path)
-    if not all_students:
+    # 加载学生名单（与 rename_files.py 共用身份索引）
+    student_index = load_student_index(excel_path)
+    if not len(student_index):
         print("❌ 没有从Excel文件中读取到学生信息")
         return
+    all_students = [(s.exam_id, s.name, s.class_name) for s in student_index.students]
     
-    # 获取现有照片
+    # 获取现有照片和视频，并解析到名单中的学生
     print(f"\n正在扫描目录: {directory}")
-    existing_photos = get_existing_photos(directory)
+    with MediaIndex(directory) as index:
+        stats = index.refresh()
+        files = index.files()
+    print(f"索引已更新: 新增 {stats['added']}，修改 {stats['updated']}，"
+          f"删除 {stats['removed']}，共 {stats['total']} 个文件 "
+          f"({stats['seconds'] * 1000:.1f} ms)")
+    media_status, file_students, mismatched, unresolved = resolve_media_files(files, student_index)
+    existing_photos = {key for key, kind in media_status.items() if kind != "video"}
+    print(f"总共找到 {len(existing_photos)} 名学生的照片")
+    
+    if mismatched:
+        print(f"\n💡 以下 {len(mismatched)} 个文件名与名单不一致（已按名单匹配）:")
+        for filename, student in mismatched:
+            print(f"  {filename} -> {student.exam_id}_{student.name}（{student.class_name}）")
+    if unresolved:
+        print(f"\n⚠️  以下 {len(unresolved)} 个文件无法对应到名单中的学生:")
+        resolver = FuzzyResolver(student_index)
+        for filename, reason in unresolved:
+            print(f"  {filename}: {reason}")
+            proposals = resolver.propose_for_file(filename)
+            if proposals:
+                print(f"    可能是: {describe_proposals(proposals)}")
     
     # 检查缺失的照片
     missing_photos = []
     has_photos = []
+    media_counts = {"photo": 0, "video": 0, "both": 0}
     
     for exam_id, name, class_name in all_students:
+        kind = media_status.get((exam_id, name))
+        if kind is not None:
+            media_counts[kind] += 1
         if (exam_id, name) in existing_photos:
             has_photos.append((exam_id, name, class_name))
         else:
             missing_photos.append((exam_id, name, class_name))
     
+    # 完整性检查，只报告名单中学生的文件
+    bad_files = {}
+    if verify:
+        from verify_media import verify_directory, describe_issues
+        print(f"\n正在检查文件完整性...")
+        for filename, (issues, details) in verify_directory(directory, workers).items():
+            if issues and filename in file_students:
+                bad_files[filename] = describe_issues(issues)
+    
     # 按班级分组显示结果
     print("\n" + "="*60)
     print("拍照情况统计")
@@ -125,10 +233,16 @@ def check_missing_photos(directory, excel_path):
         for class_name in sorted(missing_by_class.keys()):
             print(f"\n【{class_name}】:")
             for exam_id, name in sorted(missing_by_class[class_name]):
-                print(f"  {exam_id:<12} {name:<10}")
+                note = "（仅有视频）" if media_status.get((exam_id, name)) == "video" else ""
+                print(f"  {exam_id:<12} {name:<10}{note}")
     else:
         print(f"\n✅ 太棒了！所有同学都已经拍照了！")
     
+    if bad_files:
+        print(f"\n⚠️  以下 {len(bad_files)} 个文件有问题，建议重拍:")
+        for filename in sorted(bad_files):
+            print(f"  {filename}: {bad_files[filename]}")
+    
     # 总体统计
     print("\n" + "="*60)
     print("总体统计:")
@@ -136,30 +250,32 @@ def check_missing_photos(directory, excel_path):
     print(f"  已拍照数: {len(has_photos)}")
     print(f"  未拍照数: {len(missing_photos)}")
     print(f"  完成率: {(len(has_photos) / len(all_students)) * 100:.1f}%")
+    print(f"  仅有照片: {media_counts['photo']}")
+    print(f"  仅有视频: {media_counts['video']}")
+    print(f"  照片视频都有: {media_counts['both']}")
     
     # 保存缺失名单到文件
-    if missing_photos:
-        output_file = os.path.join(directory, "未拍照学生名单.txt")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("未拍照学生名单\n")
-            f.write("="*40 + "\n\n")
-            
-            for class_name in sorted(missing_by_class.keys()):
-                f.write(f"【{class_name}】\n")
-                for exam_id, name in sorted(missing_by_class[class_name]):
-                    f.write(f"  {exam_id} {name}\n")
-                f.write("\n")
-            
-            f.write(f"\n统计信息:\n")
-            f.write(f"总学生数: {len(all_students)}\n")
-            f.write(f"已拍照数: {len(has_photos)}\n")
-            f.write(f"未拍照数: {len(missing_photos)}\n")
-            f.write(f"完成率: {(len(has_photos) / len(all_students)) * 100:.1f}%\n")
+    if missing_photos or bad_files:
+        missing_by_class = {}
+        for exam_id, name, class_name in missing_photos:
+            missing_by_class.setdefault(class_name, []).append((exam_id, name))
+        output_file = os.path.join(directory, MISSING_LIST_FILENAME)
+        write_missing_list(output_file, missing_by_class, len(all_students),
+                           len(has_photos), media_status, media_counts, bad_files)
         
         print(f"\n📝 未拍照学生名单已保存到: {output_file}")
 
 def main():
     """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="学生拍照排查工具")
+    parser.add_argument("--verify", action="store_true",
+                        help="同时检查照片和视频的完整性")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="完整性检查的并行进程数（默认: CPU核数）")
+    args = parser.parse_args()
+
     # 设置路径
     current_dir = os.getcwd()
     excel_path = os.path.join(current_dir, "mt2025.xlsx")
@@ -173,7 +289,7 @@ def main():
     print(f"Excel文件: {excel_path}")
     
     # 执行检查
-    check_missing_photos(current_dir, excel_path)
+    check_missing_photos(current_dir, excel_path, verify=args.verify, workers=args.workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍照进度实时跟踪工具
+只读取一次名单，之后根据文件系统事件（或拍摄程序保存文件时的回调）
+逐个更新各班级的完成计数和未拍照名单，每次变化都写出
+未拍照学生名单.txt 和 拍照进度.json。
+"""
+
+import json
+import os
+import threading
+import time
+
+from check_missing_photos import MISSING_LIST_FILENAME, write_missing_list
+from media_index import MediaIndex, parse_media_filename
+from roster_watcher import FileSystemEventHandler, Observer
+from student_index import load_student_index
+
+PROGRESS_FILENAME = "拍照进度.json"
+
+
+class _MediaEventHandler(FileSystemEventHandler):
+    """把目录中的文件创建/删除/改名事件转发给 CompletionTracker"""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.tracker.add_file(os.path.basename(event.src_path))
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.tracker.remove_file(os.path.basename(event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.tracker.remove_file(os.path.basename(event.src_path))
+            if os.path.dirname(os.path.abspath(event.dest_path)) == self.tracker.directory:
+                self.tracker.add_file(os.path.basename(event.dest_path))
+
+
+class CompletionTracker:
+    """拍照进度跟踪器"""
+
+    def __init__(self, directory, excel_path, on_change=None, write_files=True):
+        """
+        初始化跟踪器
+
+        Args:
+            directory: 拍摄文件所在目录
+            excel_path: 学生名册
+            on_change: 状态变化后的回调 on_change(summary)，summary 见 summary()
+            write_files: 每次变化后是否写出名单和进度文件
+        """
+        self.directory = os.path.abspath(directory)
+        self.on_change = on_change
+        self.write_files = write_files
+        self._lock = threading.Lock()
+        self._observer = None
+        self._poll_thread = None
+        self._stop_event = threading.Event()
+
+        # {(考号, 姓名): 班级}
+        self.student_index = load_student_index(excel_path)
+        self.class_of = {}
+        self.class_stats = {}
+        self.missing_by_class = {}
+        for exam_id, name, class_name in self.student_index.students:
+            key = (exam_id, name)
+            if key in self.class_of:
+                continue
+            self.class_of[key] = class_name
+            stats = self.class_stats.setdefault(class_name, {"total": 0, "has_photo": 0})
+            stats["total"] += 1
+            self.missing_by_class.setdefault(class_name, set()).add(key)
+
+        # {(考号, 姓名): {文件名}}，同一学生可能有多个照片/视频文件
+        self.photo_files = {}
+        self.video_files = {}
+        self.media_counts = {"photo": 0, "video": 0, "both": 0}
+        self.has_photo_count = 0
+
+        # 用持久化索引做一次初始扫描
+        with MediaIndex(self.directory) as index:
+            index.refresh()
+            for filename, *_ in index.files():
+                self._add(filename)
+        self._write_outputs()
+
+    def _media_kind_of(self, key):
+        has_photo = bool(self.photo_files.get(key))
+        has_video = bool(self.video_files.get(key))
+        if has_photo and has_video:
+            return "both"
+        if has_photo:
+            return "photo"
+        if has_video:
+            return "video"
+        return None
+
+    def _update(self, filename, adding):
+        """登记或注销一个文件，返回状态是否发生变化（O(1)）"""
+        parsed = parse_media_filename(filename)
+        if parsed is None:
+            return False
+        exam_id, name, kind = parsed
+        if exam_id is None:
+            name = os.path.splitext(filename)[0]
+        # 与 check_missing_photos 相同的解析规则：考号优先，重名无法确定时不计入
+        student = self.student_index.resolve(exam_id, name).student
+        if student is None:
+            return False
+        key = (student.exam_id, student.name)
+        class_name = self.class_of[key]
+
+        files = self.photo_files if kind == "photo" else self.video_files
+        names = files.setdefault(key, set())
+        if (filename in names) == adding:
+            return False
+
+        before = self._media_kind_of(key)
+        if adding:
+            names.add(filename)
+        else:
+            names.discard(filename)
+        after = self._media_kind_of(key)
+
+        if before is not None:
+            self.media_counts[before] -= 1
+        if after is not None:
+            self.media_counts[after] += 1
+
+        had_photo = before in ("photo", "both")
+        has_photo = after in ("photo", "both")
+        if has_photo and not had_photo:
+            self.class_stats[class_name]["has_photo"] += 1
+            self.has_photo_count += 1
+            self.missing_by_class[class_name].discard(key)
+        elif had_photo and not has_photo:
+            self.class_stats[class_name]["has_photo"] -= 1
+            self.has_photo_count -= 1
+            self.missing_by_class[class_name].add(key)
+        return True
+
+    def _add(self, filename):
+        return self._update(filename, adding=True)
+
+    def add_file(self, filename):
+        """登记新保存的文件（可由拍摄程序在保存后直接调用）"""
+        with self._lock:
+            changed = self._update(os.path.basename(filename), adding=True)
+            if changed:
+                self._write_outputs()
+        if changed:
+            self._notify()
+        return changed
+
+    def remove_file(self, filename):
+        """注销被删除或改名的文件"""
+        with self._lock:
+            changed = self._update(os.path.basename(filename), adding=False)
+            if changed:
+                self._write_outputs()
+        if changed:
+            self._notify()
+        return changed
+
+    def summary(self):
+        """
+        当前进度概要
+
+        Returns:
+            dict: {"total", "has_photo", "missing", "media": {...},
+                   "classes": {班级: {"total", "has_photo", "missing"}}}
+        """
+        total = len(self.class_of)
+        return {
+            "total": total,
+            "has_photo": self.has_photo_count,
+            "missing": total - self.has_photo_count,
+            "media": dict(self.media_counts),
+            "classes": {
+                class_name: {
+                    "total": stats["total"],
+                    "has_photo": stats["has_photo"],
+                    "missing": stats["total"] - stats["has_photo"],
+                }
+                for class_name, stats in self.class_stats.items()
+            },
+        }
+
+    def _write_outputs(self):
+        if not self.write_files:
+            return
+        media_status = {key: self._media_kind_of(key) for key in self.class_of}
+        missing_by_class = {c: list(keys) for c, keys in self.missing_by_class.items()}
+        write_missing_list(os.path.join(self.directory, MISSING_LIST_FILENAME),
+                           missing_by_class, len(self.class_of), self.has_photo_count,
+                           media_status, self.media_counts)
+
+        progress = self.summary()
+        progress["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        for class_name, stats in progress["classes"].items():
+            stats["missing_students"] = [
+                {"exam_id": exam_id, "name": name,
+                 "media": media_status[(exam_id, name)]}
+                for exam_id, name in sorted(self.missing_by_class[class_name])
+            ]
+        # 先写临时文件再替换，避免读取方看到写了一半的JSON
+        progress_file = os.path.join(self.directory, PROGRESS_FILENAME)
+        tmp_file = progress_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(progress, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, progress_file)
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change(self.summary())
+
+    def start(self, poll_interval=1.0):
+        """开始订阅目录中的文件事件（未安装 watchdog 时轮询目录）"""
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_MediaEventHandler(self), self.directory, recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._poll_thread = threading.Thread(
+                target=self._poll_loop, args=(poll_interval,), daemon=True)
+            self._poll_thread.start()
+        return self
+
+    def stop(self):
+        """停止订阅"""
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+            self._observer = None
+
+    def _poll_loop(self, poll_interval):
+        with os.scandir(self.directory) as entries:
+            known = {entry.name for entry in entries if entry.is_file()}
+        while not self._stop_event.wait(poll_interval):
+            with os.scandir(self.directory) as entries:
+                current = {entry.name for entry in entries if entry.is_file()}
+            for filename in current - known:
+                self.add_file(filename)
+            for filename in known - current:
+                self.remove_file(filename)
+            known = current
+
+
+def format_summary(summary, class_name=None):
+    """进度概要的一行文字描述"""
+    text = f"总进度 {summary['has_photo']}/{summary['total']}"
+    if class_name and class_name in summary["classes"]:
+        stats = summary["classes"][class_name]
+        text = f"{class_name} {stats['has_photo']}/{stats['total']}，" + text
+    return text
+
+
+def main():
+    """主函数"""
+    current_dir = os.getcwd()
+    excel_path = os.path.join(current_dir, "mt2025.xlsx")
+
+    if not os.path.exists(excel_path):
+        print(f"❌ Excel文件不存在: {excel_path}")
+        return
+
+    def on_change(summary):
+        print(f"[{time.strftime('%H:%M:%S')}] {format_summary(summary)}，"
+              f"未拍照 {summary['missing']} 人")
+
+    tracker = CompletionTracker(current_dir, excel_path, on_change=on_change)
+    print(f"📷 开始跟踪拍照进度: {format_summary(tracker.summary())}")
+    print(f"   进度文件: {os.path.join(current_dir, PROGRESS_FILENAME)}")
+    tracker.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n停止跟踪")
+    finally:
+        tracker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,169 +7,506 @@ Excel文件格式转换程序
 
 import openpyxl
 from openpyxl import Workbook
+import csv
+import hashlib
 import os
+import tempfile
+import zipfile
 
-def convert_excel_format(input_file="2025.xlsx", output_file="mt2025.xlsx"):
+# 快速名册缓存格式：首行为版本标记，其余每行 "班级\t考号\t姓名"
+ROSTER_CACHE_HEADER = "#roster-cache v1"
+
+
+def iter_intake_rows(input_file):
     """
-    将原始Excel文件转换为tvds.py要求的格式
-    
+    逐行读取原始名册，产出 (班级, 考号, 姓名)
+
     原始格式：序号、班级、录取编号、考号、新生姓名、性别、备注
-    目标格式：考号、姓名（按班级分Sheet）
+    使用只读模式流式读取，内存占用与文件大小无关
     """
-    
-    # 检查输入文件是否存在
-    if not os.path.exists(input_file):
-        print(f"错误：找不到输入文件 {input_file}")
-        return False
-    
+    workbook = openpyxl.load_workbook(input_file, read_only=True)
     try:
-        # 打开原始文件
-        print(f"正在读取文件：{input_file}")
-        workbook = openpyxl.load_workbook(input_file, read_only=True)
-        
         # 假设数据在第一个工作表中
         sheet = workbook.active
-        
-        # 读取所有数据，按班级分组
-        class_data = {}
-        row_count = 0
-        
-        print("正在解析数据...")
-        
+
         # 遍历所有行（从第2行开始，跳过表头）
         for row in sheet.iter_rows(min_row=2, values_only=True):
             if len(row) < 5:  # 确保行数据完整
                 continue
-                
-            # 提取数据：序号、班级、录取编号、考号、新生姓名、性别、备注
-            serial_num = row[0]  # 序号
+
             class_num = row[1]   # 班级
-            admission_num = row[2]  # 录取编号
             exam_id = row[3]     # 考号
             student_name = row[4]  # 新生姓名
-            
+
             # 检查关键数据是否存在
             if not exam_id or not student_name:
                 continue
-            
+
             # 跳过表头行（如果考号列是"考号"文字）
             if str(exam_id).strip() == "考号" or str(student_name).strip() == "新生姓名":
                 continue
-                
+
             # 确保班级号是整数
             if class_num is not None:
+                # 如果班级列包含"班级"文字，跳过
+                if str(class_num).strip() == "班级":
+                    continue
                 try:
-                    # 如果班级列包含"班级"文字，跳过
-                    if str(class_num).strip() == "班级":
-                        continue
                     class_key = f"班级{int(class_num)}"
                 except (ValueError, TypeError):
                     # 如果无法转换为整数，使用原值
-                    if str(class_num).strip() == "班级":
-                        continue
                     class_key = f"班级{class_num}"
             else:
                 class_key = "未分班"
-            
-            # 按班级分组存储
-            if class_key not in class_data:
-                class_data[class_key] = []
-            
-            class_data[class_key].append((exam_id, student_name))
-            row_count += 1
-        
+
+            yield class_key, exam_id, student_name
+    finally:
         workbook.close()
-        
-        print(f"共读取到 {row_count} 条学生记录")
-        print(f"发现 {len(class_data)} 个班级：{list(class_data.keys())}")
-        
-        # 创建新的Excel文件
+
+
+def row_checksum_line(exam_id, name):
+    """校验和中单行数据的规范表示（考号、姓名统一转为去空白的字符串）"""
+    return f"{str(exam_id).strip()}\t{str(name).strip()}\n".encode("utf-8")
+
+
+def convert_excel_format(input_file="2025.xlsx", output_file="mt2025.xlsx",
+                         csv_file=None, cache_file=None):
+    """
+    将原始Excel文件转换为tvds.py要求的格式
+
+    原始格式：序号、班级、录取编号、考号、新生姓名、性别、备注
+    目标格式：考号、姓名（按班级分Sheet）
+
+    使用 write-only 工作簿逐行写出，各班级工作表交错追加，
+    不在内存中保留学生数据，大文件转换的内存占用为常数。
+
+    Args:
+        input_file: 原始名册文件
+        output_file: 输出的Excel文件
+        csv_file: 可选，同时输出 "班级,考号,姓名" 格式的CSV文件
+        cache_file: 可选，同时输出快速名册缓存（见 load_roster_cache）
+
+    Returns:
+        dict: {班级名: {"count": 学生数, "sha1": 行校验和}}，失败时返回 None
+    """
+
+    # 检查输入文件是否存在
+    if not os.path.exists(input_file):
+        print(f"错误：找不到输入文件 {input_file}")
+        return None
+
+    csv_handle = None
+    cache_handle = None
+    try:
+        print(f"正在读取文件：{input_file}")
         print(f"正在创建输出文件：{output_file}")
-        new_workbook = Workbook()
-        
-        # 删除默认的sheet
-        new_workbook.remove(new_workbook.active)
-        
-        # 为每个班级创建一个工作表
-        for class_name, students in class_data.items():
-            print(f"正在创建工作表：{class_name}（{len(students)}名学生）")
-            
-            # 创建新的工作表
-            ws = new_workbook.create_sheet(title=class_name)
-            
-            # 添加表头
-            ws.append(["考号", "姓名"])
-            
-            # 添加学生数据
-            for exam_id, name in students:
-                ws.append([exam_id, name])
-            
-            # 调整列宽
-            ws.column_dimensions['A'].width = 15  # 考号列
-            ws.column_dimensions['B'].width = 12  # 姓名列
-        
+        new_workbook = Workbook(write_only=True)
+
+        if csv_file:
+            # utf-8-sig 让 Excel 直接打开时正确识别中文
+            csv_handle = open(csv_file, "w", encoding="utf-8-sig", newline="")
+            csv_writer = csv.writer(csv_handle)
+            csv_writer.writerow(["班级", "考号", "姓名"])
+        if cache_file:
+            cache_handle = open(cache_file, "w", encoding="utf-8", newline="\n")
+            cache_handle.write(ROSTER_CACHE_HEADER + "\n")
+
+        # 每个班级只保存工作表句柄、人数和校验和
+        sheets = {}
+        class_stats = {}
+        digests = {}
+        row_count = 0
+
+        print("正在解析数据...")
+        for class_key, exam_id, student_name in iter_intake_rows(input_file):
+            ws = sheets.get(class_key)
+            if ws is None:
+                print(f"正在创建工作表：{class_key}")
+                ws = new_workbook.create_sheet(title=class_key)
+                # write-only 模式下列宽必须在写入第一行之前设置
+                ws.column_dimensions['A'].width = 15  # 考号列
+                ws.column_dimensions['B'].width = 12  # 姓名列
+                ws.append(["考号", "姓名"])
+                sheets[class_key] = ws
+                class_stats[class_key] = {"count": 0, "sha1": None}
+                digests[class_key] = hashlib.sha1()
+
+            ws.append([exam_id, student_name])
+            class_stats[class_key]["count"] += 1
+            digests[class_key].update(row_checksum_line(exam_id, student_name))
+
+            if csv_handle:
+                csv_writer.writerow([class_key, exam_id, student_name])
+            if cache_handle:
+                cache_handle.write(
+                    f"{class_key}\t{str(exam_id).strip()}\t{str(student_name).strip()}\n"
+                )
+            row_count += 1
+
+        for class_key, digest in digests.items():
+            class_stats[class_key]["sha1"] = digest.hexdigest()
+
+        print(f"共读取到 {row_count} 条学生记录")
+        print(f"发现 {len(class_stats)} 个班级：{list(class_stats.keys())}")
+
         # 保存文件
         new_workbook.save(output_file)
-        new_workbook.close()
-        
+
         print(f"✅ 转换完成！输出文件：{output_file}")
+        if csv_file:
+            print(f"   CSV文件：{csv_file}")
+        if cache_file:
+            print(f"   名册缓存：{cache_file}")
         print("\n文件结构：")
-        for class_name, students in class_data.items():
-            print(f"  📋 {class_name}: {len(students)}名学生")
-        
-        return True
-        
+        for class_name, stats in class_stats.items():
+            print(f"  📋 {class_name}: {stats['count']}名学生")
+
+        return class_stats
+
     except Exception as e:
         print(f"❌ 转换过程中发生错误：{e}")
         import traceback
         traceback.print_exc()
-        return False
+        return None
+    finally:
+        if csv_handle:
+            csv_handle.close()
+        if cache_handle:
+            cache_handle.close()
+
+
+def load_roster_cache(cache_file):
+    """
+    读取快速名册缓存
+
+    Returns:
+        dict: {班级名: [(考号, 姓名), ...]}，保持原始顺序
+    """
+    students_by_class = {}
+    with open(cache_file, encoding="utf-8") as f:
+        header = f.readline().rstrip("\n")
+        if header != ROSTER_CACHE_HEADER:
+            raise ValueError(f"不支持的名册缓存格式: {header}")
+        for line in f:
+            class_name, exam_id, name = line.rstrip("\n").split("\t")
+            students_by_class.setdefault(class_name, []).append((exam_id, name))
+    return students_by_class
+
+
+def compute_sheet_checksums(output_file):
+    """
+    流式读取输出文件，计算每个工作表的人数和行校验和
+
+    不依赖只读模式下不可靠的 max_row，逐行累计。
+    """
+    class_stats = {}
+    workbook = openpyxl.load_workbook(output_file, read_only=True)
+    try:
+        for sheet_name in workbook.sheetnames:
+            digest = hashlib.sha1()
+            count = 0
+            for row in workbook[sheet_name].iter_rows(min_row=2, values_only=True):
+                if len(row) >= 2 and row[0] and row[1]:
+                    digest.update(row_checksum_line(row[0], row[1]))
+                    count += 1
+            class_stats[sheet_name] = {"count": count, "sha1": digest.hexdigest()}
+    finally:
+        workbook.close()
+    return class_stats
+
 
-def verify_output_file(output_file="mt2025.xlsx"):
+def verify_output_file(output_file="mt2025.xlsx", expected_stats=None):
     """
     验证输出文件的格式是否正确
+
+    每个工作表只流式读取一遍，内存占用为常数。
+
+    Args:
+        output_file: 待验证的Excel文件
+        expected_stats: 转换时得到的 {班级名: {"count", "sha1"}}，
+                        提供时逐班比对人数和行校验和，工作表缺失、多出或任何一项不一致都算失败
     """
     print(f"\n正在验证输出文件：{output_file}")
-    
+
     try:
-        workbook = openpyxl.load_workbook(output_file, read_only=True)
-        sheet_names = workbook.sheetnames
-        
-        print(f"工作表数量：{len(sheet_names)}")
-        
+        class_stats = compute_sheet_checksums(output_file)
+        print(f"工作表数量：{len(class_stats)}")
+
         total_students = 0
-        for sheet_name in sheet_names:
-            sheet = workbook[sheet_name]
-            # 计算学生数量（减去表头行）
-            student_count = sheet.max_row - 1 if sheet.max_row > 1 else 0
-            total_students += student_count
-            print(f"  📋 {sheet_name}: {student_count}名学生")
-            
-            # 检查前几行数据格式
-            if student_count > 0:
-                for row_num, row in enumerate(sheet.iter_rows(min_row=2, max_row=3, values_only=True), 2):
-                    if row[0] and row[1]:  # 考号和姓名都不为空
-                        print(f"    示例数据: {row[0]} - {row[1]}")
-                        break
-        
-        workbook.close()
+        mismatched = []
+        for sheet_name, stats in class_stats.items():
+            total_students += stats["count"]
+            print(f"  📋 {sheet_name}: {stats['count']}名学生")
+            expected = expected_stats.get(sheet_name) if expected_stats is not None else None
+            if expected is not None and (expected["count"], expected["sha1"]) != \
+                    (stats["count"], stats["sha1"]):
+                mismatched.append(sheet_name)
+
+        if expected_stats is not None:
+            missing = [name for name in expected_stats if name not in class_stats]
+            extra = [name for name in class_stats if name not in expected_stats]
+            if missing or extra or mismatched:
+                print(f"❌ 验证失败：缺少工作表 {missing}，多出工作表 {extra}，"
+                      f"人数或校验和不一致 {mismatched}")
+                return False
+
         print(f"✅ 验证通过！总计 {total_students} 名学生")
         return True
-        
+
     except Exception as e:
         print(f"❌ 验证失败：{e}")
         return False
 
-if __name__ == "__main__":
+def load_converted_rosters(output_file):
+    """
+    读取已转换文件中各班级的学生名单
+
+    Returns:
+        dict: {班级名: [(考号, 姓名), ...]}，考号和姓名均为去空白的字符串
+    """
+    students_by_class = {}
+    workbook = openpyxl.load_workbook(output_file, read_only=True)
+    try:
+        for sheet_name in workbook.sheetnames:
+            students = []
+            for row in workbook[sheet_name].iter_rows(min_row=2, values_only=True):
+                if len(row) >= 2 and row[0] and row[1]:
+                    students.append((str(row[0]).strip(), str(row[1]).strip()))
+            students_by_class[sheet_name] = students
+    finally:
+        workbook.close()
+    return students_by_class
+
+
+def diff_rosters(old_by_class, new_by_class):
+    """
+    按考号比较新旧名单
+
+    Returns:
+        dict: added/removed 为 [(考号, 姓名, 班级)]，
+              moved 为 [(考号, 姓名, 原班级, 新班级)]，
+              renamed 为 [(考号, 原姓名, 新姓名, 班级)]，
+              changed_classes 为内容或顺序有变化的班级列表
+    """
+    old_index = {exam_id: (name, class_name)
+                 for class_name, students in old_by_class.items()
+                 for exam_id, name in students}
+    new_index = {exam_id: (name, class_name)
+                 for class_name, students in new_by_class.items()
+                 for exam_id, name in students}
+
+    added = [(exam_id, name, class_name)
+             for exam_id, (name, class_name) in new_index.items()
+             if exam_id not in old_index]
+    removed = [(exam_id, name, class_name)
+               for exam_id, (name, class_name) in old_index.items()
+               if exam_id not in new_index]
+    moved = [(exam_id, name, old_index[exam_id][1], class_name)
+             for exam_id, (name, class_name) in new_index.items()
+             if exam_id in old_index and old_index[exam_id][1] != class_name]
+    renamed = [(exam_id, old_index[exam_id][0], name, class_name)
+               for exam_id, (name, class_name) in new_index.items()
+               if exam_id in old_index and old_index[exam_id][0] != name]
+
+    all_classes = list(new_by_class) + [c for c in old_by_class if c not in new_by_class]
+    changed_classes = [c for c in all_classes
+                       if old_by_class.get(c) != new_by_class.get(c)]
+
+    return {
+        "added": added,
+        "removed": removed,
+        "moved": moved,
+        "renamed": renamed,
+        "changed_classes": changed_classes,
+    }
+
+
+def _write_class_workbook(students_by_class, output_file):
+    """按班级写出工作簿，格式与 convert_excel_format 完全一致"""
+    workbook = Workbook(write_only=True)
+    for class_name, students in students_by_class.items():
+        ws = workbook.create_sheet(title=class_name)
+        ws.column_dimensions['A'].width = 15  # 考号列
+        ws.column_dimensions['B'].width = 12  # 姓名列
+        ws.append(["考号", "姓名"])
+        for exam_id, name in students:
+            ws.append([exam_id, name])
+    workbook.save(output_file)
+
+
+def _merge_unchanged_entries(old_file, new_file, output_file):
+    """
+    合并新旧两个xlsx压缩包
+
+    内容未变的压缩包条目（如未变班级的工作表XML）沿用旧文件的条目信息，
+    保证其字节完全不变；其余条目取自新文件。
+
+    Returns:
+        int: 沿用旧条目的数量
+    """
+    reused = 0
+    with zipfile.ZipFile(old_file) as old_zip, \
+            zipfile.ZipFile(new_file) as new_zip, \
+            zipfile.ZipFile(output_file, "w") as out_zip:
+        old_entries = {info.filename: info for info in old_zip.infolist()}
+        for info in new_zip.infolist():
+            data = new_zip.read(info)
+            old_info = old_entries.get(info.filename)
+            if old_info is not None and old_zip.read(old_info) == data:
+                out_zip.writestr(old_info, data)
+                reused += 1
+            else:
+                out_zip.writestr(info, data)
+    return reused
+
+
+def convert_excel_incremental(input_file="2025.xlsx", output_file="mt2025.xlsx"):
+    """
+    增量转换：与上一次的转换结果逐班比较，只重写有变化的班级
+
+    - 报告新增、移除和调班的学生
+    - 没有任何变化时不写文件，保持文件修改时间不变
+    - 有变化时，未变班级的工作表在新文件中字节完全不变，
+      下游工具可以据此跳过这些班级
+
+    Returns:
+        dict: diff_rosters 的结果，失败时返回 None
+    """
+    if not os.path.exists(output_file):
+        print(f"未找到上一次的转换结果 {output_file}，执行完整转换")
+        class_stats = convert_excel_format(input_file, output_file)
+        if class_stats is None:
+            return None
+        return {"added": [], "removed": [], "moved": [], "renamed": [],
+                "changed_classes": list(class_stats)}
+
+    if not os.path.exists(input_file):
+        print(f"错误：找不到输入文件 {input_file}")
+        return None
+
+    try:
+        print(f"正在读取上一次的转换结果：{output_file}")
+        old_by_class = load_converted_rosters(output_file)
+
+        print(f"正在读取文件：{input_file}")
+        # 写出时保留原始单元格值（数字考号仍写为数字），比较时使用规范化字符串
+        raw_by_class = {}
+        for class_key, exam_id, student_name in iter_intake_rows(input_file):
+            raw_by_class.setdefault(class_key, []).append((exam_id, student_name))
+
+        # 保持原有班级顺序，新出现的班级排在最后，避免工作表整体错位
+        ordered = {c: raw_by_class[c] for c in old_by_class if c in raw_by_class}
+        ordered.update((c, students) for c, students in raw_by_class.items()
+                       if c not in ordered)
+        raw_by_class = ordered
+        new_by_class = {
+            c: [(str(exam_id).strip(), str(name).strip()) for exam_id, name in students]
+            for c, students in raw_by_class.items()
+        }
+
+        diff = diff_rosters(old_by_class, new_by_class)
+
+        print(f"新增学生：{len(diff['added'])}")
+        for exam_id, name, class_name in diff["added"]:
+            print(f"  ➕ {exam_id} {name} -> {class_name}")
+        print(f"移除学生：{len(diff['removed'])}")
+        for exam_id, name, class_name in diff["removed"]:
+            print(f"  ➖ {exam_id} {name} ({class_name})")
+        print(f"调班学生：{len(diff['moved'])}")
+        for exam_id, name, old_class, new_class in diff["moved"]:
+            print(f"  🔀 {exam_id} {name}: {old_class} -> {new_class}")
+        print(f"改名学生：{len(diff['renamed'])}")
+        for exam_id, old_name, new_name, class_name in diff["renamed"]:
+            print(f"  ✏️  {exam_id} {old_name} -> {new_name} ({class_name})")
+
+        if not diff["changed_classes"] and list(old_by_class) == list(new_by_class):
+            print("✅ 名单没有变化，保留现有文件")
+            return diff
+
+        print(f"有变化的班级：{diff['changed_classes']}")
+
+        # 先写到临时文件，再与旧文件合并，最后原子替换
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        fd, fresh_file = tempfile.mkstemp(suffix=".xlsx", dir=output_dir)
+        os.close(fd)
+        fd, merged_file = tempfile.mkstemp(suffix=".xlsx", dir=output_dir)
+        os.close(fd)
+        try:
+            _write_class_workbook(raw_by_class, fresh_file)
+            reused = _merge_unchanged_entries(output_file, fresh_file, merged_file)
+            os.replace(merged_file, output_file)
+        finally:
+            for path in (fresh_file, merged_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        unchanged = [c for c in new_by_class if c not in diff["changed_classes"]]
+        print(f"✅ 增量转换完成！重写 {len(diff['changed_classes'])} 个班级，"
+              f"保留 {len(unchanged)} 个班级（沿用 {reused} 个文件条目）")
+        return diff
+
+    except Exception as e:
+        print(f"❌ 增量转换过程中发生错误：{e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Excel文件格式转换程序")
+    parser.add_argument("-i", "--input", default="2025.xlsx",
+                        help="原始名册文件（默认: 2025.xlsx）")
+    parser.add_argument("-o", "--output", default="mt2025.xlsx",
+                        help="输出文件（默认: mt2025.xlsx）")
+    parser.add_argument("--csv", default=None,
+                        help="同时输出按班级标注的CSV文件")
+    parser.add_argument("--cache", default=None,
+                        help="同时输出快速名册缓存文件")
+    parser.add_argument("--incremental", action="store_true",
+                        help="与已有输出文件比较，只重写有变化的班级")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视原始名册，保存后自动增量转换")
+    args = parser.parse_args()
+    if (args.incremental or args.watch) and (args.csv or args.cache):
+        # 增量转换只重写有变化的班级，无法同时生成完整的CSV和名册缓存
+        parser.error("--incremental 和 --watch 不能与 --csv、--cache 同时使用")
+
     print("🔄 Excel文件格式转换程序")
     print("=" * 50)
     
+    if args.watch:
+        from roster_watcher import RosterWatcher, watch_forever
+
+        def on_intake_changed(path):
+            print(f"\n🔄 检测到 {path} 已修改，重新转换")
+            convert_excel_incremental(path, args.output)
+
+        convert_excel_incremental(args.input, args.output)
+        watch_forever(RosterWatcher([args.input], on_intake_changed))
+        return
+
+    if args.incremental:
+        diff = convert_excel_incremental(args.input, args.output)
+        if diff is not None:
+            verify_output_file(args.output)
+        else:
+            print("\n❌ 转换失败，请检查输入文件格式。")
+        return
+
     # 执行转换
-    success = convert_excel_format()
+    class_stats = convert_excel_format(args.input, args.output,
+                                       csv_file=args.csv, cache_file=args.cache)
     
-    if success:
+    if class_stats is not None:
         # 验证输出文件
-        verify_output_file()
-        print("\n✨ 转换完成！现在可以在tvds.py中使用mt2025.xlsx文件了。")
+        verify_output_file(args.output, expected_stats=class_stats)
+        print(f"\n✨ 转换完成！现在可以在tvds.py中使用{args.output}文件了。")
     else:
-        print("\n❌ 转换失败，请检查输入文件格式。")
\ No newline at end of file
+        print("\n❌ 转换失败，请检查输入文件格式。")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,14 @@
 
 import os
 import glob
+import contextlib
+import hashlib
+import json
 import openpyxl
 import re
+import struct
+from io import BytesIO, StringIO
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from pptx import Presentation
 from pptx.util import Inches, Pt
@@ -16,6 +22,21 @@ from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
 from PIL import Image
 
+from deck_manifest import build_deck_manifest, describe_changes, load_deck_manifest, save_deck_manifest
+
+# 预缩放图片缓存：按显示尺寸和目标DPI缩放后重新编码，PPT中嵌入缓存中的图片
+IMAGE_CACHE_DIRNAME = ".image_cache"
+TARGET_DPI = 150
+JPEG_QUALITY = 90
+
+# 页面布局（英寸/磅），变化时所有班级的PPT都会重新生成
+SLIDE_WIDTH = 13.33
+SLIDE_HEIGHT = 7.5
+PHOTO_MAX_WIDTH = 8
+PHOTO_MAX_HEIGHT = 6
+FONT_NAME = "微软雅黑"
+FONT_SIZE = 72  # 一号字体大约72磅
+
 def load_students_by_class(excel_path):
     """从Excel文件中按班级加载学生信息"""
     print(f"正在读取Excel文件: {excel_path}")
@@ -60,37 +81,239 @@ def find_student_photos(directory):
     print(f"找到 {len(photos_dict)} 张学生照片")
     return photos_dict
 
-def resize_image_for_ppt(image_path, max_width=8, max_height=6):
+# 图片尺寸缓存 {路径: (修改时间, (宽, 高))}
+_image_size_cache = {}
+
+# JPEG 中带有图片尺寸的 SOF 段（C4/C8/CC 不是 SOF）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                     0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _read_header_size(f):
+    """只读文件头，返回 PNG(IHDR)/JPEG(SOF) 的 (宽, 高)，其他格式返回 None"""
+    head = f.read(24)
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    if head[:2] != b"\xff\xd8":
+        return None
+    
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # 填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        # 没有长度字段的标记
+        if code == 0x01 or 0xD0 <= code <= 0xD9:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if code in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+def probe_image_size(image_path):
+    """
+    读取图片尺寸（只解析文件头，按 路径+修改时间 缓存）
+    
+    PNG/JPEG 以外的格式交给 PIL 处理
+    
+    Returns:
+        tuple: (宽, 高)，像素
+    """
+    mtime_ns = os.stat(image_path).st_mtime_ns
+    cached = _image_size_cache.get(image_path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    
+    with open(image_path, "rb") as f:
+        size = _read_header_size(f)
+    if size is None:
+        with Image.open(image_path) as img:
+            size = img.size
+    _image_size_cache[image_path] = (mtime_ns, size)
+    return size
+
+def resize_image_for_ppt(image_path, max_width=PHOTO_MAX_WIDTH, max_height=PHOTO_MAX_HEIGHT):
     """调整图片大小以适应PPT页面"""
     try:
-        with Image.open(image_path) as img:
-            # 获取原始尺寸
-            orig_width, orig_height = img.size
-            
-            # 计算缩放比例
-            width_ratio = (max_width * 96) / orig_width  # PPT中1英寸=96像素
-            height_ratio = (max_height * 96) / orig_height
-            scale_ratio = min(width_ratio, height_ratio, 1.0)  # 不放大，只缩小
-            
-            # 计算新尺寸（英寸）
-            new_width = Inches(orig_width * scale_ratio / 96)
-            new_height = Inches(orig_height * scale_ratio / 96)
-            
-            return new_width, new_height
+        # 获取原始尺寸
+        orig_width, orig_height = probe_image_size(image_path)
+        
+        # 计算缩放比例
+        width_ratio = (max_width * 96) / orig_width  # PPT中1英寸=96像素
+        height_ratio = (max_height * 96) / orig_height
+        scale_ratio = min(width_ratio, height_ratio, 1.0)  # 不放大，只缩小
+        
+        # 计算新尺寸（英寸）
+        new_width = Inches(orig_width * scale_ratio / 96)
+        new_height = Inches(orig_height * scale_ratio / 96)
+        
+        return new_width, new_height
     except Exception as e:
         print(f"处理图片 {image_path} 时出错: {e}")
         return Inches(6), Inches(4.5)  # 默认尺寸
 
-def create_class_ppt(class_name, students, photos_dict, output_dir):
-    """为指定班级创建PPT"""
+class ScaledImageCache:
+    """
+    预缩放图片缓存
+    
+    缓存文件按 源图片内容哈希+目标像素尺寸 命名，内容相同的图片只保存一份；
+    index.json 记录每个源文件的 大小+修改时间，源文件没变时不需要重新读取和计算哈希。
+    保存时只保留本次运行用到的源文件，照片被删除或替换后旧的缓存文件随之清理。
+    """
+    
+    def __init__(self, cache_dir, dpi=TARGET_DPI, quality=JPEG_QUALITY):
+        self.cache_dir = cache_dir
+        self.dpi = dpi
+        self.quality = quality
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+        self.created = 0
+        self.reused = 0
+        # 本次运行中新增或变化的索引项，子进程用它把结果交回主进程
+        self.updated = {}
+        # 本次运行用到的源文件，保存时其余索引项被清理
+        self.used = set()
+    
+    def get(self, image_path, display_width, display_height):
+        """
+        返回缩放到显示尺寸的图片数据
+        
+        Args:
+            image_path: 源图片
+            display_width, display_height: 在PPT中显示的尺寸（EMU）
+        
+        Returns:
+            bytes: 缓存中的 JPEG 数据，可用 BytesIO 包装后交给 add_picture
+        """
+        # 目标像素尺寸 = 显示尺寸（英寸）× DPI
+        target = (max(1, round(display_width / Inches(1) * self.dpi)),
+                  max(1, round(display_height / Inches(1) * self.dpi)))
+        st = os.stat(image_path)
+        source_key = os.path.abspath(image_path)
+        self.used.add(source_key)
+        entry = self.index.get(source_key)
+        if (entry and (entry["size"], entry["mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+                and entry["target"] == list(target)
+                and os.path.exists(os.path.join(self.cache_dir, entry["file"]))):
+            self.reused += 1
+            with open(os.path.join(self.cache_dir, entry["file"]), "rb") as f:
+                return f.read()
+        
+        # 源图片只读取一次：同一份数据用于计算哈希和解码
+        with open(image_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        filename = f"{digest}_{target[0]}x{target[1]}_q{self.quality}.jpg"
+        cached_path = os.path.join(self.cache_dir, filename)
+        if os.path.exists(cached_path):
+            self.reused += 1
+            with open(cached_path, "rb") as f:
+                blob = f.read()
+        else:
+            with Image.open(BytesIO(data)) as img:
+                img = img.convert("RGB")
+                # 只缩小不放大
+                if target[0] < img.width or target[1] < img.height:
+                    img = img.resize(target, Image.LANCZOS)
+                output = BytesIO()
+                img.save(output, "JPEG", quality=self.quality, optimize=True)
+            blob = output.getvalue()
+            # 多个进程可能同时生成同一个缓存文件，临时文件名带上进程号
+            tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, cached_path)
+            self.created += 1
+        
+        self.index[source_key] = self.updated[source_key] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "target": list(target),
+            "file": filename,
+        }
+        return blob
+    
+    def keep(self, image_paths):
+        """标记源图片仍在使用（如跳过的班级的照片），保存时不清理它们的缓存"""
+        self.used.update(os.path.abspath(path) for path in image_paths)
+    
+    def take_updates(self):
+        """取出并清空本进程的 (新增索引项, 用到的源文件, 新生成数, 复用数)"""
+        updates = (self.updated, self.used, self.created, self.reused)
+        self.updated = {}
+        self.used = set()
+        self.created = 0
+        self.reused = 0
+        return updates
+    
+    def merge_updates(self, updates):
+        """合并子进程 take_updates() 的结果"""
+        updated, used, created, reused = updates
+        self.index.update(updated)
+        self.used.update(used)
+        self.created += created
+        self.reused += reused
+    
+    def save(self):
+        """保存索引，清理本次没有用到的源文件，并删除不再被任何源图片使用的缓存文件"""
+        self.index = {key: entry for key, entry in self.index.items() if key in self.used}
+        used = {entry["file"] for entry in self.index.values()}
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".jpg") and filename not in used:
+                os.remove(os.path.join(self.cache_dir, filename))
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+def deck_path(output_dir, class_name):
+    """班级PPT的保存路径"""
+    return os.path.join(output_dir, f"{class_name}_学生照片.pptx")
+
+def deck_layout(dpi):
+    """写入生成记录的布局参数"""
+    return {
+        "slide_size": [SLIDE_WIDTH, SLIDE_HEIGHT],
+        "photo_max_size": [PHOTO_MAX_WIDTH, PHOTO_MAX_HEIGHT],
+        "font": [FONT_NAME, FONT_SIZE],
+        "dpi": dpi,
+        "jpeg_quality": JPEG_QUALITY,
+    }
+
+def create_class_ppt(class_name, students, photos_dict, output_dir, image_cache=None):
+    """
+    为指定班级创建PPT
+    
+    Args:
+        image_cache: ScaledImageCache，为 None 时直接嵌入原始照片
+    """
     print(f"\n正在创建 {class_name} 的PPT...")
     
     # 创建新的PPT
     prs = Presentation()
     
     # 设置幻灯片尺寸（16:9）
-    prs.slide_width = Inches(13.33)
-    prs.slide_height = Inches(7.5)
+    prs.slide_width = Inches(SLIDE_WIDTH)
+    prs.slide_height = Inches(SLIDE_HEIGHT)
     
     students_with_photos = 0
     students_without_photos = 0
@@ -112,7 +335,13 @@ def create_class_ppt(class_name, students, photos_dict, output_dir):
                 # 添加图片（居中偏上）
                 left = (prs.slide_width - img_width) / 2
                 top = Inches(0.5)
-                slide.shapes.add_picture(photo_path, left, top, img_width, img_height)
+                # 图片数据只读取一次，以流的形式交给 python-pptx
+                if image_cache is not None:
+                    blob = image_cache.get(photo_path, img_width, img_height)
+                else:
+                    with open(photo_path, "rb") as f:
+                        blob = f.read()
+                slide.shapes.add_picture(BytesIO(blob), left, top, img_width, img_height)
                 
                 # 添加学号和姓名文本框（图片下方）
                 text_top = top + img_height + Inches(0.1)
@@ -131,8 +360,8 @@ def create_class_ppt(class_name, students, photos_dict, output_dir):
                 
                 # 设置字体格式：一号粗体红色
                 font = p.font
-                font.name = "微软雅黑"
-                font.size = Pt(72)  # 一号字体大约72磅
+                font.name = FONT_NAME
+                font.size = Pt(FONT_SIZE)
                 font.bold = True
                 font.color.rgb = RGBColor(255, 0, 0)  # 红色
                 
@@ -159,16 +388,15 @@ def create_class_ppt(class_name, students, photos_dict, output_dir):
             p.alignment = PP_ALIGN.CENTER
             
             font = p.font
-            font.name = "微软雅黑"
-            font.size = Pt(72)
+            font.name = FONT_NAME
+            font.size = Pt(FONT_SIZE)
             font.bold = True
             font.color.rgb = RGBColor(255, 0, 0)
             
             print(f"  ⚠️  无照片: {name} ({exam_id})")
     
     # 保存PPT
-    ppt_filename = f"{class_name}_学生照片.pptx"
-    ppt_path = os.path.join(output_dir, ppt_filename)
+    ppt_path = deck_path(output_dir, class_name)
     prs.save(ppt_path)
     
     print(f"✅ {class_name} PPT 已保存: {ppt_path}")
@@ -176,8 +404,54 @@ def create_class_ppt(class_name, students, photos_dict, output_dir):
     
     return ppt_path, students_with_photos, students_without_photos
 
-def create_all_class_ppts(directory, excel_path):
-    """为所有班级创建PPT的主函数"""
+# 子进程中共享的照片索引和输出设置，由 _init_deck_worker 设置
+_worker_state = {}
+
+def _init_deck_worker(photos_dict, output_dir, cache_dir, dpi):
+    """子进程初始化：照片索引只传递一次，每个进程打开自己的图片缓存"""
+    _worker_state["photos_dict"] = photos_dict
+    _worker_state["output_dir"] = output_dir
+    _worker_state["image_cache"] = ScaledImageCache(cache_dir, dpi)
+
+def _build_deck_in_worker(task):
+    """
+    子进程任务：生成一个班级的PPT
+    
+    打印内容先收集起来，由主进程按班级顺序输出，与逐个生成时一致
+    
+    Returns:
+        (create_class_ppt 的结果, 打印内容, 图片缓存更新)
+    """
+    class_name, students = task
+    image_cache = _worker_state["image_cache"]
+    output = StringIO()
+    with contextlib.redirect_stdout(output):
+        result = create_class_ppt(class_name, students, _worker_state["photos_dict"],
+                                  _worker_state["output_dir"], image_cache)
+    return result, output.getvalue(), image_cache.take_updates()
+
+def _build_decks_in_pool(tasks, photos_dict, output_dir, cache_dir, dpi, workers, image_cache):
+    """
+    用进程池生成各班级PPT，按班级顺序逐个产出 create_class_ppt 的结果
+    
+    子进程的图片缓存更新合并到 image_cache 中
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_deck_worker,
+                             initargs=(photos_dict, output_dir, cache_dir, dpi)) as executor:
+        for result, output, updates in executor.map(_build_deck_in_worker, tasks):
+            print(output, end="")
+            image_cache.merge_updates(updates)
+            yield result
+
+def create_all_class_ppts(directory, excel_path, dpi=TARGET_DPI, workers=1, force=False):
+    """
+    为所有班级创建PPT的主函数
+    
+    Args:
+        dpi: 嵌入图片按显示尺寸缩放时使用的DPI
+        workers: 并行生成PPT的进程数，1 表示逐个生成，None 表示CPU核数
+        force: 为 True 时忽略生成记录，重新生成所有班级
+    """
     print("="*60)
     print("学生照片PPT生成工具")
     print("="*60)
@@ -195,6 +469,8 @@ def create_all_class_ppts(directory, excel_path):
     output_dir = os.path.join(directory, "班级PPT")
     os.makedirs(output_dir, exist_ok=True)
     print(f"\nPPT文件将保存到: {output_dir}")
+    cache_dir = os.path.join(output_dir, IMAGE_CACHE_DIRNAME)
+    image_cache = ScaledImageCache(cache_dir, dpi)
     
     # 为每个班级创建PPT
     total_students = 0
@@ -202,15 +478,53 @@ def create_all_class_ppts(directory, excel_path):
     total_without_photos = 0
     created_ppts = []
     
+    # 只处理有学生的班级；名单、布局和照片都没变化的班级直接跳过
+    layout = deck_layout(dpi)
+    tasks = []
+    manifests = {}
+    skipped = []
     for class_name, students in students_by_class.items():
-        if students:  # 只处理有学生的班级
-            ppt_path, with_photos, without_photos = create_class_ppt(
-                class_name, students, photos_dict, output_dir
-            )
-            created_ppts.append(ppt_path)
-            total_students += len(students)
-            total_with_photos += with_photos
-            total_without_photos += without_photos
+        if not students:
+            continue
+        photos = {exam_id: photos_dict[(exam_id, name)] for exam_id, name in students
+                  if (exam_id, name) in photos_dict}
+        previous = load_deck_manifest(output_dir, class_name)
+        manifest = build_deck_manifest(students, layout, photos, previous)
+        if force:
+            reasons = ["强制重新生成"]
+        elif not os.path.exists(deck_path(output_dir, class_name)):
+            reasons = ["PPT文件不存在"]
+        else:
+            reasons = describe_changes(previous, manifest)
+        if reasons:
+            print(f"🔄 {class_name}: {'；'.join(reasons)}")
+            tasks.append((class_name, students))
+            manifests[class_name] = manifest
+        else:
+            skipped.append((class_name, students, previous["stats"]))
+            image_cache.keep(photos.values())
+    
+    if workers == 1 or len(tasks) <= 1:
+        results = (create_class_ppt(class_name, students, photos_dict, output_dir, image_cache)
+                   for class_name, students in tasks)
+    else:
+        results = _build_decks_in_pool(tasks, photos_dict, output_dir, cache_dir, dpi,
+                                       workers, image_cache)
+    
+    for (class_name, students), (ppt_path, with_photos, without_photos) in zip(tasks, results):
+        created_ppts.append(ppt_path)
+        total_students += len(students)
+        total_with_photos += with_photos
+        total_without_photos += without_photos
+        manifests[class_name]["stats"] = [with_photos, without_photos]
+        save_deck_manifest(output_dir, class_name, manifests[class_name])
+    
+    for class_name, students, (with_photos, without_photos) in skipped:
+        total_students += len(students)
+        total_with_photos += with_photos
+        total_without_photos += without_photos
+    
+    image_cache.save()
     
     # 总结报告
     print("\n" + "="*60)
@@ -219,12 +533,18 @@ def create_all_class_ppts(directory, excel_path):
     print(f"创建的PPT文件:")
     for ppt_path in created_ppts:
         print(f"  📄 {os.path.basename(ppt_path)}")
+    if skipped:
+        print(f"跳过的班级（名单、布局和照片均未变化）:")
+        for class_name, students, stats in skipped:
+            print(f"  ⏭️  {class_name}")
     
     print(f"\n统计信息:")
     print(f"  总学生数: {total_students}")
     print(f"  有照片: {total_with_photos}")
     print(f"  无照片: {total_without_photos}")
-    print(f"  照片完成率: {(total_with_photos/total_students)*100:.1f}%")
+    if total_students > 0:
+        print(f"  照片完成率: {(total_with_photos/total_students)*100:.1f}%")
+    print(f"  预缩放图片: 新生成 {image_cache.created} 张，复用缓存 {image_cache.reused} 张")
     
     print(f"\n💡 PPT格式说明:")
     print(f"  - 每页显示一名学生")
@@ -235,6 +555,17 @@ def create_all_class_ppts(directory, excel_path):
 
 def main():
     """主函数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="学生照片PPT生成工具")
+    parser.add_argument("--dpi", type=int, default=TARGET_DPI,
+                        help=f"嵌入照片按显示尺寸缩放时的DPI（默认: {TARGET_DPI}）")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="并行生成PPT的进程数（默认: 1，0 表示CPU核数）")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略生成记录，重新生成所有班级的PPT")
+    args = parser.parse_args()
+    
     # 检查必要的库
     try:
         from pptx import Presentation
@@ -258,7 +589,8 @@ def main():
     print(f"Excel文件: {excel_path}")
     
     # 创建PPT
-    create_all_class_ppts(current_dir, excel_path)
+    create_all_class_ppts(current_dir, excel_path, dpi=args.dpi, workers=args.workers or None,
+                          force=args.force)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,16 +3,54 @@
 """
 学生头像PPT生成工具（头像版）
 为每个班级创建PPT，每页显示24张学生头像（6列×4行）
+
+合成模式（--composite）把每页的头像和文字合成为一张投影仪分辨率的图片，
+每页只嵌入这一张图片，旧电脑上打开和翻页都更快；
+同样的页面图片还可以导出为 PDF/PNG（--export pdf png）。
 """
 
 import os
 import glob
+import contextlib
+import functools
 import openpyxl
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, StringIO
+from PIL import Image, ImageDraw, ImageFont
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
 
+from deck_manifest import (
+    build_deck_manifest, describe_changes, load_deck_manifest, save_deck_manifest
+)
+
+# 页面布局（英寸/磅），变化时所有班级的PPT都会重新生成
+BASE_HEIGHT = 7.5
+MARGIN = 0.2
+FONT_NAME = "微软雅黑"
+FONT_SIZE = 18
+
+# 合成模式：页面图片高度（像素）和嵌入PPT时的 JPEG 质量
+COMPOSITE_HEIGHT = 1080
+COMPOSITE_JPEG_QUALITY = 90
+EXPORT_FORMATS = ("pdf", "png")
+
+# 常见系统中的中文字体，按顺序使用第一个存在的
+CJK_FONT_CANDIDATES = (
+    "C:/Windows/Fonts/msyhbd.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Medium.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+)
+
 
 def load_students_by_class(excel_path):
     """从Excel文件中按班级加载学生信息"""
@@ -40,14 +78,15 @@ def load_students_by_class(excel_path):
 
 
 def find_headshot_photos(directory):
-    """查找所有头像照片（文件名为9位考号）"""
+    """查找所有头像照片（文件名为9位考号，PNG或JPEG）"""
     cuted_dir = os.path.join(directory, "cuted")
     if not os.path.exists(cuted_dir):
         print(f"❌ 头像目录不存在: {cuted_dir}")
         return {}
     
-    pattern = os.path.join(cuted_dir, "*.png")
-    photo_files = glob.glob(pattern)
+    photo_files = []
+    for ext in ("*.png", "*.jpg", "*.jpeg"):
+        photo_files.extend(glob.glob(os.path.join(cuted_dir, ext)))
     
     photos_dict = {}  # {考号: 照片路径}
     
@@ -57,7 +96,10 @@ def find_headshot_photos(directory):
         
         # 验证是否为9位数字
         if exam_id.isdigit() and len(exam_id) == 9:
-            photos_dict[exam_id] = photo_path
+            # 换了输出规格后同一考号可能有多个文件，使用最新生成的
+            current = photos_dict.get(exam_id)
+            if current is None or os.path.getmtime(photo_path) > os.path.getmtime(current):
+                photos_dict[exam_id] = photo_path
     
     print(f"在 {cuted_dir} 找到 {len(photos_dict)} 张头像照片")
     return photos_dict
@@ -77,10 +119,10 @@ def create_headshot_page(slide, students_page, photos_dict, prs, cols, rows):
     # 计算每个单元格的尺寸
     # 页面尺寸：13.33 x 7.5 英寸
     # 减小边距以获得更大的显示区域
-    margin_left = Inches(0.2)
-    margin_top = Inches(0.2)
-    margin_right = Inches(0.2)
-    margin_bottom = Inches(0.2)
+    margin_left = Inches(MARGIN)
+    margin_top = Inches(MARGIN)
+    margin_right = Inches(MARGIN)
+    margin_bottom = Inches(MARGIN)
     
     available_width = prs.slide_width - margin_left - margin_right
     available_height = prs.slide_height - margin_top - margin_bottom
@@ -157,18 +199,174 @@ def create_headshot_page(slide, students_page, photos_dict, prs, cols, rows):
         
         # 设置字体格式：粗体红色
         font = p.font
-        font.name = "微软雅黑"
-        font.size = Pt(18)  # 适当的字体大小
+        font.name = FONT_NAME
+        font.size = Pt(FONT_SIZE)
         font.bold = True
         font.color.rgb = RGBColor(255, 0, 0)  # 红色
 
     return students_with_photos, students_without_photos
 
 
+def find_cjk_font():
+    """查找系统中的中文字体，找不到时返回 None"""
+    for path in CJK_FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def load_label_font(font_path, size):
+    """加载指定大小的字体（每个进程缓存一份），没有字体文件时使用 Pillow 自带字体"""
+    if font_path:
+        return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size=size)
+
+
+def load_headshot_tile(photo_path, size):
+    """读取头像并缩放为 size×size（与PPT中图片被拉伸到正方形一致）"""
+    with Image.open(photo_path) as img:
+        img.draft("RGB", (size, size))  # JPEG 直接按缩小后的尺寸解码
+        return np.asarray(img.convert("RGB").resize((size, size), Image.LANCZOS))
+
+
+def render_headshot_page(students_page, photos_dict, cols, rows,
+                         page_height=COMPOSITE_HEIGHT, font_path=None):
+    """
+    把一页头像合成为一张图片（布局与 create_headshot_page 相同）
+
+    Returns:
+        (PIL 图片, 有头像人数, 无头像人数)
+    """
+    ppi = page_height / BASE_HEIGHT  # 每英寸像素数
+    page_width = round(BASE_HEIGHT * cols / rows * ppi)
+    margin = MARGIN * ppi
+    cell_width = (page_width - 2 * margin) / cols
+    cell_height = (page_height - 2 * margin) / rows
+    img_size = int(min(cell_width * 0.92, cell_height * 0.78))
+    text_height = cell_height * 0.20
+
+    canvas = np.full((page_height, page_width, 3), 255, dtype=np.uint8)
+    labels = []
+    students_with_photos = 0
+    students_without_photos = 0
+
+    for idx, (exam_id, name) in enumerate(students_page[:cols * rows]):
+        row = idx // cols
+        col = idx % cols
+        cell_center_x = margin + col * cell_width + cell_width / 2
+        cell_center_y = margin + row * cell_height + cell_height / 2
+        left = round(cell_center_x - img_size / 2)
+        top = round(cell_center_y - img_size / 2 - text_height / 2)
+        area = canvas[top:top + img_size, left:left + img_size]
+
+        tile = None
+        if exam_id in photos_dict:
+            students_with_photos += 1
+            try:
+                tile = load_headshot_tile(photos_dict[exam_id], img_size)
+            except Exception as e:
+                print(f"  ❌ 添加 {name} ({exam_id}) 头像时出错: {e}")
+                students_with_photos -= 1
+                students_without_photos += 1
+        else:
+            students_without_photos += 1
+
+        if tile is not None:
+            area[:] = tile
+        else:
+            # 没有照片或照片读取失败时画一个浅灰色占位框
+            area[:] = (200, 200, 200)
+            area[1:-1, 1:-1] = (240, 240, 240)
+
+        labels.append((cell_center_x, top + img_size + 0.05 * ppi,
+                       f"{get_last_two_digits(exam_id)}{name}"))
+
+    # 文字：粗体红色，过长时缩小字号以放进单元格
+    page = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(page)
+    font_size = round(FONT_SIZE / 72 * ppi)
+    max_text_width = cell_width * 0.9
+    for center_x, text_top, text in labels:
+        font = load_label_font(font_path, font_size)
+        text_width = draw.textlength(text, font=font)
+        if text_width > max_text_width:
+            font = load_label_font(font_path, max(8, int(font_size * max_text_width / text_width)))
+        draw.text((center_x, text_top), text, font=font, fill=(255, 0, 0), anchor="mt",
+                  stroke_width=max(1, font_size // 24), stroke_fill=(255, 0, 0))
+    return page, students_with_photos, students_without_photos
+
+
+def export_pages(pages, output_dir, class_name, formats, page_height=COMPOSITE_HEIGHT):
+    """把合成的页面导出为 PDF（整个班级一个文件）和/或 PNG（每页一个文件）"""
+    if "pdf" in formats and pages:
+        pdf_path = os.path.join(output_dir, f"{class_name}_学生头像.pdf")
+        pages[0].save(pdf_path, save_all=True, append_images=pages[1:],
+                      resolution=page_height / BASE_HEIGHT)
+        print(f"   📄 PDF: {pdf_path}")
+    if "png" in formats:
+        # 班级人数减少后页数变少，删除上次导出的多余页面
+        stale_idx = len(pages) + 1
+        while os.path.exists(png_path(output_dir, class_name, stale_idx)):
+            os.remove(png_path(output_dir, class_name, stale_idx))
+            stale_idx += 1
+        for page_idx, page in enumerate(pages, 1):
+            page.save(png_path(output_dir, class_name, page_idx), optimize=True)
+        print(f"   🖼️  PNG: {len(pages)} 页")
+
+
+def png_path(output_dir, class_name, page_idx):
+    """导出的第 page_idx 页 PNG 的路径"""
+    return os.path.join(output_dir, f"{class_name}_学生头像_第{page_idx}页.png")
+
+
+def deck_path(output_dir, class_name):
+    """班级头像PPT的保存路径"""
+    return os.path.join(output_dir, f"{class_name}_学生头像.pptx")
+
+
+def deck_outputs(output_dir, class_name, render_options=None):
+    """生成一个班级后应存在的文件（PPT 和导出的 PDF、第一页 PNG）"""
+    outputs = [deck_path(output_dir, class_name)]
+    export = (render_options or {}).get("export", ())
+    if "pdf" in export:
+        outputs.append(os.path.join(output_dir, f"{class_name}_学生头像.pdf"))
+    if "png" in export:
+        outputs.append(png_path(output_dir, class_name, 1))
+    return outputs
+
+
+def deck_layout(cols, rows, render_options=None):
+    """写入生成记录的布局参数"""
+    layout = {
+        "cols": cols,
+        "rows": rows,
+        "base_height": BASE_HEIGHT,
+        "margin": MARGIN,
+        "font": [FONT_NAME, FONT_SIZE],
+    }
+    if render_options:
+        layout.update(render_options)
+        layout["export"] = sorted(render_options.get("export", ()))
+    return layout
+
+
 def create_class_headshot_ppt(
-    class_name, students, photos_dict, output_dir, cols=6, rows=4
+    class_name, students, photos_dict, output_dir, cols=6, rows=4, render_options=None
 ):
-    """为指定班级创建头像版PPT"""
+    """
+    为指定班级创建头像版PPT
+
+    Args:
+        render_options: 合成模式设置 {"composite": 每页嵌入一张合成图片,
+                        "export": 导出格式（"pdf"/"png"）, "page_height": 页面图片高度（像素）,
+                        "font_path": 中文字体文件}，为 None 时按原方式逐个添加图片和文本框
+    """
+    render_options = render_options or {}
+    composite = render_options.get("composite", False)
+    export = render_options.get("export", ())
+    page_height = render_options.get("page_height", COMPOSITE_HEIGHT)
+    pages = []
     print(f"\n正在创建 {class_name} 的头像PPT...")
     print(f"  布局: {cols}列 × {rows}行 (每页{cols * rows}人)")
     
@@ -177,7 +375,7 @@ def create_class_headshot_ppt(
     
     # 根据行列比例自动设置幻灯片尺寸
     # 基础高度固定为7.5英寸，宽度根据列行比自动调整
-    base_height = 7.5
+    base_height = BASE_HEIGHT
     aspect_ratio = cols / rows  # 宽高比
     prs.slide_height = Inches(base_height)
     prs.slide_width = Inches(base_height * aspect_ratio)
@@ -204,20 +402,34 @@ def create_class_headshot_ppt(
         students_page = students[start_idx:end_idx]
 
         # 创建本页内容
-        with_photos, without_photos = create_headshot_page(
-            slide, students_page, photos_dict, prs, cols, rows
-        )
+        if composite or export:
+            page, with_photos, without_photos = render_headshot_page(
+                students_page, photos_dict, cols, rows, page_height,
+                render_options.get("font_path")
+            )
+            pages.append(page)
+        if composite:
+            # 整页只嵌入一张图片，铺满幻灯片
+            data = BytesIO()
+            page.save(data, "JPEG", quality=COMPOSITE_JPEG_QUALITY)
+            data.seek(0)
+            slide.shapes.add_picture(data, 0, 0, prs.slide_width, prs.slide_height)
+        else:
+            with_photos, without_photos = create_headshot_page(
+                slide, students_page, photos_dict, prs, cols, rows
+            )
         total_with_photos += with_photos
         total_without_photos += without_photos
         
         print(f"  第 {page_idx + 1}/{num_pages} 页: {len(students_page)} 名学生")
     
     # 保存PPT
-    ppt_filename = f"{class_name}_学生头像.pptx"
-    ppt_path = os.path.join(output_dir, ppt_filename)
+    ppt_path = deck_path(output_dir, class_name)
     prs.save(ppt_path)
     
     print(f"✅ {class_name} 头像PPT 已保存: {ppt_path}")
+    if export:
+        export_pages(pages, output_dir, class_name, export, page_height)
     print(
         f"   共 {len(students)} 名学生，"
         f"有头像 {total_with_photos} 人，"
@@ -227,8 +439,60 @@ def create_class_headshot_ppt(
     return ppt_path, total_with_photos, total_without_photos
 
 
-def create_all_class_headshot_ppts(directory, excel_path, cols=6, rows=4):
-    """为所有班级创建头像PPT的主函数"""
+# 子进程中共享的头像索引和输出设置，由 _init_deck_worker 设置
+_worker_state = {}
+
+
+def _init_deck_worker(photos_dict, output_dir, cols, rows, render_options):
+    """子进程初始化：头像索引只传递一次"""
+    _worker_state.update(photos_dict=photos_dict, output_dir=output_dir, cols=cols, rows=rows,
+                         render_options=render_options)
+
+
+def _build_deck_in_worker(task):
+    """
+    子进程任务：生成一个班级的头像PPT
+
+    打印内容先收集起来，由主进程按班级顺序输出，与逐个生成时一致
+
+    Returns:
+        (create_class_headshot_ppt 的结果, 打印内容)
+    """
+    class_name, students = task
+    output = StringIO()
+    with contextlib.redirect_stdout(output):
+        result = create_class_headshot_ppt(
+            class_name, students, _worker_state["photos_dict"], _worker_state["output_dir"],
+            _worker_state["cols"], _worker_state["rows"], _worker_state["render_options"]
+        )
+    return result, output.getvalue()
+
+
+def _build_decks_in_pool(tasks, photos_dict, output_dir, cols, rows, render_options, workers):
+    """用进程池生成各班级头像PPT，按班级顺序逐个产出结果"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_deck_worker,
+                             initargs=(photos_dict, output_dir, cols, rows,
+                                       render_options)) as executor:
+        for result, output in executor.map(_build_deck_in_worker, tasks):
+            print(output, end="")
+            yield result
+
+
+def create_all_class_headshot_ppts(
+    directory, excel_path, cols=6, rows=4, workers=1, force=False,
+    composite=False, export=(), page_height=COMPOSITE_HEIGHT, font_path=None
+):
+    """
+    为所有班级创建头像PPT的主函数
+
+    Args:
+        workers: 并行生成PPT的进程数，1 表示逐个生成，None 表示CPU核数
+        force: 为 True 时忽略生成记录，重新生成所有班级
+        composite: 为 True 时每页只嵌入一张合成好的页面图片
+        export: 同时导出的格式，"pdf" 和/或 "png"
+        page_height: 合成页面图片的高度（像素）
+        font_path: 合成页面使用的中文字体文件，默认自动查找
+    """
     print("="*60)
     print(f"学生头像PPT生成工具（布局：{cols}列×{rows}行）")
     print("="*60)
@@ -249,6 +513,18 @@ def create_all_class_headshot_ppts(directory, excel_path, cols=6, rows=4):
     output_dir = os.path.join(directory, "班级PPT_头像版")
     os.makedirs(output_dir, exist_ok=True)
     print(f"\nPPT文件将保存到: {output_dir}")
+
+    render_options = None
+    if composite or export:
+        font_path = font_path or find_cjk_font()
+        if font_path is None:
+            print("⚠️  未找到中文字体，合成页面中的姓名可能无法显示，可用 --font 指定字体文件")
+        render_options = {
+            "composite": composite,
+            "export": list(export),
+            "page_height": page_height,
+            "font_path": font_path,
+        }
     
     # 为每个班级创建PPT
     total_students = 0
@@ -256,17 +532,61 @@ def create_all_class_headshot_ppts(directory, excel_path, cols=6, rows=4):
     total_without_photos = 0
     created_ppts = []
     
+    # 只处理有学生的班级；名单、布局和头像都没变化的班级直接跳过
+    layout = deck_layout(cols, rows, render_options)
+    tasks = []
+    manifests = {}
+    skipped = []
     for class_name, students in students_by_class.items():
-        if students:  # 只处理有学生的班级
-            ppt_path, with_photos, without_photos = (
-                create_class_headshot_ppt(
-                    class_name, students, photos_dict, output_dir, cols, rows
-                )
+        if not students:
+            continue
+        photos = {
+            exam_id: photos_dict[exam_id]
+            for exam_id, name in students if exam_id in photos_dict
+        }
+        previous = load_deck_manifest(output_dir, class_name)
+        manifest = build_deck_manifest(students, layout, photos, previous)
+        if force:
+            reasons = ["强制重新生成"]
+        elif not all(
+            os.path.exists(path)
+            for path in deck_outputs(output_dir, class_name, render_options)
+        ):
+            reasons = ["输出文件不存在"]
+        else:
+            reasons = describe_changes(previous, manifest)
+        if reasons:
+            print(f"🔄 {class_name}: {'；'.join(reasons)}")
+            tasks.append((class_name, students))
+            manifests[class_name] = manifest
+        else:
+            skipped.append((class_name, students, previous["stats"]))
+
+    if workers == 1 or len(tasks) <= 1:
+        results = (
+            create_class_headshot_ppt(
+                class_name, students, photos_dict, output_dir, cols, rows,
+                render_options
             )
-            created_ppts.append(ppt_path)
-            total_students += len(students)
-            total_with_photos += with_photos
-            total_without_photos += without_photos
+            for class_name, students in tasks
+        )
+    else:
+        results = _build_decks_in_pool(
+            tasks, photos_dict, output_dir, cols, rows, render_options, workers
+        )
+
+    for (class_name, students), (ppt_path, with_photos, without_photos) in zip(tasks, results):
+        created_ppts.append(ppt_path)
+        total_students += len(students)
+        total_with_photos += with_photos
+        total_without_photos += without_photos
+        manifests[class_name]["stats"] = [with_photos, without_photos]
+        save_deck_manifest(output_dir, class_name, manifests[class_name])
+
+    for class_name, students, (with_photos, without_photos) in skipped:
+        total_students += len(students)
+        total_with_photos += with_photos
+        total_without_photos += without_photos
     
     # 总结报告
     print("\n" + "="*60)
@@ -275,6 +595,10 @@ def create_all_class_headshot_ppts(directory, excel_path, cols=6, rows=4):
     print("创建的PPT文件:")
     for ppt_path in created_ppts:
         print(f"  📄 {os.path.basename(ppt_path)}")
+    if skipped:
+        print("跳过的班级（名单、布局和头像均未变化）:")
+        for class_name, students, stats in skipped:
+            print(f"  ⏭️  {class_name}")
 
     print("\n统计信息:")
     print(f"  总学生数: {total_students}")
@@ -288,10 +612,31 @@ def create_all_class_headshot_ppts(directory, excel_path, cols=6, rows=4):
     print("  - 使用cuted目录中的头像图片")
     print("  - 文字格式: 考号后两位+姓名，粗体，红色")
     print("  - 页面按学号顺序排列")
+    if composite:
+        print(f"  - 合成模式: 每页为一张 {page_height} 像素高的图片")
+    if export:
+        print(f"  - 已导出: {', '.join(format.upper() for format in export)}")
 
 
 def main():
     """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="学生头像PPT生成工具（头像版）")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="并行生成PPT的进程数（默认: 1，0 表示CPU核数）")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略生成记录，重新生成所有班级的PPT")
+    parser.add_argument("--composite", action="store_true",
+                        help="合成模式：每页合成为一张图片后嵌入，PPT更小、翻页更快")
+    parser.add_argument("--export", nargs="+", choices=EXPORT_FORMATS, default=[],
+                        help="同时把合成的页面导出为 pdf 和/或 png")
+    parser.add_argument("--page-height", type=int, default=COMPOSITE_HEIGHT,
+                        help=f"合成页面图片的高度，像素（默认: {COMPOSITE_HEIGHT}）")
+    parser.add_argument("--font", default=None,
+                        help="合成页面使用的中文字体文件（默认: 自动查找系统字体）")
+    args = parser.parse_args()
+
     # 检查必要的库
     try:
         from pptx import Presentation  # noqa: F401
@@ -327,7 +672,11 @@ def main():
     
     # 创建PPT - 可在此修改cols和rows参数调整布局
     # 例如: create_all_class_headshot_ppts(current_dir, excel_path, 5, 4)
-    create_all_class_headshot_ppts(current_dir, excel_path, cols=5, rows=4)
+    create_all_class_headshot_ppts(
+        current_dir, excel_path, cols=5, rows=4, workers=args.workers or None,
+        force=args.force, composite=args.composite, export=args.export,
+        page_height=args.page_height, font_path=args.font
+    )
 
 
 if __name__ == "__main__":
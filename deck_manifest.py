@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+班级PPT生成记录
+每个输出的PPT旁边保存一份记录：该班名单、布局参数、每张嵌入图片的内容哈希和统计数字。
+再次运行时只重新生成输入有变化的班级，其他班级直接跳过。
+图片哈希按 路径+大小+修改时间 复用上次的结果，没变的照片不需要重新读取。
+"""
+
+import hashlib
+import json
+import os
+
+MANIFEST_DIRNAME = ".deck_manifest"
+
+
+def manifest_path(output_dir, class_name):
+    """班级PPT生成记录的路径"""
+    return os.path.join(output_dir, MANIFEST_DIRNAME, f"{class_name}.json")
+
+
+def load_deck_manifest(output_dir, class_name):
+    """读取生成记录，不存在或损坏时返回空字典"""
+    try:
+        with open(manifest_path(output_dir, class_name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_deck_manifest(output_dir, class_name, manifest):
+    """保存生成记录（先写临时文件再替换，避免中断时留下半个文件）"""
+    path = manifest_path(output_dir, class_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def file_sha1(path):
+    """文件内容的 SHA1"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_records(photos, previous_images):
+    """
+    计算各学生图片的内容哈希
+
+    Args:
+        photos: {考号: 图片路径}
+        previous_images: 上次记录中的 images，路径、大小和修改时间都没变时直接使用其中的哈希
+
+    Returns:
+        dict: {考号: {"path", "size", "mtime_ns", "sha1"}}
+    """
+    records = {}
+    for exam_id, path in photos.items():
+        st = os.stat(path)
+        record = {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        previous = previous_images.get(exam_id)
+        if previous and all(previous.get(key) == record[key] for key in ("path", "size", "mtime_ns")):
+            record["sha1"] = previous["sha1"]
+        else:
+            record["sha1"] = file_sha1(path)
+        records[exam_id] = record
+    return records
+
+
+def build_deck_manifest(students, layout, photos, previous):
+    """
+    生成本次运行的记录（统计数字在PPT生成后由调用方填入 "stats"）
+
+    Args:
+        students: 该班名单 [(考号, 姓名)]
+        layout: 布局参数，任何一项变化都会重新生成
+        photos: {考号: 图片路径}，只包含有图片的学生
+        previous: 上次的记录
+    """
+    return {
+        "students": [[exam_id, name] for exam_id, name in students],
+        "layout": layout,
+        "images": image_records(photos, previous.get("images", {})),
+    }
+
+
+def describe_changes(previous, current):
+    """
+    比较两次记录
+
+    Returns:
+        list: 需要重新生成的原因，为空表示输入没有变化
+    """
+    if not previous or "stats" not in previous:
+        return ["没有生成记录"]
+
+    reasons = []
+    if previous.get("students") != current["students"]:
+        old = {tuple(item) for item in previous.get("students", [])}
+        new = {tuple(item) for item in current["students"]}
+        reasons.append(f"名单变化（新增 {len(new - old)} 人，移除 {len(old - new)} 人）")
+
+    old_layout = previous.get("layout", {})
+    changed = sorted(key for key in set(old_layout) | set(current["layout"])
+                     if old_layout.get(key) != current["layout"].get(key))
+    if changed:
+        reasons.append(f"布局参数变化（{', '.join(changed)}）")
+
+    old_images = {exam_id: item["sha1"] for exam_id, item in previous.get("images", {}).items()}
+    new_images = {exam_id: item["sha1"] for exam_id, item in current["images"].items()}
+    changed_images = [exam_id for exam_id in set(old_images) | set(new_images)
+                      if old_images.get(exam_id) != new_images.get(exam_id)]
+    if changed_images:
+        reasons.append(f"照片变化 {len(changed_images)} 张")
+    return reasons
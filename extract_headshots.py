@@ -2,35 +2,185 @@
 # -*- coding: utf-8 -*-
 """
 学生头像提取程序
-使用 MediaPipe 检测人脸并提取头像区域
+检测人脸并提取头像区域（默认使用 MediaPipe，检测后端见 face_detectors.py）
 """
 
 import cv2
-import mediapipe as mp
+import hashlib
+import json
+import numpy as np
 import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+from face_detectors import DEFAULT_DETECTOR, DETECTORS, create_detector, resize_for_detection
+
+# 各处理阶段（用于统计耗时）
+STAGES = ("decode", "detect", "crop", "encode")
+STAGE_LABELS = {"decode": "解码", "detect": "检测", "crop": "裁剪", "encode": "编码"}
+
+# 人脸检测在长边缩小到这个尺寸的图片上进行（检测模型本身的输入只有192x192）
+DEFAULT_DETECT_SIZE = 640
+
+# 输入目录中的人脸检测缓存文件
+FACE_CACHE_FILENAME = ".headshot_cache.json"
+# 从视频中提取头像：均匀抽取的帧数和每个视频的时间预算（秒）
+VIDEO_SAMPLES = 8
+VIDEO_TIME_BUDGET = 4.0
+# 人脸区域清晰度（拉普拉斯方差）达到此值视为足够清晰
+SHARPNESS_REF = 100.0
+VIDEO_EXTENSIONS = (".mp4",)
+
+# 输出目录中记录头像规格的清单文件
+MANIFEST_FILENAME = "manifest.json"
+
+# 头像输出规格
+#   original: 原始裁剪，保持源图片的格式和分辨率
+#   deck: 缩放到固定尺寸的JPEG，PPT中每张头像约2英寸宽，480像素已足够清晰
+OUTPUT_PROFILES = {
+    "original": {"name": "original"},
+    "deck": {"name": "deck", "size": 480, "format": ".jpg", "quality": 88},
+}
+
+
+def load_face_cache(cache_path):
+    """读取人脸检测缓存 {源文件名: 记录}，文件不存在或损坏时返回空字典"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_face_cache(cache_path, cache):
+    """保存人脸检测缓存（先写临时文件再替换）"""
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, cache_path)
+
+
+def student_id_from_filename(filename):
+    """从文件名提取学号（去掉姓名部分），例如: "202510745_张殷瑞.png" -> "202510745" """
+    stem = Path(filename).stem
+    return stem.split("_")[0] if "_" in stem else stem
+
+
+def face_sharpness(image, face):
+    """人脸区域的清晰度：缩小到固定宽度后灰度图的拉普拉斯方差"""
+    h, w = image.shape[:2]
+    xmin, ymin, width, height = face["bbox"]
+    x1, y1 = max(0, int(xmin * w)), max(0, int(ymin * h))
+    x2, y2 = min(w, int((xmin + width) * w)), min(h, int((ymin + height) * h))
+    region = image[y1:y2, x1:x2]
+    if region.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    if gray.shape[1] > 128:
+        gray = cv2.resize(gray, (128, max(1, gray.shape[0] * 128 // gray.shape[1])),
+                          interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def update_manifest(output_dir, profile, scale_factor, entries):
+    """
+    更新输出目录中的头像清单
+    
+    Args:
+        profile: 当前使用的输出规格
+        entries: {头像文件名: {"source", "profile", "width", "height", "bytes", "score"}}
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    manifest = load_face_cache(manifest_path)
+    files = manifest.get("files", {})
+    files.update(entries)
+    # 去掉已经不存在的头像
+    files = {name: info for name, info in files.items()
+             if os.path.exists(os.path.join(output_dir, name))}
+    save_face_cache(manifest_path, {
+        "profile": profile,
+        "scale_factor": scale_factor,
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "files": files,
+    })
+
+
+def manifest_entries(record, image_path, output_path):
+    """从缓存记录中取出写入清单的信息"""
+    output = record["outputs"][output_path]
+    return {os.path.basename(output_path): {
+        "source": os.path.basename(image_path),
+        "profile": output["profile"]["name"],
+        "width": output["width"],
+        "height": output["height"],
+        "bytes": output["bytes"],
+        "score": round(record["face"]["score"], 3),
+    }}
+
 
 class HeadshotExtractor:
     """头像提取器"""
     
-    def __init__(self, output_dir="cuted", scale_factor=1.8):
+    def __init__(self, output_dir="cuted", scale_factor=1.8, detect_size=DEFAULT_DETECT_SIZE,
+                 profile="original", detector=DEFAULT_DETECTOR):
         """
         初始化头像提取器
         
         Args:
             output_dir: 输出目录名称
             scale_factor: 头像框扩展比例（相对于人脸检测框）
+            detect_size: 检测用图片的长边像素数，0 表示用原图检测
+            profile: 输出规格，OUTPUT_PROFILES 中的名称或规格字典
+            detector: 人脸检测后端名称，见 face_detectors.DETECTORS
         """
         self.output_dir = output_dir
         self.scale_factor = scale_factor
+        self.detect_size = detect_size
+        self.profile = OUTPUT_PROFILES[profile] if isinstance(profile, str) else dict(profile)
+        # 各阶段累计耗时（秒），流水线模式下由多个线程同时累加
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self._timing_lock = threading.Lock()
         
-        # 初始化 MediaPipe Face Detection
-        self.mp_face_detection = mp.solutions.face_detection
-        self.face_detection = self.mp_face_detection.FaceDetection(
-            model_selection=1,  # 1表示全范围模型，适合距离较远的人脸
-            min_detection_confidence=0.5
-        )
+        # 检测器在第一次使用时初始化，并行模式下主进程不需要检测器
+        self.detector_name = detector
+        self._detector = None
+    
+    def options(self):
+        """创建工作进程中的提取器所需的参数"""
+        return {
+            "output_dir": self.output_dir,
+            "scale_factor": self.scale_factor,
+            "detect_size": self.detect_size,
+            "profile": self.profile,
+            "detector": self.detector_name,
+        }
+    
+    @property
+    def detector(self):
+        if self._detector is None:
+            self._detector = create_detector(self.detector_name)
+        return self._detector
+    
+    def _detect(self, image):
+        """
+        检测人脸，返回人脸列表（坐标为相对值，可直接用于原图）
+        
+        先在缩小的图片上检测，检测不到时再用原图检测一次
+        """
+        small = resize_for_detection(image, self.detect_size)
+        if small is not image:
+            faces = self.detector.detect(small)
+            if faces:
+                return faces
+        return self.detector.detect(image)
+    
+    def _add_timing(self, stage, start):
+        now = time.perf_counter()
+        with self._timing_lock:
+            self.timings[stage] += now - start
+        return now
         
     def extract_headshot(self, image_path, save_name=None):
         """
@@ -43,37 +193,32 @@ class HeadshotExtractor:
         Returns:
             bool: 是否成功提取
         """
-        # 读取图片
-        image = cv2.imread(str(image_path))
-        if image is None:
-            print(f"❌ 无法读取图片: {image_path}")
-            return False
-            
-        # 转换为RGB（MediaPipe需要RGB格式）
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        # 检测人脸
-        results = self.face_detection.process(image_rgb)
+        success, message, _ = self._extract(image_path, save_name)
+        print(message)
+        return success
+    
+    def _output_path(self, image_path, save_name=None):
+        # 确定保存的文件名
+        if save_name is None:
+            save_name = Path(image_path).stem
         
-        if not results.detections:
-            print(f"⚠️  未检测到人脸: {image_path}")
-            return False
-            
+        # 保存头像（原始规格保持原格式，从视频中提取的保存为PNG）
+        ext = self.profile.get("format") or Path(image_path).suffix
+        if ext.lower() in VIDEO_EXTENSIONS:
+            ext = ".png"
+        return os.path.join(self.output_dir, f"{save_name}{ext}")
+    
+    def _crop(self, image, face):
+        """按人脸框（相对坐标）裁剪正方形头像"""
         # 获取图片尺寸
         h, w, _ = image.shape
         
-        # 选择置信度最高的人脸（通常就是中央正面的人脸）
-        best_detection = max(results.detections,
-                             key=lambda d: d.score[0])
-        
-        # 获取人脸边界框
-        bbox = best_detection.location_data.relative_bounding_box
-        
         # 转换为像素坐标
-        x = int(bbox.xmin * w)
-        y = int(bbox.ymin * h)
-        box_w = int(bbox.width * w)
-        box_h = int(bbox.height * h)
+        xmin, ymin, width, height = face["bbox"]
+        x = int(xmin * w)
+        y = int(ymin * h)
+        box_w = int(width * w)
+        box_h = int(height * h)
         
         # 计算中心点
         center_x = x + box_w // 2
@@ -84,74 +229,358 @@ class HeadshotExtractor:
         box_size = max(box_w, box_h)
         expanded_size = int(box_size * self.scale_factor)
         
-        # 计算新的边界框（正方形）
-        new_x1 = max(0, center_x - expanded_size // 2)
-        new_y1 = max(0, center_y - expanded_size // 2)
-        new_x2 = min(w, center_x + expanded_size // 2)
-        new_y2 = min(h, center_y + expanded_size // 2)
+        # 计算新的边界框（正方形）：靠近图片边缘时把框平移回图片内，
+        # 而不是截断，保证缩放到固定尺寸时不会变形
+        size = max(1, min(expanded_size, w, h))
+        new_x1 = min(max(0, center_x - size // 2), w - size)
+        new_y1 = min(max(0, center_y - size // 2), h - size)
         
         # 裁剪头像区域
-        headshot = image[new_y1:new_y2, new_x1:new_x2]
+        return image[new_y1:new_y1 + size, new_x1:new_x1 + size]
+    
+    def _resize(self, headshot):
+        """按输出规格缩放到固定尺寸（缩小用 INTER_AREA，放大用 INTER_CUBIC）"""
+        size = self.profile.get("size")
+        if not size:
+            return headshot
+        interpolation = cv2.INTER_AREA if min(headshot.shape[:2]) >= size else cv2.INTER_CUBIC
+        return cv2.resize(headshot, (size, size), interpolation=interpolation)
+    
+    def _encode_params(self, output_path):
+        quality = self.profile.get("quality")
+        if quality and output_path.lower().endswith((".jpg", ".jpeg")):
+            return [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        return []
+    
+    def _extract(self, image_path, save_name=None, cached=None):
+        """
+        提取头像，不直接打印，便于并行时按顺序输出
+        
+        Args:
+            cached: 该图片在检测缓存中的记录，内容哈希一致时直接使用其中的人脸框
+            
+        Returns:
+            (是否成功, 提示信息, 新的缓存记录)，无法读取时缓存记录为 None
+        """
+        if Path(image_path).suffix.lower() in VIDEO_EXTENSIONS:
+            return self._extract_video(image_path, save_name, cached)
+        
+        start = time.perf_counter()
+        output_path = self._output_path(image_path, save_name)
+        
+        image, record = self._read_image(image_path)
+        start = self._add_timing("decode", start)
+        if image is None:
+            return False, f"❌ 无法读取图片: {image_path}", None
+        
+        if self._reuse_cached_face(record, cached):
+            # 图片内容没变，只需要重新裁剪和编码
+            face = record["face"]
+        else:
+            # 检测人脸，选择置信度最高的人脸（通常就是中央正面的人脸）
+            faces = self._detect(image)
+            face = max(faces, key=lambda f: f["score"]) if faces else None
+            start = self._add_timing("detect", start)
+        record["face"] = face
+        
+        if face is None:
+            return False, f"⚠️  未检测到人脸: {image_path}", record
+        
+        self._save_headshot(image, face, output_path, record, start)
+        return True, f"✅ 成功提取头像: {output_path} (置信度: {face['score']:.2f})", record
+    
+    def _read_image(self, image_path):
+        """
+        读取图片并创建缓存记录（用 imdecode 读取，Windows 下中文路径也能打开）
+        
+        Returns:
+            (图片, 缓存记录)，无法读取时为 (None, None)
+        """
+        with open(image_path, "rb") as f:
+            data = f.read()
+        st = os.stat(image_path)
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) if data else None
+        if image is None:
+            return None, None
+        return image, {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha1": hashlib.sha1(data).hexdigest(),
+            "width": int(image.shape[1]),
+            "height": int(image.shape[0]),
+            "detect_size": self.detect_size,
+            "detector": self.detector_name,
+            "outputs": {},
+        }
+    
+    def _reuse_cached_face(self, record, cached):
+        """图片内容和检测参数都没变时，把缓存的人脸框和输出登记复制到新记录中"""
+        if (cached and cached.get("sha1") == record["sha1"]
+                and cached.get("detect_size") == self.detect_size
+                and cached.get("detector", DEFAULT_DETECTOR) == self.detector_name
+                and "face" in cached):
+            record["face"] = cached["face"]
+            record["outputs"] = dict(cached.get("outputs", {}))
+            return True
+        return False
+    
+    def _save_headshot(self, image, face, output_path, record, start):
+        """裁剪、编码并保存头像，在缓存记录中登记输出"""
+        headshot = self._resize(self._crop(image, face))
+        start = self._add_timing("crop", start)
         
-        # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
+        cv2.imwrite(output_path, headshot, self._encode_params(output_path))
+        output_st = os.stat(output_path)
+        record["outputs"][output_path] = {
+            "scale_factor": self.scale_factor,
+            "profile": self.profile,
+            "detector": self.detector_name,
+            "width": int(headshot.shape[1]),
+            "height": int(headshot.shape[0]),
+            "bytes": output_st.st_size,
+            "mtime_ns": output_st.st_mtime_ns,
+        }
+        self._add_timing("encode", start)
+    
+    def _extract_video(self, video_path, save_name=None, cached=None):
+        """
+        从视频中提取头像：均匀抽取少量帧，选人脸置信度和清晰度最高的一帧
         
-        # 确定保存的文件名
-        if save_name is None:
-            save_name = Path(image_path).stem
+        每抽一帧前检查时间预算，超时后只用已抽到的帧（没有人脸的视频也不会超出预算）；
+        抽帧用 CAP_PROP_POS_FRAMES 定位，解码器会从该帧之前最近的关键帧开始解码，
+        并不是只解码关键帧。视频没有变化时直接定位到上次选中的帧
         
-        # 保存头像（保持原格式）
-        ext = Path(image_path).suffix
-        output_path = os.path.join(self.output_dir, f"{save_name}{ext}")
+        Returns:
+            (是否成功, 提示信息, 新的缓存记录)，无法读取时缓存记录为 None
+        """
+        start = time.perf_counter()
+        output_path = self._output_path(video_path, save_name)
+        st = os.stat(video_path)
         
-        cv2.imwrite(output_path, headshot)
-        print(f"✅ 成功提取头像: {output_path} (置信度: {best_detection.score[0]:.2f})")
+        cap = cv2.VideoCapture(str(video_path))
+        try:
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+            start = self._add_timing("decode", start)
+            if frame_count <= 0:
+                return False, f"❌ 无法读取视频: {video_path}", None
+            
+            record = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                # 视频文件较大，只按 大小+修改时间 判断是否变化
+                "sha1": None,
+                "detect_size": self.detect_size,
+                "detector": self.detector_name,
+                "outputs": {},
+            }
+            
+            use_cached = bool(
+                cached and (cached.get("size"), cached.get("mtime_ns")) == (st.st_size, st.st_mtime_ns)
+                and cached.get("detect_size") == self.detect_size
+                and cached.get("detector", DEFAULT_DETECTOR) == self.detector_name
+                and cached.get("face") is not None)
+            if use_cached:
+                positions = [cached["frame"]]
+                record["outputs"] = dict(cached.get("outputs", {}))
+            else:
+                # 避开开头和结尾（学生可能还没坐好或已经离开）
+                positions = sorted({int(frame_count * (0.1 + 0.8 * i / max(VIDEO_SAMPLES - 1, 1)))
+                                    for i in range(VIDEO_SAMPLES)})
+            
+            budget_end = time.perf_counter() + VIDEO_TIME_BUDGET
+            best = None
+            best_rank = -1.0
+            for position in positions:
+                if time.perf_counter() > budget_end:
+                    break
+                # 定位时解码器从该帧之前最近的关键帧开始解码到该帧
+                cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+                ret, frame = cap.read()
+                start = self._add_timing("decode", start)
+                if not ret:
+                    continue
+                
+                if use_cached:
+                    best = (frame, cached["face"], position, cached.get("sharpness", 0.0))
+                    break
+                faces = self._detect(frame)
+                if faces:
+                    face = max(faces, key=lambda f: f["score"])
+                    sharpness = face_sharpness(frame, face)
+                    rank = face["score"] * min(1.0, sharpness / SHARPNESS_REF)
+                    if rank > best_rank:
+                        best_rank = rank
+                        best = (frame, face, position, sharpness)
+                start = self._add_timing("detect", start)
+        finally:
+            cap.release()
         
-        return True
+        if best is None:
+            record["face"] = None
+            return False, f"⚠️  视频中未检测到人脸: {video_path}", record
+        
+        frame, face, position, sharpness = best
+        record.update({
+            "width": int(frame.shape[1]),
+            "height": int(frame.shape[0]),
+            "face": face,
+            "frame": position,
+            "sharpness": round(sharpness, 1),
+        })
+        self._save_headshot(frame, face, output_path, record, start)
+        return True, (f"✅ 成功从视频提取头像: {output_path} "
+                      f"(第 {position} 帧，置信度: {face['score']:.2f})"), record
     
-    def batch_extract(self, input_dir=".", pattern="*.png"):
+    def _cached_result(self, image_file, output_path, entry):
+        """
+        源图片未变化时直接根据缓存得出结果，不需要读取图片
+        
+        Returns:
+            (是否成功, 提示信息) 或 None（需要处理）
+        """
+        if entry is None:
+            return None
+        st = image_file.stat()
+        if (entry.get("size"), entry.get("mtime_ns")) != (st.st_size, st.st_mtime_ns):
+            return None
+        if entry.get("face") is None:
+            if (entry.get("detect_size") == self.detect_size and "face" in entry
+                    and entry.get("detector", DEFAULT_DETECTOR) == self.detector_name):
+                return False, f"⚠️  未检测到人脸: {image_file}"
+            return None
+        output = entry.get("outputs", {}).get(output_path)
+        if (output is not None and output["scale_factor"] == self.scale_factor
+                and output.get("profile") == self.profile
+                and output.get("detector", DEFAULT_DETECTOR) == self.detector_name
+                and os.path.exists(output_path)
+                and os.stat(output_path).st_mtime_ns == output["mtime_ns"]):
+            return True, f"⏭️  头像已是最新: {output_path}"
+        return None
+    
+    def batch_extract(self, input_dir=".", pattern="*.png", workers=1, include_videos=True,
+                      io_threads=None):
         """
         批量提取头像
         
         Args:
             input_dir: 输入目录
             pattern: 文件匹配模式（如 "*.png", "*.jpg" 等）
+            workers: 检测进程数，1 表示在当前进程中逐个处理，None 表示CPU核数；
+                     大于1时使用 解码 → 检测 → 编码 流水线
+            include_videos: 没有照片的学生是否从录像（考号_姓名.mp4）中提取头像
+            io_threads: 流水线中解码和写入线程池的线程数，默认按CPU核数
         """
         input_path = Path(input_dir)
         
         # 查找所有匹配的图片文件
         image_files = list(input_path.glob(pattern))
         
-        if not image_files:
+        # 只有视频没有照片的学生，从视频中提取
+        video_files = []
+        if include_videos:
+            photo_ids = {student_id_from_filename(f.name) for f in image_files}
+            for ext in VIDEO_EXTENSIONS:
+                for video_file in sorted(input_path.glob(f"*{ext}")):
+                    student_id = student_id_from_filename(video_file.name)
+                    if student_id not in photo_ids:
+                        photo_ids.add(student_id)
+                        video_files.append(video_file)
+        
+        if not image_files and not video_files:
             print(f"⚠️  未找到匹配的图片文件: {pattern}")
             return
         
         print(f"📁 找到 {len(image_files)} 个图片文件")
+        if video_files:
+            print(f"🎬 另有 {len(video_files)} 名学生只有视频，从视频中提取头像")
+        image_files += video_files
         print(f"📂 输出目录: {self.output_dir}\n")
         
         success_count = 0
+        skipped_count = 0
         failed_files = []
+        batch_start = time.perf_counter()
+        
+        # 人脸检测缓存：源图片没变时只重新裁剪，输出也是最新时直接跳过
+        cache_path = input_path / FACE_CACHE_FILENAME
+        cache = load_face_cache(cache_path)
         
-        for image_file in image_files:
+        tasks = []
+        cached_results = {}
+        student_ids = []
+        manifest = {}
+        for i, image_file in enumerate(image_files):
             # 从文件名提取学号（去掉姓名部分）
-            # 例如: "202510745_张殷瑞.png" -> "202510745"
-            filename = image_file.stem
-            if "_" in filename:
-                student_id = filename.split("_")[0]
-            else:
-                student_id = filename
+            student_id = student_id_from_filename(image_file.name)
+            student_ids.append(student_id)
             
-            # 提取头像
-            if self.extract_headshot(image_file, student_id):
-                success_count += 1
+            entry = cache.get(image_file.name)
+            cached_result = self._cached_result(
+                image_file, self._output_path(image_file, student_id), entry)
+            if cached_result is not None:
+                cached_results[i] = cached_result
             else:
-                failed_files.append(image_file.name)
+                tasks.append((str(image_file), student_id, entry))
+        
+        pipeline = None
+        if not tasks:
+            results = iter(())
+        elif workers == 1:
+            results = ((success, message, None, record) for success, message, record
+                       in (self._extract(*task) for task in tasks))
+        else:
+            # 解码和写入在线程池中进行，检测在进程池中进行，各阶段同时工作
+            pipeline = HeadshotPipeline(self, workers or os.cpu_count() or 1, io_threads)
+            print(f"⚙️  流水线处理：{pipeline.io_threads} 个解码线程，"
+                  f"{pipeline.workers} 个检测进程，{pipeline.io_threads} 个写入线程\n")
+            results = pipeline.run(tasks)
+        
+        try:
+            for i, image_file in enumerate(image_files):
+                if i in cached_results:
+                    success, message = cached_results[i]
+                    if success:
+                        skipped_count += 1
+                else:
+                    success, message, timings, record = next(results)
+                    if timings is not None:
+                        for stage, seconds in timings.items():
+                            self.timings[stage] += seconds
+                    if record is not None:
+                        cache[image_file.name] = record
+                    if success:
+                        manifest.update(manifest_entries(
+                            record, image_file, self._output_path(image_file, student_ids[i])))
+                print(message)
+                if success:
+                    success_count += 1
+                else:
+                    failed_files.append(image_file.name)
+        finally:
+            if pipeline is not None:
+                results.close()
+        
+        if tasks:
+            # 去掉已经不存在的源文件的记录
+            for name in [name for name in cache if not (input_path / name).exists()]:
+                del cache[name]
+            save_face_cache(cache_path, cache)
+        if manifest:
+            update_manifest(self.output_dir, self.profile, self.scale_factor, manifest)
         
         # 打印统计信息
         print(f"\n{'='*60}")
         print("✨ 处理完成！")
         print(f"   成功: {success_count}/{len(image_files)}")
         print(f"   失败: {len(failed_files)}/{len(image_files)}")
+        if skipped_count:
+            print(f"   其中 {skipped_count} 个头像已是最新，未重新生成")
+        print(f"   耗时: {time.perf_counter() - batch_start:.2f} 秒（"
+              + "，".join(f"{STAGE_LABELS[stage]} {self.timings[stage]:.2f}s" for stage in STAGES)
+              + "，各进程累计）")
+        if pipeline is not None:
+            print(f"   流水线利用率: {pipeline.describe_utilization()}")
         
         if failed_files:
             print("\n❌ 失败的文件:")
@@ -160,7 +589,248 @@ class HeadshotExtractor:
     
     def __del__(self):
         """清理资源"""
-        self.face_detection.close()
+        if getattr(self, "_detector", None) is not None:
+            self._detector.close()
+
+
+# 工作进程中的提取器，由 _init_worker 在进程启动时创建一次
+_worker_extractor = None
+
+
+def _init_worker(options):
+    global _worker_extractor
+    _worker_extractor = HeadshotExtractor(**options)
+
+
+def _init_background_worker(options):
+    # 后台提取进程使用最低优先级，不影响拍摄界面和录像
+    if hasattr(os, "nice"):
+        os.nice(19)
+    _init_worker(options)
+
+
+def _detect_in_worker(image):
+    """进程池任务：检测一张（已缩小的）图片，返回 (人脸列表, 耗时)"""
+    start = time.perf_counter()
+    faces = _worker_extractor.detector.detect(image)
+    return faces, time.perf_counter() - start
+
+
+def _extract_in_worker(task):
+    """进程池任务：返回 (是否成功, 提示信息, 本任务各阶段耗时, 新的缓存记录)"""
+    extractor = _worker_extractor
+    before = dict(extractor.timings)
+    success, message, record = extractor._extract(*task)
+    timings = {stage: extractor.timings[stage] - before[stage] for stage in STAGES}
+    return success, message, timings, record
+
+
+class HeadshotPipeline:
+    """
+    头像提取流水线：解码（I/O线程池）→ 检测（进程池）→ 裁剪、编码、写入（写入线程池）
+    
+    只把缩小后的检测用图片传给检测进程；同时在处理中的图片数有上限，
+    达到上限时暂停读取新图片（背压），避免解码跑得太快占满内存。
+    视频任务整体交给检测进程处理。
+    """
+    
+    def __init__(self, extractor, workers, io_threads=None, max_in_flight=None):
+        self.extractor = extractor
+        self.workers = workers
+        self.io_threads = io_threads or min(8, os.cpu_count() or 1)
+        self.max_in_flight = max_in_flight or (workers + self.io_threads) * 2
+        # 各阶段忙碌时间（秒）和总耗时，用于计算利用率
+        self.busy = {"decode": 0.0, "detect": 0.0, "write": 0.0}
+        self.wall = 0.0
+        self._lock = threading.Lock()
+    
+    def _add_busy(self, stage, seconds):
+        with self._lock:
+            self.busy[stage] += seconds
+    
+    def run(self, tasks):
+        """依次产生每个任务的结果 (是否成功, 提示信息, 各阶段耗时或None, 缓存记录)，顺序与输入一致"""
+        start = time.perf_counter()
+        slots = threading.Semaphore(self.max_in_flight)
+        results = [Future() for _ in tasks]
+        stop = threading.Event()
+        
+        self.decode_pool = ThreadPoolExecutor(self.io_threads)
+        self.detect_pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(self.extractor.options(),))
+        self.write_pool = ThreadPoolExecutor(self.io_threads)
+        
+        def feed():
+            for task, result in zip(tasks, results):
+                slots.acquire()
+                if stop.is_set():
+                    return
+                result.add_done_callback(lambda _: slots.release())
+                self._start(task, result)
+        
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            for result in results:
+                yield result.result()
+        finally:
+            stop.set()
+            slots.release()  # 唤醒可能正在等待的 feed 线程
+            feeder.join()
+            self.decode_pool.shutdown(cancel_futures=True)
+            self.detect_pool.shutdown(cancel_futures=True)
+            self.write_pool.shutdown(cancel_futures=True)
+            self.wall = time.perf_counter() - start
+    
+    def _then(self, future, result, callback):
+        """future 完成后调用 callback(返回值)，出错时把错误作为该任务的结果"""
+        def done(f):
+            try:
+                callback(f.result())
+            except Exception as e:
+                if not result.done():
+                    result.set_result((False, f"❌ 头像提取失败: {e}", None, None))
+        future.add_done_callback(done)
+    
+    def _start(self, task, result):
+        image_path, save_name, cached = task
+        if Path(image_path).suffix.lower() in VIDEO_EXTENSIONS:
+            future = self.detect_pool.submit(_extract_in_worker, task)
+            self._then(future, result, lambda r: self._finish_video(r, result))
+            return
+        future = self.decode_pool.submit(self._decode, image_path)
+        self._then(future, result, lambda decoded: self._after_decode(decoded, task, result))
+    
+    def _finish_video(self, video_result, result):
+        success, message, timings, record = video_result
+        self._add_busy("detect", sum(timings.values()))
+        result.set_result(video_result)
+    
+    def _decode(self, image_path):
+        start = time.perf_counter()
+        image, record = self.extractor._read_image(image_path)
+        small = resize_for_detection(image, self.extractor.detect_size) if image is not None else None
+        self.extractor._add_timing("decode", start)
+        self._add_busy("decode", time.perf_counter() - start)
+        return image, small, record
+    
+    def _after_decode(self, decoded, task, result):
+        image_path, save_name, cached = task
+        image, small, record = decoded
+        if image is None:
+            result.set_result((False, f"❌ 无法读取图片: {image_path}", None, None))
+        elif self.extractor._reuse_cached_face(record, cached):
+            if record["face"] is None:
+                # 与逐个处理时相同：图片内容没变，上次就没有检测到人脸
+                result.set_result((False, f"⚠️  未检测到人脸: {image_path}", None, record))
+            else:
+                self._submit_write(image, record, task, result)
+        else:
+            self._submit_detect(small, image, record, task, result)
+    
+    def _submit_detect(self, detect_image, image, record, task, result):
+        future = self.detect_pool.submit(_detect_in_worker, detect_image)
+        
+        def after_detect(detected):
+            faces, seconds = detected
+            self._add_busy("detect", seconds)
+            with self.extractor._timing_lock:
+                self.extractor.timings["detect"] += seconds
+            if not faces and detect_image is not image:
+                # 缩小的图片上检测不到时用原图再检测一次
+                # （回调在进程池的管理线程中运行，不在这里直接向同一个进程池提交）
+                self.decode_pool.submit(self._submit_detect, image, image, record, task, result)
+                return
+            record["face"] = max(faces, key=lambda f: f["score"]) if faces else None
+            if record["face"] is None:
+                result.set_result((False, f"⚠️  未检测到人脸: {task[0]}", None, record))
+            else:
+                self._submit_write(image, record, task, result)
+        
+        self._then(future, result, after_detect)
+    
+    def _submit_write(self, image, record, task, result):
+        image_path, save_name, cached = task
+        
+        def write():
+            start = time.perf_counter()
+            output_path = self.extractor._output_path(image_path, save_name)
+            self.extractor._save_headshot(image, record["face"], output_path, record, start)
+            self._add_busy("write", time.perf_counter() - start)
+            return output_path
+        
+        self._then(self.write_pool.submit(write), result, lambda output_path: result.set_result((
+            True, f"✅ 成功提取头像: {output_path} (置信度: {record['face']['score']:.2f})",
+            None, record)))
+    
+    def describe_utilization(self):
+        """各阶段利用率 = 忙碌时间 / (总耗时 × 并行数)"""
+        capacity = {"decode": self.io_threads, "detect": self.workers, "write": self.io_threads}
+        labels = {"decode": "解码", "detect": "检测", "write": "编码写入"}
+        units = {"decode": "线程", "detect": "进程", "write": "线程"}
+        parts = []
+        for stage in ("decode", "detect", "write"):
+            ratio = self.busy[stage] / (self.wall * capacity[stage]) if self.wall else 0.0
+            parts.append(f"{labels[stage]} {ratio:.0%}（{capacity[stage]} {units[stage]}）")
+        return "，".join(parts)
+
+
+class BackgroundHeadshotWorker:
+    """拍照时在后台提取头像：一个低优先级的常驻进程，检测器只初始化一次"""
+    
+    def __init__(self, on_result, output_dir="cuted", scale_factor=1.8,
+                 detect_size=DEFAULT_DETECT_SIZE, profile="original",
+                 detector=DEFAULT_DETECTOR, max_pending=4):
+        """
+        初始化后台提取进程
+        
+        Args:
+            on_result: 每张照片处理完后的回调 on_result(save_name, 是否成功, 提示信息, 缓存记录)，
+                       在后台线程中调用
+            max_pending: 最多排队的照片数，超过时新照片不再提交（之后可用批量提取补上）
+        """
+        self.on_result = on_result
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.output_dir = output_dir
+        self.scale_factor = scale_factor
+        self.profile = OUTPUT_PROFILES[profile] if isinstance(profile, str) else dict(profile)
+        options = {"output_dir": output_dir, "scale_factor": scale_factor,
+                   "detect_size": detect_size, "profile": self.profile, "detector": detector}
+        self.executor = ProcessPoolExecutor(
+            max_workers=1, initializer=_init_background_worker, initargs=(options,))
+    
+    def submit(self, image_path, save_name):
+        """提交一张已保存的照片，队列已满时返回 False"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+        future = self.executor.submit(_extract_in_worker, (str(image_path), save_name, None))
+        future.add_done_callback(lambda f: self._on_done(f, str(image_path), save_name))
+        return True
+    
+    def _on_done(self, future, image_path, save_name):
+        with self._lock:
+            self._pending -= 1
+        if future.cancelled():
+            return
+        try:
+            success, message, _, record = future.result()
+            if success:
+                output_path = next(iter(record["outputs"]))
+                with self._lock:
+                    update_manifest(self.output_dir, self.profile, self.scale_factor,
+                                    manifest_entries(record, image_path, output_path))
+        except Exception as e:
+            success, message, record = False, f"❌ 头像提取失败: {e}", None
+        self.on_result(save_name, success, message, record)
+    
+    def stop(self):
+        """停止后台进程，丢弃还没开始处理的照片"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 
 def main():
@@ -176,19 +846,38 @@ def main():
                         help="文件匹配模式（默认: *.png）")
     parser.add_argument("-s", "--scale", type=float, default=1.8,
                         help="头像框扩展比例（默认: 1.8）")
+    parser.add_argument("--detect-size", type=int, default=DEFAULT_DETECT_SIZE,
+                        help=f"检测用图片的长边像素数，0 表示用原图检测（默认: {DEFAULT_DETECT_SIZE}）")
+    parser.add_argument("--profile", choices=sorted(OUTPUT_PROFILES), default="original",
+                        help="输出规格：original 原始裁剪；deck 缩放为480像素JPEG，用于生成PPT（默认: original）")
+    parser.add_argument("--detector", choices=list(DETECTORS), default=DEFAULT_DETECTOR,
+                        help=f"人脸检测后端（默认: {DEFAULT_DETECTOR}），"
+                             "可用 python face_detectors.py 比较各后端")
+    parser.add_argument("--no-video", action="store_true",
+                        help="不从视频中为没有照片的学生提取头像")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="检测进程数，大于1时使用流水线处理（默认: 1，0 表示CPU核数）")
+    parser.add_argument("--io-threads", type=int, default=None,
+                        help="流水线中解码和写入的线程数（默认: 按CPU核数，最多8）")
     
     args = parser.parse_args()
     
     # 创建提取器
     extractor = HeadshotExtractor(
         output_dir=args.output,
-        scale_factor=args.scale
+        scale_factor=args.scale,
+        detect_size=args.detect_size,
+        profile=args.profile,
+        detector=args.detector
     )
     
     # 批量处理
     extractor.batch_extract(
         input_dir=args.input,
-        pattern=args.pattern
+        pattern=args.pattern,
+        workers=args.workers or None,
+        include_videos=not args.no_video,
+        io_threads=args.io_threads
     )
 
 
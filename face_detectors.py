@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+人脸检测后端
+提供统一的检测接口：detect(BGR图片) -> [人脸]，人脸为字典
+{"bbox": [xmin, ymin, width, height], "score": 置信度, "keypoints": [[x, y], ...]}，
+坐标均为相对值，可直接用于原图或任意缩放后的图片。
+
+可用后端：
+  mediapipe-full   MediaPipe 全范围模型（model_selection=1，适合距离较远的人脸）
+  mediapipe-short  MediaPipe 近距离模型（model_selection=0，2米以内，更快）
+  haar             OpenCV Haar 级联（opencv-python 自带，不需要 MediaPipe，适合旧机器）
+
+直接运行本文件可以在一个照片目录上比较各后端的速度和检出率。
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_DETECTOR = "mediapipe-full"
+
+
+def face_record(detection):
+    """把 MediaPipe 检测结果转换为可保存的字典（坐标均为相对值）"""
+    location = detection.location_data
+    bbox = location.relative_bounding_box
+    return {
+        "bbox": [bbox.xmin, bbox.ymin, bbox.width, bbox.height],
+        "score": float(detection.score[0]),
+        "keypoints": [[kp.x, kp.y] for kp in location.relative_keypoints],
+    }
+
+
+class MediaPipeDetector:
+    """MediaPipe 人脸检测（只在创建时才导入 mediapipe）"""
+
+    def __init__(self, model_selection=1, min_confidence=0.5):
+        import mediapipe as mp
+
+        self.detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_confidence
+        )
+
+    def detect(self, image):
+        results = self.detector.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        return [face_record(d) for d in (results.detections or [])]
+
+    def close(self):
+        self.detector.close()
+
+
+class HaarCascadeDetector:
+    """OpenCV Haar 级联人脸检测"""
+
+    def __init__(self, cascade="haarcascade_frontalface_default.xml", min_neighbors=5,
+                 min_size=0.08):
+        """
+        Args:
+            cascade: 级联文件名（在 cv2.data.haarcascades 中查找）或路径
+            min_neighbors: 相邻检测框数量阈值，越大误检越少
+            min_size: 最小人脸边长（相对于图片短边）
+        """
+        path = cascade
+        if not os.path.exists(path):
+            path = os.path.join(getattr(cv2, "data").haarcascades, cascade)
+        self.classifier = cv2.CascadeClassifier(path)
+        if self.classifier.empty():
+            raise RuntimeError(f"无法加载 Haar 级联文件: {path}")
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, image):
+        gray = cv2.equalizeHist(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        h, w = gray.shape
+        side = max(1, int(min(h, w) * self.min_size))
+        boxes, neighbors = self.classifier.detectMultiScale2(
+            gray, scaleFactor=1.1, minNeighbors=self.min_neighbors, minSize=(side, side))
+        # Haar 没有置信度，用相邻检测框数量换算成 0.5~1 之间的分数
+        return [{
+            "bbox": [x / w, y / h, bw / w, bh / h],
+            "score": float(n / (n + self.min_neighbors)),
+            "keypoints": [],
+        } for (x, y, bw, bh), n in zip(boxes, np.ravel(neighbors))]
+
+    def close(self):
+        pass
+
+
+DETECTORS = {
+    "mediapipe-full": lambda: MediaPipeDetector(model_selection=1),
+    "mediapipe-short": lambda: MediaPipeDetector(model_selection=0),
+    "haar": HaarCascadeDetector,
+}
+
+
+def create_detector(name=DEFAULT_DETECTOR):
+    """按名称创建检测器"""
+    if name not in DETECTORS:
+        raise ValueError(f"未知的人脸检测后端: {name}（可选: {', '.join(DETECTORS)}）")
+    return DETECTORS[name]()
+
+
+def resize_for_detection(image, detect_size):
+    """把图片长边缩小到 detect_size（0 或图片更小时不缩放）"""
+    h, w = image.shape[:2]
+    if not detect_size or max(h, w) <= detect_size:
+        return image
+    ratio = detect_size / max(h, w)
+    return cv2.resize(image, (max(1, round(w * ratio)), max(1, round(h * ratio))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def benchmark(image_paths, names, detect_size):
+    """
+    在同一批照片上比较各检测后端
+
+    Returns:
+        dict: {后端名: {"images", "found", "missed", "mean_ms", "p95_ms", "per_second"}}，
+              无法创建的后端为 {"error": 原因}
+    """
+    # 先统一解码和缩放，只比较检测本身的耗时
+    images = []
+    for path in image_paths:
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append((os.path.basename(path), resize_for_detection(image, detect_size)))
+
+    report = {}
+    for name in names:
+        try:
+            detector = create_detector(name)
+        except Exception as e:
+            report[name] = {"error": str(e)}
+            continue
+        latencies = []
+        missed = []
+        try:
+            for filename, image in images:
+                start = time.perf_counter()
+                faces = detector.detect(image)
+                latencies.append(time.perf_counter() - start)
+                if not faces:
+                    missed.append(filename)
+        finally:
+            detector.close()
+        total = sum(latencies)
+        report[name] = {
+            "images": len(images),
+            "found": len(images) - len(missed),
+            "missed": missed,
+            "mean_ms": total / len(images) * 1000 if images else 0.0,
+            "p95_ms": float(np.percentile(latencies, 95)) * 1000 if latencies else 0.0,
+            "per_second": len(images) / total if total else 0.0,
+        }
+    return report
+
+
+def main():
+    """主函数：检测后端对比"""
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="人脸检测后端速度和检出率对比")
+    parser.add_argument("-i", "--input", default=".",
+                        help="照片目录（默认: 当前目录）")
+    parser.add_argument("-p", "--pattern", default="*.png",
+                        help="文件匹配模式（默认: *.png）")
+    parser.add_argument("-d", "--detectors", nargs="+", default=list(DETECTORS),
+                        choices=list(DETECTORS), help="参与对比的后端（默认: 全部）")
+    parser.add_argument("--detect-size", type=int, default=640,
+                        help="检测用图片的长边像素数，0 表示用原图检测（默认: 640）")
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(os.path.join(args.input, args.pattern)))
+    if not image_paths:
+        print(f"⚠️  未找到匹配的图片文件: {args.pattern}")
+        return
+
+    print(f"📁 {len(image_paths)} 个图片文件，检测尺寸 {args.detect_size or '原图'}\n")
+    report = benchmark(image_paths, args.detectors, args.detect_size)
+    print(f"{'后端':<16}{'检出':>10}{'平均(ms)':>10}{'P95(ms)':>10}{'张/秒':>10}")
+    for name, stats in report.items():
+        if "error" in stats:
+            print(f"{name:<16}❌ {stats['error']}")
+            continue
+        print(f"{name:<16}{stats['found']:>5}/{stats['images']:<4}"
+              f"{stats['mean_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['per_second']:>10.1f}")
+    for name, stats in report.items():
+        if stats.get("missed"):
+            print(f"\n{name} 未检测到人脸的文件:")
+            for filename in stats["missed"]:
+                print(f"   - {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复照片检查工具
+拍照时忘记切换到下一位学生，同一个人的照片就会出现在两个名字下。
+本工具为每张照片和头像计算64位感知哈希（dHash），缓存在拍摄文件索引中，
+再用 NumPy 向量化计算汉明距离，找出属于不同学生却几乎相同的照片。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from media_index import MediaIndex
+
+# 汉明距离不超过此值（共64位）视为疑似重复
+DEFAULT_THRESHOLD = 8
+# 每批与全部哈希比较的行数，控制距离矩阵的内存占用
+BLOCK_ROWS = 1024
+
+# 0~255 每个字节中1的个数，用于 NumPy 1.x 没有 bitwise_count 时计算汉明距离
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(gray):
+    """计算灰度图的64位 dHash：缩小到 9x8，比较每行相邻像素的明暗"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hash_image_file(path):
+    """进程池任务：返回 (文件名, dHash)，无法解码时哈希为 None"""
+    # 用 imdecode 读取，Windows 下中文路径也能打开；
+    # 哈希只需要 9x8 的缩略图，JPEG 可以直接按 1/4 尺寸解码
+    data = np.fromfile(path, dtype=np.uint8)
+    gray = cv2.imdecode(data, cv2.IMREAD_REDUCED_GRAYSCALE_4) if data.size else None
+    return os.path.basename(path), (dhash(gray) if gray is not None else None)
+
+
+def popcount(values):
+    """uint64 数组中每个元素的1的个数"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def hash_directory(directory, workers=None):
+    """
+    计算目录中所有照片的感知哈希（已缓存且未变化的文件直接使用缓存结果）
+
+    Returns:
+        list: [(文件名, 考号, dHash)]，文件名不含考号时按文件名（如头像 考号.png）取考号
+    """
+    with MediaIndex(directory) as index:
+        index.refresh()
+        files = index.files("photo")
+        cached = index.cached_hashes()
+
+        file_state = {}
+        tasks = []
+        for filename, size, mtime_ns, exam_id, name, kind in files:
+            file_state[filename] = (size, mtime_ns)
+            if filename not in cached:
+                tasks.append(os.path.join(directory, filename))
+
+        print(f"🔍 {directory}: 计算 {len(tasks)} 张照片的哈希（{len(cached)} 张使用缓存）")
+        if tasks:
+            rows = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+                for filename, value in executor.map(hash_image_file, tasks, chunksize=chunksize):
+                    if value is None:
+                        print(f"⚠️  无法解码: {filename}")
+                        continue
+                    cached[filename] = value
+                    rows.append((filename,) + file_state[filename] + (value,))
+            index.save_hashes(rows)
+
+    hashes = []
+    for filename, size, mtime_ns, exam_id, name, kind in files:
+        if filename in cached:
+            if exam_id is None:
+                exam_id = os.path.splitext(filename)[0]
+            hashes.append((filename, exam_id, cached[filename]))
+    return hashes
+
+
+def find_near_duplicates(entries, threshold=DEFAULT_THRESHOLD):
+    """
+    找出属于不同学生的近似重复照片
+
+    Args:
+        entries: [(标签, 考号, dHash)]
+        threshold: 汉明距离阈值
+
+    Returns:
+        list: [(距离, 标签1, 标签2)]，按距离从小到大
+    """
+    if len(entries) < 2:
+        return []
+    values = np.array([value for _, _, value in entries], dtype=np.uint64)
+    students = np.array([exam_id for _, exam_id, _ in entries])
+
+    pairs = []
+    for start in range(0, len(values), BLOCK_ROWS):
+        block = values[start:start + BLOCK_ROWS]
+        distances = popcount(block[:, None] ^ values[None, :])
+        rows, cols = np.nonzero(distances <= threshold)
+        rows += start
+        # 每对只报告一次，同一学生的多张照片不算重复
+        keep = (cols > rows) & (students[rows] != students[cols])
+        for i, j in zip(rows[keep], cols[keep]):
+            pairs.append((int(distances[i - start, j]), entries[i][0], entries[j][0]))
+    pairs.sort()
+    return pairs
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="重复照片检查工具")
+    parser.add_argument("-d", "--directory", default=".",
+                        help="拍摄文件所在目录（默认: 当前目录）")
+    parser.add_argument("--headshots", default="cuted",
+                        help="头像目录，不存在时跳过（默认: cuted）")
+    parser.add_argument("-t", "--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"汉明距离阈值，共64位（默认: {DEFAULT_THRESHOLD}）")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="并行进程数（默认: CPU核数）")
+    args = parser.parse_args()
+
+    for directory in (args.directory, args.headshots):
+        if not os.path.isdir(directory):
+            continue
+        entries = hash_directory(directory, args.workers)
+        pairs = find_near_duplicates(entries, args.threshold)
+        print(f"\n{directory}: 共 {len(entries)} 张照片，发现 {len(pairs)} 对疑似重复")
+        for distance, first, second in pairs:
+            print(f"  ⚠️  {first} ≈ {second}（距离 {distance}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍摄文件模糊匹配
+为名单中找不到的文件（手打错字、用旧名单拍摄等）推荐最可能的学生及置信度。
+姓名建立字符 n-gram 倒排索引（安装 pypinyin 时同时索引拼音，能匹配同音错字），
+考号建立有序前缀索引，候选只从索引中取，不做 文件数×学生数 的两两比较。
+"""
+
+import bisect
+import os
+from collections import Counter
+
+from student_index import normalize_name
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时只按汉字匹配
+    lazy_pinyin = None
+
+# 每个文件最多精确打分的候选数
+MAX_CANDIDATES = 50
+# 出现在太多学生姓名中的单字（如常见姓氏）不用于召回，只参与打分
+MAX_POSTING = 200
+# 考号前缀索引最多返回的候选数
+MAX_ID_CANDIDATES = 30
+
+
+def name_grams(name):
+    """姓名的字符 unigram + bigram"""
+    chars = normalize_name(name)
+    grams = set(chars)
+    grams.update(chars[i:i + 2] for i in range(len(chars) - 1))
+    return grams
+
+
+def pinyin_grams(name):
+    """姓名的拼音音节及相邻音节组合，没有 pypinyin 时为空"""
+    if lazy_pinyin is None:
+        return set()
+    syllables = lazy_pinyin(normalize_name(name))
+    grams = {f"py:{s}" for s in syllables}
+    grams.update(f"py:{a}{b}" for a, b in zip(syllables, syllables[1:]))
+    return grams
+
+
+def dice(a, b):
+    """Dice 相似度"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def edit_distance(a, b):
+    """编辑距离（考号只有十来位，直接动态规划）"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class FuzzyResolver:
+    """基于索引的模糊匹配器"""
+
+    def __init__(self, student_index):
+        """
+        建立索引
+
+        Args:
+            student_index: StudentIndex
+        """
+        self.students = student_index.students
+        self.name_grams = []
+        self.pinyin_grams = []
+        self.postings = {}
+        for i, student in enumerate(self.students):
+            grams = name_grams(student.name)
+            py_grams = pinyin_grams(student.name)
+            self.name_grams.append(grams)
+            self.pinyin_grams.append(py_grams)
+            for gram in grams | py_grams:
+                self.postings.setdefault(gram, []).append(i)
+
+        # 考号有序列表，用二分查找做前缀查询
+        self.sorted_ids = sorted((s.exam_id, i) for i, s in enumerate(self.students))
+        self.id_keys = [exam_id for exam_id, _ in self.sorted_ids]
+
+    def _name_candidates(self, grams):
+        counts = Counter()
+        rare = [g for g in grams if len(self.postings.get(g, ())) <= MAX_POSTING]
+        for gram in (rare or grams):
+            counts.update(self.postings.get(gram, ()))
+        return [i for i, _ in counts.most_common(MAX_CANDIDATES)]
+
+    def _id_candidates(self, exam_id):
+        """最长的、有匹配的考号前缀对应的学生"""
+        for length in range(len(exam_id), 0, -1):
+            prefix = exam_id[:length]
+            lo = bisect.bisect_left(self.id_keys, prefix)
+            # 考号都是数字，":" 排在 "9" 之后，作为前缀区间的上界
+            hi = bisect.bisect_left(self.id_keys, prefix + ":")
+            if hi > lo:
+                return [i for _, i in self.sorted_ids[lo:min(hi, lo + MAX_ID_CANDIDATES)]]
+        return []
+
+    def score(self, i, exam_id, grams, py_grams):
+        """计算候选学生的置信度（0~1）"""
+        name_score = max(dice(grams, self.name_grams[i]),
+                         dice(py_grams, self.pinyin_grams[i]) * 0.95)
+        if not exam_id:
+            return name_score
+        candidate_id = self.students[i].exam_id
+        id_score = max(0.0, 1 - edit_distance(exam_id, candidate_id) / max(len(candidate_id), 1))
+        if not grams:
+            return id_score
+        return 0.6 * name_score + 0.4 * id_score
+
+    def propose(self, exam_id=None, name=None, limit=3):
+        """
+        为文件推荐最可能的学生
+
+        Args:
+            exam_id: 文件名中的考号，可为 None
+            name: 文件名中的姓名，可为 None
+            limit: 最多返回的候选数
+
+        Returns:
+            list: [(学生, 置信度)]，按置信度从高到低
+        """
+        grams = name_grams(name) if name else set()
+        py_grams = pinyin_grams(name) if name else set()
+
+        candidates = set()
+        if grams or py_grams:
+            candidates.update(self._name_candidates(grams | py_grams))
+        if exam_id:
+            candidates.update(self._id_candidates(str(exam_id)))
+
+        scored = [(self.students[i], self.score(i, exam_id, grams, py_grams))
+                  for i in candidates]
+        scored.sort(key=lambda item: (-item[1], item[0].exam_id))
+        return [item for item in scored[:limit] if item[1] > 0]
+
+    def propose_for_file(self, filename, limit=3):
+        """按 考号_姓名.扩展名 或 姓名.扩展名 解析文件名并推荐候选"""
+        stem = os.path.splitext(filename)[0]
+        exam_id, sep, name = stem.partition("_")
+        if not sep or not exam_id.isdigit():
+            exam_id, name = None, stem
+        return self.propose(exam_id, name, limit)
+
+
+def describe_proposals(proposals):
+    """候选列表的简短描述"""
+    return "，".join(f"{s.exam_id}_{s.name}（{s.class_name}，{score:.0%}）"
+                    for s, score in proposals)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+头像质量评分工具
+为 cuted/ 中的每张头像计算清晰度、曝光、人脸大小、人脸居中程度和检测置信度，
+把综合得分最低的排在前面写入报告，审核时只需要看最差的一小部分。
+所有头像先缩小到同一尺寸，叠成一个数组后用 NumPy 一次算完。
+"""
+
+import csv
+import glob
+import os
+
+import cv2
+import numpy as np
+
+from extract_headshots import FACE_CACHE_FILENAME, MANIFEST_FILENAME, load_face_cache
+
+REPORT_FILENAME = "头像质量报告.csv"
+
+# 评分用的头像尺寸
+SCORE_SIZE = 128
+# 拉普拉斯方差达到此值视为足够清晰
+SHARPNESS_REF = 150.0
+# 低于/高于此灰度的像素视为欠曝/过曝
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+CLIPPED_ALLOWANCE = 0.1
+# 人脸框面积占头像面积的理想比例（扩展比例1.8时约为 1/1.8²）
+FACE_AREA_REF = 0.3
+
+WEIGHTS = {
+    "sharpness": 0.3,
+    "exposure": 0.2,
+    "face_size": 0.15,
+    "centered": 0.15,
+    "detection": 0.2,
+}
+
+# 单项得分低于此值时在报告中列出问题
+ISSUE_THRESHOLD = 0.5
+ISSUE_LABELS = {
+    "sharpness": "模糊",
+    "exposure": "曝光不当",
+    "face_size": "人脸过小",
+    "centered": "人脸偏离中心",
+    "detection": "检测置信度低",
+}
+
+
+def load_headshots(headshot_dir):
+    """
+    读取头像并缩小为统一尺寸的灰度图
+
+    Returns:
+        (文件名列表, 形状为 (N, SCORE_SIZE, SCORE_SIZE) 的 float32 数组)
+    """
+    names = []
+    arrays = []
+    paths = []
+    for ext in ("*.png", "*.jpg", "*.jpeg"):
+        paths.extend(glob.glob(os.path.join(headshot_dir, ext)))
+    for path in sorted(paths):
+        gray = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None or gray.size == 0:
+            print(f"⚠️  无法读取头像: {path}")
+            continue
+        names.append(os.path.basename(path))
+        arrays.append(cv2.resize(gray, (SCORE_SIZE, SCORE_SIZE), interpolation=cv2.INTER_AREA))
+    if not arrays:
+        return names, np.zeros((0, SCORE_SIZE, SCORE_SIZE), dtype=np.float32)
+    return names, np.stack(arrays).astype(np.float32)
+
+
+def image_metrics(batch):
+    """
+    批量计算清晰度和曝光
+
+    Returns:
+        dict: {"sharpness": 拉普拉斯方差, "mean": 平均亮度, "dark": 欠曝比例, "bright": 过曝比例}，
+              每项为长度 N 的数组
+    """
+    laplacian = (4 * batch[:, 1:-1, 1:-1] - batch[:, :-2, 1:-1] - batch[:, 2:, 1:-1]
+                 - batch[:, 1:-1, :-2] - batch[:, 1:-1, 2:])
+    return {
+        "sharpness": laplacian.var(axis=(1, 2)),
+        "mean": batch.mean(axis=(1, 2)),
+        "dark": (batch < DARK_LEVEL).mean(axis=(1, 2)),
+        "bright": (batch >= BRIGHT_LEVEL).mean(axis=(1, 2)),
+    }
+
+
+def face_geometry(record, output):
+    """
+    根据检测缓存还原头像中人脸的位置
+
+    Returns:
+        (人脸面积占头像比例, 人脸中心偏离头像中心的距离（相对头像边长）)，无法还原时为 None
+    """
+    face = record.get("face")
+    if not face or "width" not in record:
+        return None
+    w, h = record["width"], record["height"]
+    xmin, ymin, width, height = face["bbox"]
+    x, y, box_w, box_h = xmin * w, ymin * h, width * w, height * h
+    center_x, center_y = x + box_w / 2, y + box_h / 2
+    size = min(max(box_w, box_h) * output["scale_factor"], w, h)
+    # 与 HeadshotExtractor._crop 相同的裁剪框（图片边缘处平移回图片内）
+    x1 = min(max(0.0, center_x - size / 2), w - size)
+    y1 = min(max(0.0, center_y - size / 2), h - size)
+    x2, y2 = x1 + size, y1 + size
+    crop_w, crop_h = x2 - x1, y2 - y1
+    if crop_w <= 0 or crop_h <= 0:
+        return None
+    area_ratio = (box_w * box_h) / (crop_w * crop_h)
+    offset = np.hypot((center_x - (x1 + x2) / 2) / crop_w, (center_y - (y1 + y2) / 2) / crop_h)
+    return area_ratio, float(offset)
+
+
+def load_face_info(headshot_dir, source_dir):
+    """
+    从头像清单和源目录的检测缓存中取出每张头像的人脸信息
+
+    Returns:
+        dict: {头像文件名: {"detection": 置信度, "geometry": face_geometry() 的结果}}
+    """
+    manifest = load_face_cache(os.path.join(headshot_dir, MANIFEST_FILENAME)).get("files", {})
+    cache = load_face_cache(os.path.join(source_dir, FACE_CACHE_FILENAME))
+    info = {}
+    for name, entry in manifest.items():
+        item = {"detection": entry.get("score"), "geometry": None}
+        record = cache.get(entry.get("source"), {})
+        for output_path, output in record.get("outputs", {}).items():
+            if os.path.basename(output_path) == name:
+                item["geometry"] = face_geometry(record, output)
+        info[name] = item
+    return info
+
+
+def score_headshots(headshot_dir, source_dir="."):
+    """
+    为所有头像评分
+
+    Returns:
+        list: [{"file", "score", "issues", 各单项得分, 原始指标}]，按综合得分从低到高
+    """
+    names, batch = load_headshots(headshot_dir)
+    if not names:
+        return []
+    metrics = image_metrics(batch)
+    face_info = load_face_info(headshot_dir, source_dir)
+
+    # 各单项得分都在 0~1 之间，越高越好
+    scores = {
+        "sharpness": np.clip(metrics["sharpness"] / SHARPNESS_REF, 0, 1),
+        # 白墙背景常有少量过曝像素，超过 CLIPPED_ALLOWANCE 的部分才扣分
+        "exposure": np.clip(1 - np.abs(metrics["mean"] - 128) / 128
+                            - 2 * np.clip(metrics["dark"] + metrics["bright"] - CLIPPED_ALLOWANCE,
+                                          0, None), 0, 1),
+    }
+    detection = np.full(len(names), np.nan)
+    face_size = np.full(len(names), np.nan)
+    centered = np.full(len(names), np.nan)
+    for i, name in enumerate(names):
+        item = face_info.get(name)
+        if item is None:
+            continue
+        if item["detection"] is not None:
+            detection[i] = item["detection"]
+        if item["geometry"] is not None:
+            area_ratio, offset = item["geometry"]
+            face_size[i] = min(1.0, area_ratio / FACE_AREA_REF)
+            centered[i] = max(0.0, 1 - offset / 0.25)
+    scores["face_size"] = face_size
+    scores["centered"] = centered
+    scores["detection"] = detection
+
+    # 加权平均，没有人脸信息的项不参与
+    values = np.stack([scores[key] for key in WEIGHTS])
+    weights = np.array(list(WEIGHTS.values()))[:, None] * ~np.isnan(values)
+    overall = np.nansum(values * weights, axis=0) / weights.sum(axis=0)
+
+    results = []
+    for i, name in enumerate(names):
+        item = {"file": name, "score": float(overall[i])}
+        for key in WEIGHTS:
+            value = scores[key][i]
+            item[key] = None if np.isnan(value) else float(value)
+        item["issues"] = [ISSUE_LABELS[key] for key in WEIGHTS
+                          if item[key] is not None and item[key] < ISSUE_THRESHOLD]
+        item["laplacian"] = float(metrics["sharpness"][i])
+        item["brightness"] = float(metrics["mean"][i])
+        results.append(item)
+    results.sort(key=lambda item: item["score"])
+    return results
+
+
+def write_report(results, report_path):
+    """写出评分报告（CSV，Excel 可直接打开）"""
+    columns = ["file", "score", "issues"] + list(WEIGHTS) + ["laplacian", "brightness"]
+    headers = ["头像", "综合得分", "问题", "清晰度", "曝光", "人脸大小", "居中", "检测置信度",
+               "拉普拉斯方差", "平均亮度"]
+    with open(report_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for item in results:
+            row = []
+            for column in columns:
+                value = item[column]
+                if column == "issues":
+                    value = "，".join(value)
+                elif isinstance(value, float):
+                    value = round(value, 3)
+                row.append("" if value is None else value)
+            writer.writerow(row)
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="头像质量评分工具")
+    parser.add_argument("-i", "--input", default=".",
+                        help="原始照片目录，用于读取人脸检测缓存（默认: 当前目录）")
+    parser.add_argument("-o", "--output", default="cuted",
+                        help="头像目录（默认: cuted）")
+    parser.add_argument("--worst", type=float, default=5.0,
+                        help="在屏幕上列出得分最低的百分之几（默认: 5）")
+    args = parser.parse_args()
+
+    results = score_headshots(args.output, args.input)
+    if not results:
+        print(f"⚠️  {args.output} 中没有头像")
+        return
+
+    report_path = os.path.join(args.output, REPORT_FILENAME)
+    write_report(results, report_path)
+    print(f"📊 已为 {len(results)} 张头像评分，报告: {report_path}")
+
+    count = max(1, int(round(len(results) * args.worst / 100)))
+    print(f"\n得分最低的 {count} 张（请优先检查）:")
+    for item in results[:count]:
+        issues = "，".join(item["issues"]) or "无明显问题"
+        print(f"  {item['file']}: {item['score']:.2f}（{issues}）")
+
+
+if __name__ == "__main__":
+    main()
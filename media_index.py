@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍摄文件索引
+用 SQLite 持久保存目录中所有照片/视频的大小、修改时间、考号、姓名和类型，
+每次只用 os.scandir 扫描一遍目录，与上次的状态比较后增量更新。
+"""
+
+import os
+import re
+import sqlite3
+import time
+
+INDEX_FILENAME = ".media_index.sqlite"
+
+# 扩展名 -> 类型
+MEDIA_KINDS = {
+    ".png": "photo",
+    ".jpg": "photo",
+    ".jpeg": "photo",
+    ".mp4": "video",
+}
+
+# 文件名模式：考号_姓名
+FILENAME_PATTERN = re.compile(r'^(\d+)_(.+)$')
+
+
+def parse_media_filename(filename):
+    """
+    解析拍摄文件名
+
+    Returns:
+        (考号, 姓名, 类型)，不是照片/视频时返回 None；文件名不符合 考号_姓名 时考号和姓名为 None
+    """
+    stem, ext = os.path.splitext(filename)
+    kind = MEDIA_KINDS.get(ext.lower())
+    if kind is None:
+        return None
+    match = FILENAME_PATTERN.match(stem)
+    if match:
+        exam_id, name = match.groups()
+        return exam_id, name, kind
+    return None, None, kind
+
+
+class MediaIndex:
+    """拍摄文件索引"""
+
+    def __init__(self, directory, db_path=None):
+        """
+        初始化索引
+
+        Args:
+            directory: 拍摄文件所在目录
+            db_path: 索引数据库路径，默认为目录下的 .media_index.sqlite
+        """
+        self.directory = directory
+        self.db_path = db_path or os.path.join(directory, INDEX_FILENAME)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                filename TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                exam_id TEXT,
+                name TEXT,
+                kind TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS media_student ON media (exam_id, name)")
+        # 文件完整性检查结果，按 大小+修改时间 缓存
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS media_check (
+                filename TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                ok INTEGER NOT NULL,
+                issues TEXT NOT NULL,
+                details TEXT NOT NULL
+            )
+        """)
+        # 照片的感知哈希（dHash），按 大小+修改时间 缓存
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS media_hash (
+                filename TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                dhash INTEGER NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def refresh(self):
+        """
+        扫描目录并增量更新索引
+
+        Returns:
+            dict: {"added", "updated", "removed", "total", "seconds"}
+        """
+        start = time.perf_counter()
+        known = {filename: (size, mtime_ns) for filename, size, mtime_ns
+                 in self.conn.execute("SELECT filename, size, mtime_ns FROM media")}
+
+        upserts = []
+        added = 0
+        seen = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                parsed = parse_media_filename(entry.name)
+                if parsed is None or not entry.is_file():
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                state = (st.st_size, st.st_mtime_ns)
+                previous = known.get(entry.name)
+                if previous == state:
+                    continue
+                if previous is None:
+                    added += 1
+                exam_id, name, kind = parsed
+                upserts.append((entry.name, st.st_size, st.st_mtime_ns, exam_id, name, kind))
+
+        removed = [(filename,) for filename in known if filename not in seen]
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO media (filename, size, mtime_ns, exam_id, name, kind) "
+                "VALUES (?, ?, ?, ?, ?, ?)", upserts)
+            self.conn.executemany("DELETE FROM media WHERE filename = ?", removed)
+
+        return {
+            "added": added,
+            "updated": len(upserts) - added,
+            "removed": len(removed),
+            "total": len(seen),
+            "seconds": time.perf_counter() - start,
+        }
+
+    def student_keys(self, kind):
+        """返回有指定类型文件的 {(考号, 姓名)}"""
+        return {(exam_id, name) for exam_id, name in self.conn.execute(
+            "SELECT DISTINCT exam_id, name FROM media WHERE kind = ? AND exam_id IS NOT NULL",
+            (kind,))}
+
+    def media_status(self):
+        """
+        返回每个学生的拍摄情况
+
+        Returns:
+            dict: {(考号, 姓名): "photo" | "video" | "both"}
+        """
+        status = {}
+        for key in self.student_keys("photo"):
+            status[key] = "photo"
+        for key in self.student_keys("video"):
+            status[key] = "both" if key in status else "video"
+        return status
+
+    def files(self, kind=None):
+        """返回索引中的文件 [(文件名, 大小, 修改时间ns, 考号, 姓名, 类型)]"""
+        if kind is None:
+            return list(self.conn.execute(
+                "SELECT filename, size, mtime_ns, exam_id, name, kind FROM media ORDER BY filename"))
+        return list(self.conn.execute(
+            "SELECT filename, size, mtime_ns, exam_id, name, kind FROM media "
+            "WHERE kind = ? ORDER BY filename", (kind,)))
+
+    def cached_checks(self):
+        """
+        返回仍然有效的检查结果（文件大小和修改时间与索引一致）
+
+        Returns:
+            dict: {文件名: (ok, issues, details)}，issues 为逗号分隔的问题代码，details 为JSON字符串
+        """
+        return {filename: (bool(ok), issues, details) for filename, ok, issues, details
+                in self.conn.execute(
+                    "SELECT c.filename, c.ok, c.issues, c.details FROM media_check c "
+                    "JOIN media m ON m.filename = c.filename "
+                    "AND m.size = c.size AND m.mtime_ns = c.mtime_ns")}
+
+    def save_checks(self, rows):
+        """保存检查结果 [(文件名, 大小, 修改时间ns, ok, issues, details)]"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO media_check (filename, size, mtime_ns, ok, issues, details) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(f, size, mtime_ns, int(ok), issues, details)
+                 for f, size, mtime_ns, ok, issues, details in rows])
+            self.conn.execute(
+                "DELETE FROM media_check WHERE filename NOT IN (SELECT filename FROM media)")
+
+    def cached_hashes(self):
+        """
+        返回仍然有效的感知哈希（文件大小和修改时间与索引一致）
+
+        Returns:
+            dict: {文件名: 64位无符号整数}
+        """
+        # SQLite 的整数是有符号64位，读出时转回无符号
+        return {filename: dhash & 0xFFFFFFFFFFFFFFFF for filename, dhash
+                in self.conn.execute(
+                    "SELECT h.filename, h.dhash FROM media_hash h "
+                    "JOIN media m ON m.filename = h.filename "
+                    "AND m.size = h.size AND m.mtime_ns = h.mtime_ns")}
+
+    def save_hashes(self, rows):
+        """保存感知哈希 [(文件名, 大小, 修改时间ns, 64位无符号整数)]"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO media_hash (filename, size, mtime_ns, dhash) "
+                "VALUES (?, ?, ?, ?)",
+                [(f, size, mtime_ns, value - (1 << 64) if value >= (1 << 63) else value)
+                 for f, size, mtime_ns, value in rows])
+            self.conn.execute(
+                "DELETE FROM media_hash WHERE filename NOT IN (SELECT filename FROM media)")
+
@@ -6,10 +6,17 @@
 """
 
 import os
-import glob
+import json
 import openpyxl
 import re
-from pathlib import Path
+import time
+import uuid
+
+from fuzzy_match import FuzzyResolver, describe_proposals
+from student_index import load_student_index, describe_candidates
+
+# 重命名日志，用于撤销上一次重命名
+JOURNAL_FILENAME = ".rename_journal.json"
 
 def load_all_students_from_excel(excel_path):
     """从Excel文件的所有sheet中加载学生信息"""
@@ -46,27 +53,265 @@ def extract_name_from_filename(filename):
     # 如果没有匹配到，可能文件名就是姓名
     return name_part
 
-def find_files_to_rename(directory, extensions):
-    """查找需要重命名的文件"""
+def scan_media_files(directory, extensions):
+    """用 os.scandir 扫描一次目录，返回所有指定扩展名的文件"""
+    extensions = {ext.lower() for ext in extensions}
     files_info = []
-    
-    for ext in extensions:
-        pattern = os.path.join(directory, f"*.{ext}")
-        files = glob.glob(pattern)
-        
-        for file_path in files:
-            filename = os.path.basename(file_path)
-            name = extract_name_from_filename(filename)
-            
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            ext = os.path.splitext(entry.name)[1][1:]
+            if ext.lower() not in extensions or not entry.is_file():
+                continue
             files_info.append({
-                'path': file_path,
-                'filename': filename,
-                'name': name,
+                'path': entry.path,
+                'filename': entry.name,
+                'name': extract_name_from_filename(entry.name),
+                'exam_id': extract_exam_id_from_filename(entry.name),
                 'extension': ext
             })
-    
+    files_info.sort(key=lambda info: info['filename'])
     return files_info
 
+def extract_exam_id_from_filename(filename):
+    """从文件名中提取考号（文件名不是 考号_姓名 时返回 None）"""
+    match = re.match(r'^(\d+)_', os.path.splitext(filename)[0])
+    return match.group(1) if match else None
+
+def plan_renames(files_info, student_index):
+    """
+    计算完整的重命名计划
+
+    文件按姓名优先解析到名单中的学生（重名时用文件名中的考号区分），
+    无法确定是哪位学生时报告为冲突，不做猜测。
+    同时检测冲突：多个文件要改成同一个名字、目标文件已存在且不会被移走。
+    互换考号形成的环（A->B, B->A）不算冲突，执行时通过临时文件名两阶段完成。
+
+    Returns:
+        dict: renames [(旧文件名, 新文件名)]、already_correct [文件名]、
+              not_found [(文件名, 姓名)]、conflicts [(旧文件名, 新文件名, 原因)]、
+              by_exam_id [(旧文件名, 新文件名)] 仅凭考号匹配（姓名有出入）的文件、cycles 环的数量
+    """
+    existing = {info['filename'] for info in files_info}
+    candidates = {}
+    already_correct = []
+    not_found = []
+    conflicts = []
+    by_exam_id = []
+
+    for file_info in files_info:
+        old_filename = file_info['filename']
+        match = student_index.resolve(file_info.get('exam_id'), file_info['name'], prefer="name")
+        if match.status == "none":
+            not_found.append((old_filename, file_info['name']))
+            continue
+        if match.status == "ambiguous":
+            conflicts.append((old_filename, "?",
+                              f"重名无法确定是哪位学生（{describe_candidates(match.candidates)}）"))
+            continue
+        student = match.student
+        new_filename = f"{student.exam_id}_{student.name}.{file_info['extension']}"
+        if match.status == "exam_id":
+            by_exam_id.append((old_filename, new_filename))
+        if new_filename == old_filename:
+            already_correct.append(old_filename)
+        else:
+            candidates[old_filename] = new_filename
+
+    # 多个文件指向同一目标
+    targets = {}
+    for old_filename, new_filename in candidates.items():
+        targets.setdefault(new_filename, []).append(old_filename)
+
+    renames = {}
+    for old_filename, new_filename in candidates.items():
+        if len(targets[new_filename]) > 1:
+            conflicts.append((old_filename, new_filename, "多个文件指向同一目标"))
+        else:
+            renames[old_filename] = new_filename
+
+    # 目标文件已存在且不会被移走（不在重命名计划中）；被移除的计划可能让其他目标变为冲突，反复检查
+    changed = True
+    while changed:
+        changed = False
+        for old_filename, new_filename in list(renames.items()):
+            if new_filename in existing and new_filename not in renames:
+                del renames[old_filename]
+                conflicts.append((old_filename, new_filename, "目标文件已存在"))
+                changed = True
+
+    # 统计环（每个文件只有一个目标，沿着目标链走回起点即为环）
+    cycles = 0
+    visited = set()
+    for start in renames:
+        if start in visited:
+            continue
+        path = []
+        node = start
+        while node in renames and node not in visited:
+            visited.add(node)
+            path.append(node)
+            node = renames[node]
+        if node in path:
+            cycles += 1
+
+    return {
+        'renames': sorted(renames.items()),
+        'already_correct': already_correct,
+        'not_found': not_found,
+        'conflicts': conflicts,
+        'by_exam_id': by_exam_id,
+        'cycles': cycles,
+    }
+
+class StalePlanError(Exception):
+    """预览之后目录发生了变化，重命名计划已不能安全执行"""
+
+    def __init__(self, problems):
+        super().__init__("；".join(problems))
+        self.problems = problems
+
+def check_plan_current(plan, directory):
+    """
+    执行前重新检查计划：源文件都还在，目标文件没有在计划之外出现
+
+    Returns:
+        list: 问题描述，为空表示可以执行
+    """
+    sources = {old for old, _ in plan['renames']}
+    problems = []
+    for old_filename, new_filename in plan['renames']:
+        if not os.path.exists(os.path.join(directory, old_filename)):
+            problems.append(f"源文件已不存在: {old_filename}")
+        if new_filename not in sources and os.path.lexists(os.path.join(directory, new_filename)):
+            problems.append(f"目标文件已存在: {new_filename}")
+    return problems
+
+def _write_journal(journal_path, journal):
+    tmp_path = journal_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(journal, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, journal_path)
+
+def execute_plan(plan, directory, journal_path=None):
+    """
+    两阶段执行重命名计划
+
+    第一阶段把所有源文件改为临时文件名，第二阶段再改为目标文件名，
+    因此互换、循环的重命名也能一次完成。执行前写入日志，可用 rollback_renames 撤销；
+    执行中出错时自动按日志恢复原名，再抛出原来的错误。
+
+    Returns:
+        int: 成功重命名的文件数
+
+    Raises:
+        StalePlanError: 预览之后源文件消失或目标文件出现，没有做任何改动
+    """
+    problems = check_plan_current(plan, directory)
+    if problems:
+        raise StalePlanError(problems)
+
+    journal_path = journal_path or os.path.join(directory, JOURNAL_FILENAME)
+    token = uuid.uuid4().hex[:8]
+    entries = [
+        {'old': old, 'temp': f".{old}.renaming-{token}", 'new': new}
+        for old, new in plan['renames']
+    ]
+    journal = {'created_at': time.strftime("%Y-%m-%d %H:%M:%S"), 'state': 'started',
+               'entries': entries}
+    _write_journal(journal_path, journal)
+
+    try:
+        for entry in entries:
+            os.rename(os.path.join(directory, entry['old']), os.path.join(directory, entry['temp']))
+        journal['state'] = 'staged'
+        _write_journal(journal_path, journal)
+
+        for entry in entries:
+            new_path = os.path.join(directory, entry['new'])
+            # POSIX 下 os.rename 会直接覆盖已存在的文件
+            if os.path.lexists(new_path):
+                raise FileExistsError(f"目标文件已存在: {entry['new']}")
+            os.rename(os.path.join(directory, entry['temp']), new_path)
+        journal['state'] = 'done'
+        _write_journal(journal_path, journal)
+    except Exception:
+        print("❌ 重命名过程中出错，正在按日志恢复原名...")
+        rollback_renames(directory, journal_path)
+        raise
+
+    return len(entries)
+
+def rollback_renames(directory, journal_path=None):
+    """
+    根据日志撤销上一次重命名（也能恢复执行到一半中断的情况）
+
+    Returns:
+        int: 恢复的文件数
+    """
+    journal_path = journal_path or os.path.join(directory, JOURNAL_FILENAME)
+    if not os.path.exists(journal_path):
+        print(f"❌ 没有找到重命名日志: {journal_path}")
+        return 0
+    with open(journal_path, encoding='utf-8') as f:
+        journal = json.load(f)
+
+    entries = journal['entries']
+    if journal['state'] == 'rolled_back':
+        print("上一次重命名已经撤销过了")
+        return 0
+
+    # 第二阶段已开始：先把已改为新名字的文件移回临时名
+    # （第一阶段中断时新名字可能仍是其他尚未移动的源文件，不能动）
+    if journal['state'] != 'started':
+        for entry in entries:
+            new_path = os.path.join(directory, entry['new'])
+            temp_path = os.path.join(directory, entry['temp'])
+            if not os.path.exists(temp_path) and os.path.exists(new_path):
+                os.rename(new_path, temp_path)
+
+    # 再把临时名改回原名
+    restored = 0
+    for entry in entries:
+        temp_path = os.path.join(directory, entry['temp'])
+        if os.path.exists(temp_path):
+            os.rename(temp_path, os.path.join(directory, entry['old']))
+            restored += 1
+
+    journal['state'] = 'rolled_back'
+    _write_journal(journal_path, journal)
+    print(f"✅ 已恢复 {restored} 个文件的原名")
+    return restored
+
+def print_plan(plan):
+    """显示重命名计划"""
+    for old_filename, new_filename in plan['renames']:
+        print(f"🔄 重命名: {old_filename} -> {new_filename}")
+    for old_filename, new_filename in plan['by_exam_id']:
+        print(f"💡 姓名与名单不一致，按考号匹配: {old_filename} -> {new_filename}")
+    for old_filename, new_filename, reason in plan['conflicts']:
+        print(f"⚠️  {reason}，跳过: {old_filename} -> {new_filename}")
+    suggestions = plan.get('suggestions', {})
+    for old_filename, student_name in plan['not_found']:
+        print(f"❌ 在Excel中未找到学生: {student_name} (文件: {old_filename})")
+        if suggestions.get(old_filename):
+            print(f"   可能是: {describe_proposals(suggestions[old_filename])}")
+
+    print("\n" + "="*60)
+    print("处理结果统计:")
+    print(f"  文件名已正确: {len(plan['already_correct'])}")
+    print(f"  计划重命名: {len(plan['renames'])}（其中循环/互换 {plan['cycles']} 组）")
+    print(f"  冲突跳过: {len(plan['conflicts'])}")
+    print(f"  学生未找到: {len(plan['not_found'])}")
+
+def print_stale_plan(error):
+    """显示计划过期的原因"""
+    print("\n❌ 预览之后目录发生了变化，已中止，没有重命名任何文件:")
+    for problem in error.problems:
+        print(f"   - {problem}")
+    print("   请重新运行以生成新的计划")
+
 def rename_files(directory, excel_path, dry_run=True):
     """重命名文件的主函数"""
     print("="*60)
@@ -74,82 +319,61 @@ def rename_files(directory, excel_path, dry_run=True):
     print("="*60)
     
     # 加载学生信息
-    students_dict = load_all_students_from_excel(excel_path)
-    if not students_dict:
+    student_index = load_student_index(excel_path)
+    if not len(student_index):
         print("❌ 没有从Excel文件中读取到学生信息")
-        return
+        return None
     
-    # 查找需要重命名的文件
+    # 扫描一次目录并计算重命名计划
     print(f"\n正在扫描目录: {directory}")
-    files_to_process = find_files_to_rename(directory, ['png', 'mp4'])
+    files_to_process = scan_media_files(directory, ['png', 'mp4'])
     
     if not files_to_process:
         print("❌ 没有找到需要处理的PNG或MP4文件")
-        return
+        return None
     
     print(f"找到 {len(files_to_process)} 个文件需要处理")
-    
-    # 处理文件重命名
-    renamed_count = 0
-    not_found_count = 0
-    already_correct_count = 0
+    plan = plan_renames(files_to_process, student_index)
+    if plan['not_found']:
+        # 只为找不到的文件建立模糊匹配索引并推荐候选，不会自动改名
+        resolver = FuzzyResolver(student_index)
+        plan['suggestions'] = {old_filename: resolver.propose_for_file(old_filename)
+                               for old_filename, _ in plan['not_found']}
     
     print(f"\n{'模式' if dry_run else '执行模式'}: {'预览重命名操作' if dry_run else '实际执行重命名'}")
     print("-" * 60)
+    print_plan(plan)
     
-    for file_info in files_to_process:
-        old_path = file_info['path']
-        old_filename = file_info['filename']
-        student_name = file_info['name']
-        extension = file_info['extension']
-        
-        # 在学生字典中查找对应的考号
-        if student_name in students_dict:
-            new_exam_id = students_dict[student_name]
-            new_filename = f"{new_exam_id}_{student_name}.{extension}"
-            new_path = os.path.join(directory, new_filename)
-            
-            # 检查是否需要重命名
-            if old_filename == new_filename:
-                print(f"✅ 文件名已正确: {old_filename}")
-                already_correct_count += 1
-            else:
-                print(f"🔄 重命名: {old_filename} -> {new_filename}")
-                
-                if not dry_run:
-                    try:
-                        # 检查目标文件是否已存在
-                        if os.path.exists(new_path):
-                            print(f"⚠️  目标文件已存在，跳过: {new_filename}")
-                            continue
-                        
-                        os.rename(old_path, new_path)
-                        print(f"✅ 重命名成功")
-                        renamed_count += 1
-                    except Exception as e:
-                        print(f"❌ 重命名失败: {e}")
-                else:
-                    renamed_count += 1
-        else:
-            print(f"❌ 在Excel中未找到学生: {student_name} (文件: {old_filename})")
-            not_found_count += 1
-    
-    # 输出统计信息
-    print("\n" + "="*60)
-    print("处理结果统计:")
-    print(f"  文件名已正确: {already_correct_count}")
-    print(f"  {'预计重命名' if dry_run else '实际重命名'}: {renamed_count}")
-    print(f"  学生未找到: {not_found_count}")
-    print(f"  总计处理: {len(files_to_process)}")
-    
-    if dry_run and renamed_count > 0:
+    if not dry_run and plan['renames']:
+        try:
+            renamed_count = execute_plan(plan, directory)
+        except StalePlanError as e:
+            print_stale_plan(e)
+            return plan
+        print(f"\n✅ 实际重命名: {renamed_count}")
+    elif dry_run and plan['renames']:
         print(f"\n💡 这是预览模式。如需实际执行重命名，请将 dry_run 参数设置为 False")
+    
+    return plan
 
 def main():
     """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="学生文件重命名工具")
+    parser.add_argument("--rollback", action="store_true",
+                        help="根据日志撤销上一次重命名")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="不询问，直接执行")
+    args = parser.parse_args()
+
     # 设置路径
     current_dir = os.getcwd()
     excel_path = os.path.join(current_dir, "mt2025.xlsx")
+
+    if args.rollback:
+        rollback_renames(current_dir)
+        return
     
     # 检查Excel文件是否存在
     if not os.path.exists(excel_path):
@@ -159,23 +383,33 @@ def main():
     print(f"工作目录: {current_dir}")
     print(f"Excel文件: {excel_path}")
     
-    # 首先进行预览
+    # 预览：只扫描和计算一次，确认后直接执行同一份计划
     print("\n" + "="*60)
     print("第一步: 预览重命名操作")
     print("="*60)
-    rename_files(current_dir, excel_path, dry_run=True)
+    plan = rename_files(current_dir, excel_path, dry_run=True)
+    if not plan or not plan['renames']:
+        return
     
     # 询问用户是否继续
     print("\n" + "="*60)
-    response = input("是否继续执行实际重命名操作? (y/N): ").strip().lower()
+    if args.yes:
+        response = 'y'
+    else:
+        response = input("是否继续执行实际重命名操作? (y/N): ").strip().lower()
     
     if response in ['y', 'yes', '是']:
         print("\n第二步: 执行实际重命名")
         print("="*60)
-        rename_files(current_dir, excel_path, dry_run=False)
-        print("\n✅ 重命名操作完成!")
+        try:
+            renamed_count = execute_plan(plan, current_dir)
+        except StalePlanError as e:
+            print_stale_plan(e)
+            return
+        print(f"\n✅ 重命名操作完成! 共 {renamed_count} 个文件")
+        print(f"   如需撤销，请运行: python rename_files.py --rollback")
     else:
         print("\n❌ 操作已取消")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
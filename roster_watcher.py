@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+名册文件监视工具
+监视 2025.xlsx / mt2025.xlsx 的变化，保存完成后触发回调
+
+优先使用 watchdog（Linux 下基于 inotify），未安装时退化为轮询文件状态。
+"""
+
+import os
+import threading
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # 未安装 watchdog 时使用轮询
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def file_signature(path):
+    """文件状态签名 (修改时间, 大小)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """把目录事件转发给 RosterWatcher（Excel 保存时常用 临时文件+改名）"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path:
+                self.watcher.notify(os.path.abspath(path))
+
+
+class RosterWatcher:
+    """名册文件监视器"""
+
+    def __init__(self, paths, callback, debounce=1.0, poll_interval=1.0):
+        """
+        初始化监视器
+
+        Args:
+            paths: 需要监视的文件路径列表
+            callback: 文件变化并稳定后调用 callback(path)，path 为传入时的路径
+            debounce: 防抖时间（秒），最后一次变化后等待这么久才触发
+            poll_interval: 轮询模式下检查文件状态的间隔（秒）
+        """
+        self.paths = {os.path.abspath(p): p for p in paths}
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._signatures = {p: file_signature(p) for p in self.paths}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._observer = None
+        self._poll_thread = None
+
+    @property
+    def mode(self):
+        return "inotify" if self._observer is not None else "polling"
+
+    def start(self):
+        """开始监视"""
+        if Observer is not None:
+            self._observer = Observer()
+            handler = _ChangeHandler(self)
+            for directory in {os.path.dirname(p) for p in self.paths}:
+                self._observer.schedule(handler, directory, recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._poll_thread.start()
+        print(f"👀 正在监视名册文件（{self.mode}）: {list(self.paths.values())}")
+        return self
+
+    def stop(self):
+        """停止监视"""
+        self._stop_event.set()
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+            self._observer = None
+
+    def notify(self, abs_path):
+        """记录一次变化，重置该文件的防抖计时器"""
+        if abs_path not in self.paths or self._stop_event.is_set():
+            return
+        with self._lock:
+            timer = self._timers.get(abs_path)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._fire, args=(abs_path,))
+            timer.daemon = True
+            self._timers[abs_path] = timer
+            timer.start()
+
+    def _fire(self, abs_path):
+        signature = file_signature(abs_path)
+        with self._lock:
+            self._timers.pop(abs_path, None)
+            # 文件被删除（保存过程中）或内容状态未变时不触发
+            if signature is None or signature == self._signatures.get(abs_path):
+                return
+            self._signatures[abs_path] = signature
+        try:
+            self.callback(self.paths[abs_path])
+        except Exception as e:
+            print(f"❌ 处理文件变化时出错 {abs_path}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def _poll_loop(self):
+        with self._lock:
+            last_seen = dict(self._signatures)
+        while not self._stop_event.wait(self.poll_interval):
+            for abs_path in self.paths:
+                signature = file_signature(abs_path)
+                if signature != last_seen.get(abs_path):
+                    last_seen[abs_path] = signature
+                    self.notify(abs_path)
+
+
+def watch_forever(watcher):
+    """阻塞运行监视器，直到 Ctrl+C"""
+    watcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n停止监视")
+    finally:
+        watcher.stop()
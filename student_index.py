@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生身份索引
+按考号、姓名、班级、规范化姓名建立多键索引，把文件名解析到名单中的学生。
+重名或多个候选时报告“无法确定”，不会随意猜测。
+rename_files.py 和 check_missing_photos.py 共用这个索引。
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+
+import openpyxl
+
+Student = namedtuple("Student", ["exam_id", "name", "class_name"])
+
+# 解析结果
+#   student: 匹配到的学生，无法确定或未找到时为 None
+#   status: exact 考号姓名都一致 / exam_id 仅考号一致（姓名不属于任何学生）/ name 仅姓名一致 /
+#           normalized_name 规范化后姓名一致 / ambiguous 多个候选 / none 未找到
+#   candidates: ambiguous 时的候选学生列表
+Match = namedtuple("Match", ["student", "status", "candidates"])
+
+# 规范化时去掉的字符：各种空白、间隔号、连字符
+_NAME_NOISE = re.compile(r"[\s　·•．.\-_]+")
+
+
+def normalize_name(name):
+    """规范化姓名：全角转半角、去掉空白和间隔号、英文转小写"""
+    name = unicodedata.normalize("NFKC", str(name))
+    return _NAME_NOISE.sub("", name).lower()
+
+
+class StudentIndex:
+    """学生身份索引"""
+
+    def __init__(self, students):
+        """
+        建立索引
+
+        Args:
+            students: [(考号, 姓名, 班级), ...]
+        """
+        self.students = []
+        self.by_exam_id = {}
+        self.by_name = {}
+        self.by_normalized_name = {}
+        self.by_class = {}
+        for exam_id, name, class_name in students:
+            student = Student(str(exam_id).strip(), str(name).strip(), class_name)
+            self.students.append(student)
+            self.by_exam_id.setdefault(student.exam_id, []).append(student)
+            self.by_name.setdefault(student.name, []).append(student)
+            self.by_normalized_name.setdefault(normalize_name(student.name), []).append(student)
+            self.by_class.setdefault(class_name, []).append(student)
+
+    def __len__(self):
+        return len(self.students)
+
+    def duplicate_names(self):
+        """返回名单中重名的学生 {姓名: [学生, ...]}"""
+        return {name: students for name, students in self.by_name.items() if len(students) > 1}
+
+    def _resolve_by_name(self, name, exam_id):
+        for status, candidates in (("name", self.by_name.get(name, [])),
+                                   ("normalized_name",
+                                    self.by_normalized_name.get(normalize_name(name), []))):
+            if len(candidates) == 1:
+                student = candidates[0]
+                return Match(student, "exact" if student.exam_id == exam_id else status, [])
+            if len(candidates) > 1:
+                # 重名时用考号区分
+                same_id = [s for s in candidates if s.exam_id == exam_id]
+                if len(same_id) == 1:
+                    return Match(same_id[0], "exact", [])
+                return Match(None, "ambiguous", candidates)
+        return None
+
+    def _resolve_by_exam_id(self, exam_id, name):
+        candidates = self.by_exam_id.get(exam_id, [])
+        if len(candidates) == 1:
+            student = candidates[0]
+            if name is None or student.name == name:
+                return Match(student, "exact", [])
+            if normalize_name(student.name) == normalize_name(name):
+                return Match(student, "normalized_name", [])
+            # 姓名属于名单中的其他学生时，考号和姓名互相矛盾，不能确定是谁
+            others = self.by_name.get(name) or self.by_normalized_name.get(normalize_name(name), [])
+            if others:
+                return Match(None, "ambiguous", [student] + others)
+            # 姓名不属于任何学生（多半是错字），按考号匹配
+            return Match(student, "exam_id", [])
+        if len(candidates) > 1:
+            same_name = [s for s in candidates if name is not None and s.name == name]
+            if len(same_name) == 1:
+                return Match(same_name[0], "exact", [])
+            return Match(None, "ambiguous", candidates)
+        return None
+
+    def resolve(self, exam_id=None, name=None, prefer="exam_id"):
+        """
+        把 (考号, 姓名) 解析到名单中的学生，O(1)
+
+        Args:
+            exam_id: 文件名中的考号，可为 None
+            name: 文件名中的姓名，可为 None
+            prefer: "exam_id" 考号优先（核对拍照情况，姓名有错字也能匹配）；
+                    "name" 姓名优先（重命名时考号可能已经变更）
+
+        Returns:
+            Match
+        """
+        exam_id = str(exam_id).strip() if exam_id is not None else None
+        name = str(name).strip() if name is not None else None
+
+        steps = []
+        if prefer == "name":
+            if name:
+                steps.append(lambda: self._resolve_by_name(name, exam_id))
+            if exam_id:
+                steps.append(lambda: self._resolve_by_exam_id(exam_id, name))
+        else:
+            if exam_id:
+                steps.append(lambda: self._resolve_by_exam_id(exam_id, name))
+            if name:
+                steps.append(lambda: self._resolve_by_name(name, exam_id))
+
+        for step in steps:
+            match = step()
+            if match is not None:
+                return match
+        return Match(None, "none", [])
+
+
+def load_student_index(excel_path):
+    """从Excel文件的所有sheet中加载学生信息并建立索引"""
+    print(f"正在读取Excel文件: {excel_path}")
+    workbook = openpyxl.load_workbook(excel_path, read_only=True)
+    students = []
+    try:
+        for sheet_name in workbook.sheetnames:
+            for row in workbook[sheet_name].iter_rows(min_row=2, values_only=True):
+                if len(row) >= 2 and row[0] and row[1]:
+                    exam_id, name = str(row[0]).strip(), str(row[1]).strip()
+                    if name and exam_id:
+                        students.append((exam_id, name, sheet_name))
+    finally:
+        workbook.close()
+
+    index = StudentIndex(students)
+    print(f"总共加载了 {len(index)} 个学生信息（{len(index.by_class)} 个班级）")
+    duplicates = index.duplicate_names()
+    if duplicates:
+        print(f"⚠️  名单中有 {len(duplicates)} 组重名学生:")
+        for name, students in duplicates.items():
+            print(f"  {name}: " + "，".join(f"{s.exam_id}（{s.class_name}）" for s in students))
+    return index
+
+
+def describe_candidates(candidates):
+    """候选学生的简短描述"""
+    return "，".join(f"{s.exam_id}_{s.name}（{s.class_name}）" for s in candidates)
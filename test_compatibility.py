@@ -2,55 +2,58 @@
 # -*- coding: utf-8 -*-
 """
 测试转换后的Excel文件是否与tvds.py兼容
+
+另外提供名册规模测试：生成合成名册（10~200个班级，最多10万名学生，
+中文姓名，数字/文本考号），检查仓库中所有名册读取函数的结果是否一致，
+并记录每个读取函数的耗时和内存峰值，超出预算时判为失败。
 """
 
+import contextlib
+import importlib
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
 import openpyxl
 
+# 性能预算：每1万名学生允许的读取秒数，以及读取过程的内存峰值（MB）
+DEFAULT_SECONDS_PER_10K = 10.0
+DEFAULT_PEAK_MB = 512.0
+
+# 默认测试规模：(班级数, 学生数)
+DEFAULT_SCALES = [(10, 1000), (50, 10000), (200, 100000)]
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘蔡蒋余杜叶程苏魏吕丁任沈姚卢欧阳司马"
+GIVEN_CHARS = "子涵宇轩浩然梓萱一诺欣怡思远俊杰雨桐若曦嘉懿晨阳佳琪明哲诗涵奕辰烁乐炯豪妡潼殷瑞博文静怡天佑语嫣铭泽锦程"
+
+
 def test_excel_compatibility(excel_path="mt2025.xlsx"):
     """
     测试Excel文件是否与tvds.py兼容
     """
     print(f"🧪 测试文件兼容性：{excel_path}")
     print("=" * 50)
-    
+
     try:
-        # 使用与tvds.py相同的方式加载Excel文件
-        def load_students_info(excel_path, sheet_index=0):
-            print(f"Loading students info from sheet index: {sheet_index}")
-            workbook = openpyxl.load_workbook(excel_path, read_only=True)
-            sheets = workbook.sheetnames
-            if 0 <= sheet_index < len(sheets):
-                sheet = workbook[sheets[sheet_index]]
-            else:
-                print(f"Invalid sheet index: {sheet_index}. Using the first sheet.")
-                sheet = workbook.active
-            students_info = []
-            for row in sheet.iter_rows(min_row=2, values_only=True):
-                exam_id, name = row[0], row[1]
-                if exam_id and name:
-                    students_info.append((exam_id, name))
-            print(f"Loaded {len(students_info)} students")
-            workbook.close()
-            return students_info
-
-        def get_sheet_names(excel_path):
-            """获取Excel文件中所有sheet的名称"""
-            workbook = openpyxl.load_workbook(excel_path, read_only=True)
-            sheet_names = workbook.sheetnames
-            workbook.close()
-            return sheet_names
-        
-        # 获取所有sheet名称
-        sheet_names = get_sheet_names(excel_path)
+        # 与tvds.py的load_students_info逐行规则相同，但只打开一次工作簿
+        workbook = openpyxl.load_workbook(excel_path, read_only=True)
+        sheet_names = workbook.sheetnames
         print(f"📋 工作表列表：{sheet_names}")
-        
+
         # 测试每个sheet
         total_students = 0
         for i, sheet_name in enumerate(sheet_names):
             print(f"\n🔍 测试工作表 {i}: {sheet_name}")
-            students = load_students_info(excel_path, i)
+            students = []
+            for row in workbook[sheet_name].iter_rows(min_row=2, values_only=True):
+                exam_id, name = row[0], row[1]
+                if exam_id and name:
+                    students.append((exam_id, name))
+            print(f"Loaded {len(students)} students")
             total_students += len(students)
-            
+
             # 显示前几个学生的信息
             if students:
                 print(f"  示例学生数据：")
@@ -58,18 +61,320 @@ def test_excel_compatibility(excel_path="mt2025.xlsx"):
                     print(f"    {j+1}. 考号：{exam_id}，姓名：{name}")
                 if len(students) > 3:
                     print(f"    ... 还有 {len(students) - 3} 名学生")
-        
+        workbook.close()
+
         print(f"\n✅ 兼容性测试通过！")
         print(f"📊 总计：{len(sheet_names)} 个班级，{total_students} 名学生")
         print(f"🎯 该文件可以直接在tvds.py中使用！")
-        
+
         return True
-        
+
     except Exception as e:
         print(f"❌ 兼容性测试失败：{e}")
         import traceback
         traceback.print_exc()
         return False
 
+
+def random_cjk_name(rng):
+    """生成随机中文姓名（含少量复姓、2~3字名）"""
+    if rng.random() < 0.03:
+        surname = rng.choice(["欧阳", "司马"])
+    else:
+        surname = rng.choice(SURNAMES[:-4])
+    given = "".join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice((1, 2, 2))))
+    return surname + given
+
+
+def generate_synthetic_intake(path, num_classes, num_students, id_kind="mixed", seed=0):
+    """
+    生成与2025.xlsx格式相同的合成原始名册
+
+    Args:
+        path: 输出文件路径
+        num_classes: 班级数
+        num_students: 学生总数
+        id_kind: "numeric" 数字考号 / "text" 以0开头的文本考号 / "mixed" 按班级交替
+        seed: 随机种子
+
+    Returns:
+        dict: {班级名: [(考号字符串, 姓名), ...]}，即期望的读取结果
+    """
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("名册")
+    sheet.append(["合成名册", None, None, None, None, None, None])
+    sheet.append(["序号", "班级", "录取编号", "考号", "新生姓名", "性别", "备注"])
+
+    expected = {}
+    per_class = max(1, num_students // num_classes)
+    for i in range(num_students):
+        class_num = min(i // per_class, num_classes - 1) + 1
+        seat = i - (class_num - 1) * per_class + 1
+        text_id = id_kind == "text" or (id_kind == "mixed" and class_num % 2 == 0)
+        if text_id:
+            exam_id = f"0{2025:04d}{class_num:03d}{seat:05d}"
+        else:
+            exam_id = int(f"2025{class_num:03d}{seat:05d}")
+        name = random_cjk_name(rng)
+        sheet.append([i + 1, class_num, 2025000000 + i, exam_id, name,
+                      rng.choice("男女"), None])
+        expected.setdefault(f"班级{class_num}", []).append((str(exam_id), name))
+
+    workbook.save(path)
+    return expected
+
+
+def _import_optional(module_name):
+    """导入仓库中的模块，缺少依赖（如cv2、pptx）时返回None"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        print(f"⚠️  跳过 {module_name}（缺少依赖: {e}）")
+        return None
+
+
+def _normalize(students_by_class):
+    """规范化为 {班级: 按考号排序的 [(考号字符串, 姓名字符串)]}"""
+    return {
+        class_name: sorted((str(exam_id).strip(), str(name).strip())
+                           for exam_id, name in students)
+        for class_name, students in students_by_class.items()
+    }
+
+
+def collect_loaders():
+    """
+    收集仓库中所有名册读取函数
+
+    Returns:
+        list: [(名称, 读取函数, 比较方式)]，读取函数接收 (xlsx路径, 缓存路径)。
+              比较方式 "by_class" 比较全部班级，"first_sheet" 只比较第一个班级
+              （s.py/sa.py 启动时只加载当前工作表），"by_name" 比较 姓名->考号 映射
+    """
+    loaders = []
+
+    def sheet_index_loader(module):
+        def load(excel_path, cache_path):
+            result = {}
+            for index, sheet_name in enumerate(module.get_sheet_names(excel_path)):
+                result[sheet_name] = module.load_students_info(excel_path, index)
+            return result
+        return load
+
+    tvds = _import_optional("tvds")
+    if tvds:
+        loaders.append(("tvds.load_students_info", sheet_index_loader(tvds), "by_class"))
+
+    tp = _import_optional("tp")
+    if tp and tvds:
+        tp_module = type("tp_loader", (), {
+            "get_sheet_names": staticmethod(tvds.get_sheet_names),
+            "load_students_info": staticmethod(tp.load_students_info),
+        })
+        loaders.append(("tp.load_students_info", sheet_index_loader(tp_module), "by_class"))
+
+    s_module = _import_optional("s")
+    if s_module:
+        def load_s(excel_path, cache_path):
+            return {None: s_module.load_students_info(excel_path)}
+        loaders.append(("s.load_students_info", load_s, "first_sheet"))
+
+    sa = _import_optional("sa")
+    if sa:
+        def load_sa(excel_path, cache_path):
+            return {None: sa.load_students_info(excel_path)}
+        loaders.append(("sa.load_students_info", load_sa, "first_sheet"))
+
+    check_missing = _import_optional("check_missing_photos")
+    if check_missing:
+        def load_check(excel_path, cache_path):
+            result = {}
+            for exam_id, name, class_name in check_missing.load_all_students_from_excel(excel_path):
+                result.setdefault(class_name, []).append((exam_id, name))
+            return result
+        loaders.append(("check_missing_photos.load_all_students_from_excel", load_check, "by_class"))
+
+    rename = _import_optional("rename_files")
+    if rename:
+        def load_rename(excel_path, cache_path):
+            return rename.load_all_students_from_excel(excel_path)
+        loaders.append(("rename_files.load_all_students_from_excel", load_rename, "by_name"))
+
+    student_index = _import_optional("student_index")
+    if student_index:
+        def load_index(excel_path, cache_path):
+            with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+                index = student_index.load_student_index(excel_path)
+            return {class_name: [(s.exam_id, s.name) for s in students]
+                    for class_name, students in index.by_class.items()}
+        loaders.append(("student_index.load_student_index", load_index, "by_class"))
+
+    for module_name in ("create_class_ppts", "create_class_ppts_headshot"):
+        module = _import_optional(module_name)
+        if module:
+            def load_ppt(excel_path, cache_path, module=module):
+                return module.load_students_by_class(excel_path)
+            loaders.append((f"{module_name}.load_students_by_class", load_ppt, "by_class"))
+
+    convert = _import_optional("convert_excel")
+    if convert:
+        def load_converted(excel_path, cache_path):
+            return convert.load_converted_rosters(excel_path)
+        loaders.append(("convert_excel.load_converted_rosters", load_converted, "by_class"))
+
+        def load_cache(excel_path, cache_path):
+            return convert.load_roster_cache(cache_path)
+        loaders.append(("convert_excel.load_roster_cache", load_cache, "by_class"))
+
+    return loaders
+
+
+def _check_equivalence(result, expected, mode):
+    """按比较方式检查读取结果是否与期望一致"""
+    if mode == "by_name":
+        # 以姓名为键的读取函数：重名时后出现的学生覆盖前者
+        expected_by_name = {}
+        for students in expected.values():
+            for exam_id, name in students:
+                expected_by_name[name] = exam_id
+        actual = {str(name).strip(): str(exam_id).strip() for name, exam_id in result.items()}
+        return actual == expected_by_name
+    if mode == "first_sheet":
+        first_class = next(iter(expected))
+        return _normalize({first_class: result[None]}) == _normalize({first_class: expected[first_class]})
+    return _normalize(result) == _normalize(expected)
+
+
+def measure_loader(load, excel_path, cache_path):
+    """
+    测量读取函数的耗时和内存峰值
+
+    耗时与内存分两次测量，避免 tracemalloc 的开销计入耗时。
+    读取函数自身的逐行打印输出被丢弃，但打印的开销仍计入耗时。
+
+    Returns:
+        (读取结果, 耗时秒数, 内存峰值MB)
+    """
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = load(excel_path, cache_path)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            load(excel_path, cache_path)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def run_roster_scale_test(num_classes, num_students, id_kind="mixed",
+                          seconds_per_10k=DEFAULT_SECONDS_PER_10K,
+                          peak_mb=DEFAULT_PEAK_MB, loaders=None, seed=0):
+    """
+    在一个合成名册上运行全部读取函数
+
+    Returns:
+        list: [{"loader", "equivalent", "seconds", "peak_mb", "within_budget"}]
+    """
+    from convert_excel import convert_excel_format
+
+    print(f"\n🧪 合成名册: {num_classes} 个班级，{num_students} 名学生，考号类型 {id_kind}")
+    time_budget = seconds_per_10k * max(num_students, 1) / 10000
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        intake_path = os.path.join(tmp_dir, "intake.xlsx")
+        excel_path = os.path.join(tmp_dir, "roster.xlsx")
+        cache_path = os.path.join(tmp_dir, "roster.cache")
+
+        expected = generate_synthetic_intake(intake_path, num_classes, num_students, id_kind, seed)
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            class_stats = convert_excel_format(intake_path, excel_path, cache_file=cache_path)
+        if class_stats is None:
+            raise RuntimeError("合成名册转换失败")
+
+        for name, load, mode in (loaders if loaders is not None else collect_loaders()):
+            result, seconds, peak = measure_loader(load, excel_path, cache_path)
+            equivalent = _check_equivalence(result, expected, mode)
+            within_budget = seconds <= time_budget and peak <= peak_mb
+            results.append({
+                "loader": name,
+                "equivalent": equivalent,
+                "seconds": seconds,
+                "peak_mb": peak,
+                "within_budget": within_budget,
+            })
+            status = "✅" if equivalent and within_budget else "❌"
+            print(f"  {status} {name:<55} {seconds:>8.3f}s {peak:>8.1f}MB"
+                  f"{'' if equivalent else '  结果不一致'}"
+                  f"{'' if within_budget else '  超出预算'}")
+
+    print(f"  预算: {time_budget:.2f}s / {peak_mb:.0f}MB")
+    return results
+
+
+def test_loader_equivalence_synthetic():
+    """小规模合成名册上所有读取函数结果一致且在预算内"""
+    for id_kind in ("numeric", "text", "mixed"):
+        results = run_roster_scale_test(10, 500, id_kind=id_kind)
+        for result in results:
+            assert result["equivalent"], result
+            assert result["within_budget"], result
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="名册兼容性与规模测试")
+    parser.add_argument("excel", nargs="?", default="mt2025.xlsx",
+                        help="需要测试兼容性的文件（默认: mt2025.xlsx）")
+    parser.add_argument("--scale", action="store_true",
+                        help="运行合成名册规模测试")
+    parser.add_argument("--classes", type=int, nargs="+",
+                        help="规模测试的班级数列表，与 --students 一一对应")
+    parser.add_argument("--students", type=int, nargs="+",
+                        help="规模测试的学生数列表")
+    parser.add_argument("--id-kind", choices=["numeric", "text", "mixed"], default="mixed",
+                        help="考号类型（默认: mixed）")
+    parser.add_argument("--seconds-per-10k", type=float, default=DEFAULT_SECONDS_PER_10K,
+                        help=f"每1万名学生的读取时间预算（默认: {DEFAULT_SECONDS_PER_10K}秒）")
+    parser.add_argument("--peak-mb", type=float, default=DEFAULT_PEAK_MB,
+                        help=f"读取内存峰值预算（默认: {DEFAULT_PEAK_MB}MB）")
+    parser.add_argument("--skip", nargs="*", default=[],
+                        help="跳过名称中包含这些关键字的读取函数（如 sa s.load）")
+    args = parser.parse_args()
+
+    if not args.scale:
+        return 0 if test_excel_compatibility(args.excel) else 1
+
+    if args.classes and args.students:
+        scales = list(zip(args.classes, args.students))
+    else:
+        scales = DEFAULT_SCALES
+
+    loaders = [loader for loader in collect_loaders()
+               if not any(key in loader[0] for key in args.skip)]
+
+    failed = []
+    for num_classes, num_students in scales:
+        for result in run_roster_scale_test(num_classes, num_students, args.id_kind,
+                                            args.seconds_per_10k, args.peak_mb, loaders):
+            if not (result["equivalent"] and result["within_budget"]):
+                failed.append((num_classes, num_students, result["loader"]))
+
+    print("\n" + "=" * 50)
+    if failed:
+        print(f"❌ {len(failed)} 项未通过:")
+        for num_classes, num_students, loader in failed:
+            print(f"  - {loader} ({num_classes} 班 / {num_students} 人)")
+        return 1
+    print("✅ 所有读取函数结果一致且在预算内")
+    return 0
+
+
 if __name__ == "__main__":
-    test_excel_compatibility()
\ No newline at end of file
+    raise SystemExit(main())
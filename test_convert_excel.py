@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""名册转换测试：输出文件按人数和行校验和逐班核对"""
+
+import contextlib
+import io
+
+import openpyxl
+from openpyxl import Workbook
+
+from convert_excel import convert_excel_format, verify_output_file
+
+
+def convert(tmp_path):
+    workbook = Workbook()
+    ws = workbook.active
+    ws.append(["序号", "班级", "录取编号", "考号", "新生姓名", "性别", "备注"])
+    ws.append([1, 1, "L1", "1001", "张三", "男", ""])
+    ws.append([2, 1, "L2", "1002", "李四", "女", ""])
+    ws.append([3, 2, "L3", "2001", "王五", "男", ""])
+    workbook.save(tmp_path / "2025.xlsx")
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = convert_excel_format(str(tmp_path / "2025.xlsx"), str(tmp_path / "mt2025.xlsx"))
+    return tmp_path / "mt2025.xlsx", stats
+
+
+def verify(output_file, stats):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return verify_output_file(str(output_file), expected_stats=stats)
+
+
+def test_verify_passes_for_fresh_output(tmp_path):
+    output_file, stats = convert(tmp_path)
+    assert verify(output_file, stats)
+
+
+def test_verify_detects_changed_row(tmp_path):
+    output_file, stats = convert(tmp_path)
+    workbook = openpyxl.load_workbook(output_file)
+    workbook["班级1"]["B3"] = "李五"  # 人数不变，内容不同
+    workbook.save(output_file)
+    assert not verify(output_file, stats)
+
+
+def test_verify_detects_missing_row(tmp_path):
+    output_file, stats = convert(tmp_path)
+    workbook = openpyxl.load_workbook(output_file)
+    workbook["班级1"].delete_rows(3)
+    workbook.save(output_file)
+    assert not verify(output_file, stats)
+
+
+def test_verify_detects_missing_sheet(tmp_path):
+    output_file, stats = convert(tmp_path)
+    workbook = openpyxl.load_workbook(output_file)
+    workbook.remove(workbook["班级2"])
+    workbook.save(output_file)
+    assert not verify(output_file, stats)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""班级照片PPT测试：预缩放图片缓存随照片删除和替换而清理"""
+
+import contextlib
+import io
+import json
+import os
+
+import pytest
+from openpyxl import Workbook
+from PIL import Image
+
+from create_class_ppts import IMAGE_CACHE_DIRNAME, create_all_class_ppts
+
+ROSTER = {
+    "班级1": [("1001", "张三"), ("1002", "李四")],
+    "班级2": [("2001", "王五")],
+}
+
+
+def write_roster(path, roster):
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for class_name, students in roster.items():
+        ws = workbook.create_sheet(class_name)
+        ws.append(["考号", "姓名"])
+        for student in students:
+            ws.append(list(student))
+    workbook.save(path)
+
+
+def write_photo(directory, exam_id, name, color):
+    Image.new("RGB", (120, 160), color).save(directory / f"{exam_id}_{name}.png")
+
+
+def run(directory):
+    """生成所有班级PPT，返回缓存索引和缓存中的图片文件"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_all_class_ppts(str(directory), str(directory / "mt2025.xlsx"))
+    cache_dir = directory / "班级PPT" / IMAGE_CACHE_DIRNAME
+    with open(cache_dir / "index.json", encoding="utf-8") as f:
+        index = json.load(f)
+    return index, sorted(name for name in os.listdir(cache_dir) if name.endswith(".jpg"))
+
+
+@pytest.fixture
+def photo_dir(tmp_path):
+    write_roster(tmp_path / "mt2025.xlsx", ROSTER)
+    write_photo(tmp_path, "1001", "张三", "red")
+    write_photo(tmp_path, "1002", "李四", "green")
+    write_photo(tmp_path, "2001", "王五", "blue")
+    return tmp_path
+
+
+def test_deleted_photo_is_pruned(photo_dir):
+    index, files = run(photo_dir)
+    assert len(index) == 3 and len(files) == 3
+
+    os.remove(photo_dir / "1002_李四.png")
+    index, files = run(photo_dir)
+    # 班级2没有变化被跳过，它的照片仍然保留在缓存中
+    assert sorted(os.path.basename(key) for key in index) == ["1001_张三.png", "2001_王五.png"]
+    assert files == sorted(entry["file"] for entry in index.values())
+
+
+def test_replaced_photo_drops_old_cache_file(photo_dir):
+    _, before = run(photo_dir)
+    photo = photo_dir / "1001_张三.png"
+    write_photo(photo_dir, "1001", "张三", "yellow")
+    st = os.stat(photo)
+    os.utime(photo, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    index, after = run(photo_dir)
+    assert len(index) == 3 and len(after) == 3
+    assert index[str(photo)]["file"] not in before
+    assert after == sorted(entry["file"] for entry in index.values())
+
+
+def test_pool_workers_report_used_photos(photo_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_all_class_ppts(str(photo_dir), str(photo_dir / "mt2025.xlsx"), workers=2)
+    with open(photo_dir / "班级PPT" / IMAGE_CACHE_DIRNAME / "index.json",
+              encoding="utf-8") as f:
+        assert len(json.load(f)) == 3
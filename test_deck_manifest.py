@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""班级PPT生成记录测试：判断哪些班级需要重新生成"""
+
+import os
+
+import deck_manifest
+from deck_manifest import (
+    build_deck_manifest, describe_changes, load_deck_manifest, save_deck_manifest
+)
+
+STUDENTS = [("1001", "张三"), ("1002", "李四")]
+LAYOUT = {"cols": 5, "rows": 4}
+
+
+def make_manifest(tmp_path, students=STUDENTS, layout=LAYOUT, previous=None):
+    photos = {"1001": str(tmp_path / "1001_张三.png")}
+    manifest = build_deck_manifest(students, layout, photos, previous or {})
+    manifest["stats"] = [1, len(students) - 1]
+    return manifest
+
+
+def touch(path, content, mtime_offset=0):
+    with open(path, "wb") as f:
+        f.write(content)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + mtime_offset))
+
+
+def test_unchanged_deck_is_skipped(tmp_path):
+    touch(tmp_path / "1001_张三.png", b"photo")
+    previous = make_manifest(tmp_path)
+    save_deck_manifest(str(tmp_path), "1班", previous)
+    previous = load_deck_manifest(str(tmp_path), "1班")
+
+    assert describe_changes(previous, make_manifest(tmp_path, previous=previous)) == []
+
+
+def test_missing_record_requires_build(tmp_path):
+    touch(tmp_path / "1001_张三.png", b"photo")
+    current = make_manifest(tmp_path)
+    assert load_deck_manifest(str(tmp_path), "1班") == {}
+    assert describe_changes({}, current) == ["没有生成记录"]
+    # 上次生成中途失败，没有写入统计数字
+    unfinished = dict(current)
+    del unfinished["stats"]
+    assert describe_changes(unfinished, current) == ["没有生成记录"]
+
+
+def test_roster_and_layout_changes(tmp_path):
+    touch(tmp_path / "1001_张三.png", b"photo")
+    previous = make_manifest(tmp_path)
+    current = make_manifest(tmp_path, students=[("1001", "张三"), ("1003", "王五")],
+                            layout={"cols": 6, "rows": 4, "composite": True},
+                            previous=previous)
+
+    assert describe_changes(previous, current) == [
+        "名单变化（新增 1 人，移除 1 人）",
+        "布局参数变化（cols, composite）",
+    ]
+
+
+def test_photo_content_change(tmp_path):
+    photo = tmp_path / "1001_张三.png"
+    touch(photo, b"photo")
+    previous = make_manifest(tmp_path)
+
+    # 只改修改时间：重新计算哈希，内容相同不算变化
+    touch(photo, b"photo", mtime_offset=10**9)
+    assert describe_changes(previous, make_manifest(tmp_path, previous=previous)) == []
+
+    touch(photo, b"other", mtime_offset=2 * 10**9)
+    assert describe_changes(previous, make_manifest(tmp_path, previous=previous)) == ["照片变化 1 张"]
+
+
+def test_unchanged_photo_reuses_hash(tmp_path, monkeypatch):
+    touch(tmp_path / "1001_张三.png", b"photo")
+    previous = make_manifest(tmp_path)
+
+    def fail(path):
+        raise AssertionError(f"不应重新读取 {path}")
+
+    monkeypatch.setattr(deck_manifest, "file_sha1", fail)
+    current = make_manifest(tmp_path, previous=previous)
+    assert current["images"] == previous["images"]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+头像提取测试：逐个处理与流水线处理的结果一致
+
+测试中用一个把亮色区域当作人脸的检测器代替 MediaPipe，不需要安装检测模型。
+"""
+
+import contextlib
+import io
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import face_detectors
+from extract_headshots import FACE_CACHE_FILENAME, HeadshotExtractor
+
+TEST_DETECTOR = "test-bright"
+
+
+class BrightSpotDetector:
+    """把灰度大于200的区域当作一张人脸"""
+
+    def detect(self, image):
+        gray = image.mean(axis=2)
+        ys, xs = np.nonzero(gray > 200)
+        if not len(xs):
+            return []
+        h, w = gray.shape
+        return [{
+            "bbox": [xs.min() / w, ys.min() / h, (xs.max() - xs.min() + 1) / w,
+                     (ys.max() - ys.min() + 1) / h],
+            "score": 0.9,
+            "keypoints": [],
+        }]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def bright_detector(monkeypatch):
+    # 工作进程由 fork 创建，会继承这里注册的检测器
+    monkeypatch.setitem(face_detectors.DETECTORS, TEST_DETECTOR, BrightSpotDetector)
+
+
+def write_photo(path, face_box=None):
+    """生成一张深色照片，face_box=(x, y, 边长) 处画一块亮色区域"""
+    image = np.full((400, 600, 3), 40, dtype=np.uint8)
+    if face_box:
+        x, y, size = face_box
+        image[y:y + size, x:x + size] = 230
+    cv2.imwrite(str(path), image)
+
+
+def run_batch(input_dir, output_dir, workers):
+    """运行批量提取，返回 (全部输出, {文件名: 该文件的处理结果行})"""
+    extractor = HeadshotExtractor(output_dir=str(output_dir), detector=TEST_DETECTOR)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        extractor.batch_extract(str(input_dir), "*.png", workers=workers, include_videos=False)
+    lines = {}
+    for line in output.getvalue().splitlines():
+        for name in os.listdir(input_dir):
+            if name.endswith(".png") and name in line:
+                lines.setdefault(name, line)
+    return output.getvalue(), lines
+
+
+def test_pipeline_matches_serial(tmp_path):
+    input_dir = tmp_path / "photos"
+    input_dir.mkdir()
+    write_photo(input_dir / "100000001_张三.png", (250, 120, 100))
+    write_photo(input_dir / "100000002_李四.png", (20, 20, 80))  # 靠近边缘
+    write_photo(input_dir / "100000003_王五.png")  # 没有人脸
+
+    serial_output, serial = run_batch(input_dir, tmp_path / "serial", workers=1)
+    os.remove(input_dir / FACE_CACHE_FILENAME)
+    pipeline_output, pipeline = run_batch(input_dir, tmp_path / "pipeline", workers=2)
+
+    assert "头像提取失败" not in serial_output + pipeline_output
+    for name in serial:
+        assert serial[name].split()[0] == pipeline[name].split()[0], name
+    assert "未检测到人脸" in pipeline["100000003_王五.png"]
+    assert sorted(os.listdir(tmp_path / "serial")) == sorted(os.listdir(tmp_path / "pipeline"))
+    for name in os.listdir(tmp_path / "serial"):
+        if name.endswith(".png"):
+            serial_image = cv2.imread(str(tmp_path / "serial" / name))
+            pipeline_image = cv2.imread(str(tmp_path / "pipeline" / name))
+            assert np.array_equal(serial_image, pipeline_image), name
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_touched_no_face_image_uses_cache(tmp_path, workers):
+    input_dir = tmp_path / "photos"
+    input_dir.mkdir()
+    photo = input_dir / "100000003_王五.png"
+    write_photo(photo)
+    run_batch(input_dir, tmp_path / "out", workers=1)
+    with open(input_dir / FACE_CACHE_FILENAME, encoding="utf-8") as f:
+        assert json.load(f)[photo.name]["face"] is None
+
+    # 修改时间变化但内容不变：复用缓存中的"没有人脸"，不能当作有人脸去裁剪
+    st = os.stat(photo)
+    os.utime(photo, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    output, lines = run_batch(input_dir, tmp_path / "out", workers=workers)
+
+    assert "头像提取失败" not in output
+    assert "未检测到人脸" in lines[photo.name]
+    with open(input_dir / FACE_CACHE_FILENAME, encoding="utf-8") as f:
+        assert json.load(f)[photo.name]["face"] is None
+
+
+def test_crop_near_edge_stays_square(tmp_path):
+    extractor = HeadshotExtractor(output_dir=str(tmp_path), detector=TEST_DETECTOR,
+                                  profile="deck")
+    image = np.zeros((400, 600, 3), dtype=np.uint8)
+    for bbox in ([20 / 600, 20 / 400, 80 / 600, 80 / 400],      # 左上角
+                 [560 / 600, 330 / 400, 40 / 600, 70 / 400],     # 右下角
+                 [0.0, 0.0, 1.0, 1.0]):                          # 比图片还大
+        headshot = extractor._crop(image, {"bbox": bbox})
+        assert headshot.shape[0] == headshot.shape[1], bbox
+    # 框平移回图片内，大小不变
+    assert extractor._crop(image, {"bbox": [20 / 600, 20 / 400, 80 / 600, 80 / 400]}).shape[:2] \
+        == (144, 144)
+
+
+def test_video_without_face_respects_time_budget(tmp_path, monkeypatch):
+    import extract_headshots
+
+    video_path = tmp_path / "100000004_赵六.mp4"
+    writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("OpenCV 不支持写入 mp4")
+    for _ in range(40):
+        writer.write(np.full((120, 160, 3), 40, dtype=np.uint8))
+    writer.release()
+
+    extractor = HeadshotExtractor(output_dir=str(tmp_path / "out"), detector=TEST_DETECTOR)
+    calls = []
+    real_detect = extractor._detect
+    monkeypatch.setattr(extractor, "_detect", lambda image: calls.append(1) or real_detect(image))
+
+    success, message, record = extractor._extract(str(video_path), "100000004")
+    assert not success and record["face"] is None
+    assert len(calls) == extract_headshots.VIDEO_SAMPLES
+
+    # 预算用完后不再抽帧，即使还没有找到人脸
+    calls.clear()
+    monkeypatch.setattr(extract_headshots, "VIDEO_TIME_BUDGET", 0.0)
+    success, message, record = extractor._extract(str(video_path), "100000004")
+    assert not success
+    assert len(calls) <= 1
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""重命名计划测试：冲突检测、互换考号、执行前复查和出错时自动恢复"""
+
+import os
+
+import pytest
+
+import rename_files
+from rename_files import (
+    StalePlanError, execute_plan, plan_renames, rollback_renames, scan_media_files
+)
+from student_index import StudentIndex
+
+ROSTER = [
+    ("1001", "张三", "1班"),
+    ("1002", "李四", "1班"),
+    ("1003", "王五", "1班"),
+    ("1004", "赵六", "1班"),
+]
+
+
+def make_files(directory, names):
+    """创建文件，内容为文件名，便于检查重命名后文件是否对应"""
+    for name in names:
+        (directory / name).write_text(name, encoding="utf-8")
+
+
+def make_plan(directory):
+    return plan_renames(scan_media_files(str(directory), ["png", "mp4"]), StudentIndex(ROSTER))
+
+
+def contents(directory):
+    """{文件名: 内容}，不含日志"""
+    return {name: (directory / name).read_text(encoding="utf-8")
+            for name in os.listdir(directory) if name != rename_files.JOURNAL_FILENAME}
+
+
+def test_plan_conflicts(tmp_path):
+    make_files(tmp_path, [
+        "9001_王五.png", "9002_王五.png",   # 两个文件指向同一目标
+        "1004_赵六.png", "9004_赵六.png",   # 目标已存在且不会被移走
+        "9003_张三.png",                    # 正常改名
+        "1002_李四.png",                    # 已正确
+        "路人甲.png",                       # 名单中没有
+    ])
+    plan = make_plan(tmp_path)
+
+    assert plan['renames'] == [("9003_张三.png", "1001_张三.png")]
+    assert plan['already_correct'] == ["1002_李四.png", "1004_赵六.png"]
+    assert plan['not_found'] == [("路人甲.png", "路人甲")]
+    reasons = {old: reason for old, new, reason in plan['conflicts']}
+    assert reasons == {
+        "9001_王五.png": "多个文件指向同一目标",
+        "9002_王五.png": "多个文件指向同一目标",
+        "9004_赵六.png": "目标文件已存在",
+    }
+
+
+def test_swap_cycle(tmp_path):
+    # 互换（A <-> B）：两个目标都是另一个计划的源文件，不算冲突，两阶段执行
+    make_files(tmp_path, ["1001_张三.png", "1002_张三.png"])
+    plan = {'renames': [("1001_张三.png", "1002_张三.png"), ("1002_张三.png", "1001_张三.png")]}
+
+    assert execute_plan(plan, str(tmp_path)) == 2
+    assert contents(tmp_path) == {"1002_张三.png": "1001_张三.png",
+                                  "1001_张三.png": "1002_张三.png"}
+
+    assert rollback_renames(str(tmp_path)) == 2
+    assert contents(tmp_path) == {"1001_张三.png": "1001_张三.png",
+                                  "1002_张三.png": "1002_张三.png"}
+
+
+def test_target_appearing_after_preview_aborts(tmp_path):
+    make_files(tmp_path, ["9003_张三.png", "9004_李四.mp4"])
+    plan = make_plan(tmp_path)
+    # 预览之后有人拷进来一个同名文件
+    make_files(tmp_path, ["1001_张三.png"])
+
+    with pytest.raises(StalePlanError) as error:
+        execute_plan(plan, str(tmp_path))
+    assert error.value.problems == ["目标文件已存在: 1001_张三.png"]
+    assert sorted(contents(tmp_path)) == ["1001_张三.png", "9003_张三.png", "9004_李四.mp4"]
+
+
+def test_missing_source_aborts(tmp_path):
+    make_files(tmp_path, ["9003_张三.png"])
+    plan = make_plan(tmp_path)
+    os.remove(tmp_path / "9003_张三.png")
+    with pytest.raises(StalePlanError):
+        execute_plan(plan, str(tmp_path))
+
+
+@pytest.mark.parametrize("fail_at", [2, 4])
+def test_error_midway_rolls_back(tmp_path, monkeypatch, fail_at):
+    original = {"1001_李四.png", "1002_张三.png", "9003_王五.png"}
+    make_files(tmp_path, original)
+    plan = make_plan(tmp_path)
+    assert len(plan['renames']) == 3
+
+    # 第 fail_at 次 os.rename 出错（第2次在第一阶段中，第4次在第二阶段中）
+    real_rename = os.rename
+    calls = []
+
+    def flaky_rename(src, dst):
+        calls.append(src)
+        if len(calls) == fail_at:
+            raise PermissionError("文件被占用")
+        real_rename(src, dst)
+
+    monkeypatch.setattr(rename_files.os, "rename", flaky_rename)
+    with pytest.raises(PermissionError):
+        execute_plan(plan, str(tmp_path))
+
+    assert contents(tmp_path) == {name: name for name in original}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""学生身份索引测试：考号、姓名、重名和互相矛盾的文件名"""
+
+from student_index import StudentIndex
+
+ROSTER = [
+    ("1001", "张三", "1班"),
+    ("1002", "李四", "1班"),
+    ("1003", "王五", "2班"),
+    ("1004", "王五", "2班"),
+    ("1005", "欧阳 娜娜", "2班"),
+]
+
+
+def make_index():
+    return StudentIndex(ROSTER)
+
+
+def test_exact_and_normalized():
+    index = make_index()
+    match = index.resolve("1001", "张三")
+    assert (match.student.exam_id, match.status) == ("1001", "exact")
+    match = index.resolve("1005", "欧阳娜娜")
+    assert (match.student.exam_id, match.status) == ("1005", "normalized_name")
+    match = index.resolve(None, "欧阳·娜娜")
+    assert (match.student.exam_id, match.status) == ("1005", "normalized_name")
+
+
+def test_exam_id_with_typo_name():
+    match = make_index().resolve("1001", "张山")
+    assert (match.student.exam_id, match.status) == ("1001", "exam_id")
+
+
+def test_exam_id_and_name_of_different_students_is_ambiguous():
+    index = make_index()
+    match = index.resolve("1001", "李四")
+    assert match.student is None
+    assert match.status == "ambiguous"
+    assert {s.exam_id for s in match.candidates} == {"1001", "1002"}
+    # 姓名为重名学生时也不能按考号认定
+    match = index.resolve("1001", "王五")
+    assert match.status == "ambiguous"
+    assert {s.exam_id for s in match.candidates} == {"1001", "1003", "1004"}
+
+
+def test_prefer_name_keeps_name_match_for_renames():
+    match = make_index().resolve("1001", "李四", prefer="name")
+    assert (match.student.exam_id, match.status) == ("1002", "name")
+
+
+def test_duplicate_names():
+    index = make_index()
+    assert index.resolve(None, "王五").status == "ambiguous"
+    match = index.resolve("1004", "王五", prefer="name")
+    assert (match.student.exam_id, match.status) == ("1004", "exact")
+    assert set(index.duplicate_names()) == {"王五"}
+
+
+def test_not_found():
+    match = make_index().resolve("9999", "赵六")
+    assert (match.student, match.status) == (None, "none")
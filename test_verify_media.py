@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""拍摄文件检查测试：缓存的检查结果按本次的 --require-audio 设置重新判断音频"""
+
+import contextlib
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+import verify_media
+from verify_media import verify_directory
+
+VIDEO_NAME = "100000001_张三.mp4"
+
+
+@pytest.fixture
+def video_dir(tmp_path, monkeypatch):
+    writer = cv2.VideoWriter(str(tmp_path / VIDEO_NAME), cv2.VideoWriter_fourcc(*"mp4v"),
+                             10, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("OpenCV 不支持写入 mp4")
+    rng = np.random.default_rng(0)
+    for _ in range(30):
+        writer.write(rng.integers(0, 255, (120, 160, 3), dtype=np.uint8))
+    writer.release()
+    # 工作进程由 fork 创建，会继承这里替换的音频探测
+    monkeypatch.setattr(verify_media, "probe_audio", lambda path: False)
+    return tmp_path
+
+
+def issues(directory, require_audio):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return verify_directory(str(directory), workers=1,
+                                require_audio=require_audio)[VIDEO_NAME][0]
+
+
+def test_cached_result_respects_require_audio(video_dir):
+    assert issues(video_dir, require_audio=False) == []
+    # 第二次使用缓存结果，仍然要报告没有音频
+    assert issues(video_dir, require_audio=True) == ["no_audio"]
+    assert issues(video_dir, require_audio=False) == []
@@ -87,9 +87,15 @@ def detect_cameras():
     return available_cameras
 
 class CameraApp:
-    def __init__(self, master, excel_path):
+    def __init__(self, master, excel_path, intake_path=None, watch=False, track_progress=False,
+                 headshots=False):
         self.master = master
         self.excel_path = excel_path
+        self.intake_path = intake_path
+        self.roster_watcher = None
+        self.progress_tracker = None
+        self.headshot_worker = None
+        self.progress_summary = None
         self.students_info = []
         self.current_student_index = 0
         self.ffmpeg_process = None
@@ -133,6 +139,16 @@ class CameraApp:
         self.recording_status = Label(self.main_frame, text="就绪", font=("Arial", 12), fg="green")
         self.recording_status.pack(pady=5)
 
+        # 拍照进度面板（启用进度跟踪时显示）
+        self.progress_label = Label(self.main_frame, text="", font=("Arial", 11), fg="blue")
+        if track_progress:
+            self.progress_label.pack(pady=2)
+
+        # 头像检测结果提示（启用后台头像提取时显示），没检测到人脸时可以立即重拍
+        self.headshot_label = Label(self.main_frame, text="", font=("Arial", 11))
+        if headshots:
+            self.headshot_label.pack(pady=2)
+
         button_frame = Frame(self.main_frame)
         button_frame.pack(pady=10)
 
@@ -176,6 +192,27 @@ class CameraApp:
         self.queue = queue.Queue()
         atexit.register(self.cleanup)
 
+        # 跟踪拍照进度，照片保存到当前目录
+        if track_progress:
+            self.start_progress_tracker()
+
+        # 拍照后在后台提取头像到 cuted/{考号}.png
+        if headshots:
+            from extract_headshots import BackgroundHeadshotWorker
+
+            def on_headshot(save_name, success, message, record):
+                self.queue.put(("headshot", (save_name, success, message, record)))
+
+            self.headshot_worker = BackgroundHeadshotWorker(on_headshot)
+
+        # 监视名册文件，修改保存后自动刷新（原始名册变化时先增量转换）
+        if watch:
+            from roster_watcher import RosterWatcher
+            watch_paths = [self.excel_path]
+            if self.intake_path:
+                watch_paths.append(self.intake_path)
+            self.roster_watcher = RosterWatcher(watch_paths, self.on_roster_file_changed).start()
+
         self.master.after(100, self.load_excel_data)
         self.master.after(self.frame_interval, self.update)
         self.master.after(100, self.process_queue)
@@ -283,6 +320,15 @@ class CameraApp:
                     print(f"Updating students: {len(data)} students loaded")
                     self.students_info = data
                     self.update_student_info()
+                    self.update_progress_panel()
+                elif message == "reload_roster":
+                    self.apply_reloaded_roster(*data)
+                    self.update_progress_panel()
+                elif message == "progress":
+                    self.progress_summary = data
+                    self.update_progress_panel()
+                elif message == "headshot":
+                    self.update_headshot_label(*data)
                 elif message == "error":
                     print(f"An error occurred: {data}")
                 elif message == "done":
@@ -294,6 +340,91 @@ class CameraApp:
             self.master.after(100, self.process_queue)
 
 
+    def start_progress_tracker(self):
+        """创建并启动拍照进度跟踪器（名册变化时也调用此方法重建）"""
+        from completion_tracker import CompletionTracker
+
+        def on_change(summary):
+            self.queue.put(("progress", summary))
+
+        old_tracker = self.progress_tracker
+        tracker = CompletionTracker(os.getcwd(), self.excel_path, on_change=on_change)
+        self.progress_tracker = tracker.start()
+        if old_tracker is not None:
+            old_tracker.stop()
+        on_change(tracker.summary())
+
+    def update_progress_panel(self):
+        """刷新拍照进度面板"""
+        if self.progress_summary is None:
+            return
+        from completion_tracker import format_summary
+        class_name = None
+        if self.current_sheet_index < len(self.sheet_names):
+            class_name = self.sheet_names[self.current_sheet_index]
+        self.progress_label.config(text=f"拍照进度：{format_summary(self.progress_summary, class_name)}")
+
+    def update_headshot_label(self, exam_id, success, message, record):
+        """显示后台头像提取的结果"""
+        print(message)
+        if success:
+            score = record["face"]["score"] if record else 0
+            self.headshot_label.config(text=f"头像 {exam_id}：✅ 检测到人脸（置信度 {score:.2f}）", fg="green")
+        else:
+            self.headshot_label.config(text=f"头像 {exam_id}：⚠️ 未检测到人脸，请重拍", fg="red")
+
+    def on_roster_file_changed(self, path):
+        """名册文件变化回调（在监视线程中运行）"""
+        if path == self.intake_path:
+            from convert_excel import convert_excel_incremental
+            print(f"检测到原始名册变化: {path}，增量转换到 {self.excel_path}")
+            # 转换结果有变化时会改写 excel_path，随后再次触发本回调
+            convert_excel_incremental(self.intake_path, self.excel_path)
+            return
+
+        print(f"检测到名册变化: {path}，重新加载")
+        try:
+            sheet_names = get_sheet_names(self.excel_path)
+            # 尽量保持当前选择的班级
+            current_sheets = self.sheet_names
+            current_name = (current_sheets[self.current_sheet_index]
+                            if self.current_sheet_index < len(current_sheets) else None)
+            sheet_index = sheet_names.index(current_name) if current_name in sheet_names else 0
+            students_info = load_students_info(self.excel_path, sheet_index)
+            self.queue.put(("reload_roster", (sheet_names, sheet_index, students_info)))
+            if self.progress_tracker is not None:
+                self.start_progress_tracker()
+        except Exception as e:
+            print(f"Error in on_roster_file_changed: {e}")
+            traceback.print_exc()
+            self.queue.put(("error", str(e)))
+
+    def apply_reloaded_roster(self, sheet_names, sheet_index, students_info):
+        """应用重新加载的名册，按考号保持当前学生位置"""
+        current_exam_id = None
+        if self.students_info and self.current_student_index < len(self.students_info):
+            current_exam_id = str(self.students_info[self.current_student_index][0]).strip()
+
+        self.sheet_names = sheet_names
+        self.class_combo['values'] = sheet_names
+        if sheet_names:
+            self.class_combo.set(sheet_names[sheet_index])
+        self.current_sheet_index = sheet_index
+
+        new_index = None
+        if current_exam_id is not None:
+            for i, (exam_id, name) in enumerate(students_info):
+                if str(exam_id).strip() == current_exam_id:
+                    new_index = i
+                    break
+        if new_index is None:
+            new_index = min(self.current_student_index, max(len(students_info) - 1, 0))
+
+        self.students_info = students_info
+        self.current_student_index = new_index
+        self.update_student_info()
+        print(f"名册已刷新: {len(students_info)} 名学生，当前位置 {new_index + 1}")
+
     def toggle_rotation(self):
         print(f"Rotation toggled: {'开启' if self.rotate_var.get() == 1 else '关闭'}")
 
@@ -392,6 +523,8 @@ class CameraApp:
         print(f"录制结束: 总时长 {total_time:.2f}s，写入帧数 {frames_written}，实际FPS {actual_fps:.2f}")
         
         out.release()
+        if self.progress_tracker is not None:
+            self.progress_tracker.add_file(video_name)
 
     def stop_recording(self):
         if hasattr(self, 'is_recording') and self.is_recording:
@@ -420,6 +553,13 @@ class CameraApp:
             photo_name = f"{exam_id}_{name}.png"
             cv2.imwrite(photo_name, frame)
             print(f"Photo saved as {photo_name}")
+            if self.progress_tracker is not None:
+                self.progress_tracker.add_file(photo_name)
+            if self.headshot_worker is not None:
+                if self.headshot_worker.submit(photo_name, str(exam_id)):
+                    self.headshot_label.config(text=f"头像 {exam_id}：检测中…", fg="orange")
+                else:
+                    self.headshot_label.config(text=f"头像 {exam_id}：后台队列已满，稍后用 extract_headshots.py 补提取", fg="gray")
             # 如果正在录像，显示拍照提示
             if hasattr(self, 'is_recording') and self.is_recording:
                 print(f"Photo taken during recording for {name} ({exam_id})")
@@ -485,6 +625,15 @@ class CameraApp:
 
     def cleanup(self):
         print("Cleaning up resources...")
+        if self.roster_watcher is not None:
+            self.roster_watcher.stop()
+            self.roster_watcher = None
+        if self.progress_tracker is not None:
+            self.progress_tracker.stop()
+            self.progress_tracker = None
+        if self.headshot_worker is not None:
+            self.headshot_worker.stop()
+            self.headshot_worker = None
         if hasattr(self, 'is_recording') and self.is_recording:
             self.stop_recording()
         if self.vid.isOpened():
@@ -498,9 +647,24 @@ class CameraApp:
         self.master.destroy()
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="学生录像系统")
+    parser.add_argument("--excel", default="mt2025.xlsx",
+                        help="学生名册（默认: 使用转换后的 mt2025.xlsx）")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视名册文件，修改保存后自动刷新")
+    parser.add_argument("--intake", default=None,
+                        help="配合 --watch 使用：同时监视原始名册（如 2025.xlsx），变化时自动增量转换")
+    parser.add_argument("--progress", action="store_true",
+                        help="显示拍照进度面板，并实时更新未拍照学生名单")
+    parser.add_argument("--headshots", action="store_true",
+                        help="拍照后在后台提取头像到 cuted/，并提示是否检测到人脸")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    excel_path = "mt2025.xlsx"  # 使用转换后的文件
-    app = CameraApp(root, excel_path)
+    app = CameraApp(root, args.excel, intake_path=args.intake, watch=args.watch,
+                    track_progress=args.progress, headshots=args.headshots)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     
     try:
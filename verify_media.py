@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍摄文件完整性检查工具
+用进程池并行解码每张照片、探测每个视频，发现不完整的PNG、
+录像程序崩溃留下的空MP4、镜头被遮挡的全黑画面等问题。
+检查结果按 文件大小+修改时间 缓存在拍摄文件索引中。
+"""
+
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from media_index import MediaIndex
+
+# 画面统计在缩小到这个宽度的灰度图上计算
+STATS_WIDTH = 64
+# 平均亮度低于此值视为过暗
+DARK_MEAN = 20.0
+# 亮度标准差低于此值视为画面无内容（如镜头被遮挡）
+FLAT_STD = 3.0
+# 视频时长低于此值（秒）视为过短
+MIN_VIDEO_SECONDS = 1.0
+
+ISSUE_LABELS = {
+    "empty": "空文件",
+    "truncated": "文件不完整",
+    "unreadable": "无法解码",
+    "dark": "画面过暗",
+    "flat": "画面无内容（镜头可能被遮挡）",
+    "no_frames": "没有视频帧",
+    "too_short": "时长过短",
+    "no_audio": "没有音频",
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TRAILER = b"IEND\xaeB`\x82"
+JPEG_TRAILER = b"\xff\xd9"
+
+
+def frame_stats(gray):
+    """在缩小的灰度图上计算平均亮度和标准差"""
+    h, w = gray.shape[:2]
+    if w > STATS_WIDTH:
+        gray = cv2.resize(gray, (STATS_WIDTH, max(1, h * STATS_WIDTH // w)),
+                          interpolation=cv2.INTER_AREA)
+    return float(gray.mean()), float(gray.std())
+
+
+def _content_issues(mean, std):
+    issues = []
+    if mean < DARK_MEAN:
+        issues.append("dark")
+    if std < FLAT_STD:
+        issues.append("flat")
+    return issues
+
+
+def check_image(path):
+    """
+    检查一张照片
+
+    Returns:
+        (问题代码列表, 详细信息字典)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        return ["empty"], {}
+
+    issues = []
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png":
+        if not data.startswith(PNG_SIGNATURE) or not data.rstrip(b"\x00").endswith(PNG_TRAILER):
+            issues.append("truncated")
+    elif not data.rstrip(b"\x00").endswith(JPEG_TRAILER):
+        issues.append("truncated")
+
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        issues.append("unreadable")
+        return issues, {}
+
+    mean, std = frame_stats(gray)
+    issues.extend(_content_issues(mean, std))
+    return issues, {
+        "width": int(gray.shape[1]),
+        "height": int(gray.shape[0]),
+        "mean": round(mean, 1),
+        "std": round(std, 1),
+    }
+
+
+def probe_audio(path):
+    """用 ffprobe 判断视频是否有音频流，没有 ffprobe 时返回 None"""
+    if shutil.which("ffprobe") is None:
+        return None
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type",
+             "-of", "json", path],
+            capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return False
+    streams = json.loads(result.stdout or "{}").get("streams", [])
+    return any(stream.get("codec_type") == "audio" for stream in streams)
+
+
+def check_video(path, require_audio=False):
+    """
+    检查一个视频：时长、帧数、音频流，并抽取中间一帧计算画面统计
+
+    Returns:
+        (问题代码列表, 详细信息字典)
+    """
+    if os.path.getsize(path) == 0:
+        return ["empty"], {}
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return ["unreadable"], {}
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = frame_count / fps if fps > 0 else 0.0
+        details = {
+            "frames": frame_count,
+            "fps": round(fps, 2),
+            "duration": round(duration, 2),
+        }
+
+        issues = []
+        if frame_count <= 0:
+            issues.append("no_frames")
+        elif duration < MIN_VIDEO_SECONDS:
+            issues.append("too_short")
+
+        cap.set(cv2.CAP_PROP_POS_FRAMES, max(frame_count // 2, 0))
+        ret, frame = cap.read()
+        if not ret:
+            issues.append("unreadable")
+        else:
+            mean, std = frame_stats(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            details["mean"] = round(mean, 1)
+            details["std"] = round(std, 1)
+            issues.extend(_content_issues(mean, std))
+    finally:
+        cap.release()
+
+    has_audio = probe_audio(path)
+    details["has_audio"] = has_audio
+    if require_audio and has_audio is False:
+        issues.append("no_audio")
+    return issues, details
+
+
+def check_media_file(args):
+    """进程池任务：检查一个文件，返回 (文件名, 问题列表, 详细信息)"""
+    path, kind, require_audio = args
+    try:
+        if kind == "video":
+            issues, details = check_video(path, require_audio)
+        else:
+            issues, details = check_image(path)
+    except Exception as e:
+        issues, details = ["unreadable"], {"error": str(e)}
+    return os.path.basename(path), issues, details
+
+
+def verify_directory(directory, workers=None, require_audio=False):
+    """
+    检查目录中所有照片和视频（已缓存且未变化的文件直接使用缓存结果）
+
+    Args:
+        directory: 拍摄文件所在目录
+        workers: 进程数，默认为CPU核数
+        require_audio: 视频没有音频流时是否判为问题（tp.py录制的视频带音频）
+
+    Returns:
+        dict: {文件名: (问题代码列表, 详细信息字典)}
+    """
+    with MediaIndex(directory) as index:
+        index.refresh()
+        files = index.files()
+        cached = index.cached_checks()
+
+        results = {}
+        tasks = []
+        file_state = {}
+        for filename, size, mtime_ns, exam_id, name, kind in files:
+            file_state[filename] = (size, mtime_ns)
+            if filename in cached:
+                _, issues, details = cached[filename]
+                details = json.loads(details)
+                # 缓存结果可能是在不同的 --require-audio 设置下得到的，按本次设置重新判断
+                issues = [i for i in issues.split(",") if i and i != "no_audio"]
+                if require_audio and details.get("has_audio") is False:
+                    issues.append("no_audio")
+                results[filename] = (issues, details)
+            else:
+                tasks.append((os.path.join(directory, filename), kind, require_audio))
+
+        print(f"🔍 检查 {len(tasks)} 个文件（{len(results)} 个使用缓存结果）")
+        if tasks:
+            rows = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+                for filename, issues, details in executor.map(check_media_file, tasks,
+                                                              chunksize=chunksize):
+                    results[filename] = (issues, details)
+                    size, mtime_ns = file_state[filename]
+                    rows.append((filename, size, mtime_ns, not issues, ",".join(issues),
+                                 json.dumps(details, ensure_ascii=False)))
+            index.save_checks(rows)
+
+    return results
+
+
+def describe_issues(issues):
+    """问题代码列表的中文描述"""
+    return "，".join(ISSUE_LABELS.get(issue, issue) for issue in issues)
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="拍摄文件完整性检查工具")
+    parser.add_argument("-d", "--directory", default=".",
+                        help="拍摄文件所在目录（默认: 当前目录）")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="并行进程数（默认: CPU核数）")
+    parser.add_argument("--require-audio", action="store_true",
+                        help="视频没有音频流时视为问题")
+    args = parser.parse_args()
+
+    results = verify_directory(args.directory, args.workers, args.require_audio)
+    bad = {f: r for f, r in results.items() if r[0]}
+
+    print(f"\n共检查 {len(results)} 个文件，发现 {len(bad)} 个问题文件")
+    for filename in sorted(bad):
+        print(f"  ❌ {filename}: {describe_issues(bad[filename][0])}")
+
+
+if __name__ == "__main__":
+    main()